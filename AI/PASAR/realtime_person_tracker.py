@@ -1,12 +1,21 @@
 from ultralytics import YOLO
 import cv2
+import numpy as np
 from pathlib import Path
-import time
 import sys
 
+# Shared helpers live in AI/ (one level up)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from best_shot import BestShotGallery
+from capture import FrameSource
+from clip_recorder import ClipIndex
+from log_setup import RateLimiter
+from targets import TargetFilter, TargetStats, parse_targets, target_detections
+
 # ======== CONFIG ========
 CONF_THRESHOLD = 0.25
-TARGETS = ["Fajar", "Budi", "Siti"]  # list target untuk cycle pakai tombol 't'
+TARGETS = ["Fajar", "Budi", "Siti"]  # semua target dicari sekaligus dalam satu pass
+GALLERY_DIR = "gallery"  # Foto terbaik per kemunculan target
 
 # ======== UTILS ========
 def load_yolo_model(model_path):
@@ -26,176 +35,159 @@ def format_ts(ms):
 
 # ======== REAL-TIME TRACKER ========
 def realtime_person_tracker(model_path, video_path, target_person="Fajar", conf_threshold=0.25):
-    print("🚀 Starting real-time person tracker (ONLY target)...")
+    """Track one or more targets (name, "A, B" or list) in a single YOLO pass"""
+    print("🚀 Starting real-time person tracker (ONLY targets)...")
 
     model = load_yolo_model(model_path)
     if model is None:
         return
 
-    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
-    if not cap.isOpened():
+    # Decoding runs on its own thread at the video's real-time pace; the loop
+    # below always takes the newest frame, so lag never exceeds one inference
+    cap = FrameSource(video_path, jitter_frames=1)
+    if not cap.start():
         print(f"❌ Could not open video {video_path}")
         return
 
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = cap.frame_count
+    fps = cap.fps or 30.0
     duration = total_frames / fps if fps > 0 else 0.0
 
     print(f"📹 Video Info:")
     print(f"   Frames : {total_frames}")
     print(f"   FPS    : {fps:.2f}")
     print(f"   Durasi : {duration:.2f}s")
-    print(f"   Target : {target_person}")
+    targets = TargetFilter(parse_targets(target_person), getattr(model, "names", None))
+    target_label = targets.label()
+
+    print(f"   Target : {target_label}")
     print(f"   Conf   : {conf_threshold}")
-    print("🎬 Controls: q=quit, p=pause/resume, s=save, r=restart, t=next target")
+    print("🎬 Controls: q=quit, p=pause/resume, s=save, r=restart")
 
     # Window
-    win_name = f"Real-time Tracker - {target_person}"
+    win_name = f"Real-time Tracker - {target_label}"
     cv2.namedWindow(win_name, cv2.WINDOW_NORMAL)
     cv2.resizeWindow(win_name, 960, 540)
 
-    # Anchor waktu real-time
     paused = False
-    target_detections = 0
-    playback_anchor_wall = None
-    anchor_video_ms = 0.0
-
-    target_person_l = target_person.strip().lower()
-    target_class_id = get_class_id(model, target_person_l)
+    error_log = RateLimiter(5.0)  # A broken frame repeats; report it once per 5s
+    stats = TargetStats()
+    gallery = BestShotGallery("pasar", ClipIndex(GALLERY_DIR, max_clips_per_camera=500))
+    last_ms = -1.0
+    # Boxes are drawn into one preallocated buffer; the decoded frame stays clean for crops
+    display_frame = None
 
     while True:
         if not paused:
-            ret, frame = cap.read()
-            if not ret:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                target_detections = 0
-                playback_anchor_wall = None
-                anchor_video_ms = 0.0
-                print("🔄 Restart video")
+            frame, current_ms = cap.read(timeout=1.0)
+            if frame is None:
+                key = cv2.waitKey(1) & 0xFF
+                if not handle_keys(key, cap):
+                    break
                 continue
+            if current_ms < last_ms:
+                # Video looped back to the start
+                stats = TargetStats()
+                print("🔄 Restart video")
+            last_ms = current_ms
         else:
-            frame_display = frame.copy()
-            cv2.putText(frame_display, "PAUSED", (frame_display.shape[1] - 150, 30),
+            # The last shown frame is still in display_frame; stamp it instead of copying
+            cv2.putText(display_frame, "PAUSED", (display_frame.shape[1] - 150, 30),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-            cv2.imshow(win_name, frame_display)
+            cv2.imshow(win_name, display_frame)
             key = cv2.waitKey(30) & 0xFF
-            if not handle_keys(key, cap, model, target_person, target_detections):
+            if not handle_keys(key, cap):
                 break
             continue
 
-        current_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
-        if playback_anchor_wall is None:
-            playback_anchor_wall = time.time()
-            anchor_video_ms = current_ms
-
-        display_frame = frame.copy()
+        if display_frame is None or display_frame.shape != frame.shape:
+            display_frame = np.empty_like(frame)
+        np.copyto(display_frame, frame)
 
-        # === DETEKSI target ===
+        # === DETEKSI semua target dalam satu pass ===
+        found = {}
+        shots = []
         try:
-            if target_class_id is not None:
-                results = model(display_frame, conf=conf_threshold, classes=[target_class_id], verbose=False)
+            # The model reads the clean frame; nothing has been drawn yet
+            if targets.classes is not None:
+                results = model(frame, conf=conf_threshold, classes=targets.classes, verbose=False)
             else:
-                results = model(display_frame, conf=conf_threshold, verbose=False)
+                results = model(frame, conf=conf_threshold, verbose=False)
 
-            frame_target = 0
             if len(results) > 0:
-                result = results[0]
-                if result.boxes is not None and len(result.boxes) > 0:
-                    boxes = result.boxes
-                    class_names = result.names if hasattr(result, 'names') else getattr(model, "names", None)
-
-                    for box in boxes:
-                        cls_id = int(box.cls[0].cpu().numpy())
-                        cls_name = class_names[cls_id] if class_names else f"Class {cls_id}"
-
-                        if str(cls_name).strip().lower() != target_person_l:
-                            continue
-
-                        x1, y1, x2, y2 = map(int, box.xyxy[0].cpu().numpy())
-                        conf = float(box.conf[0].cpu().numpy())
-
-                        color = (0, 255, 255)
-                        cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, 2)
-                        label = f"🎯 {cls_name}: {conf:.2f}"
-                        cv2.rectangle(display_frame, (x1, y1 - 25), (x1 + 200, y1), color, -1)
-                        cv2.putText(display_frame, label, (x1, y1 - 5),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
-                        frame_target += 1
-
+                # Box tensors leave the device once per frame, not once per box
+                shots = target_detections(results[0], targets, getattr(model, "names", None))
+                for name, conf, x1, y1, x2, y2 in shots:
+                    color = targets.colors[name]
+                    cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, 2)
+                    label = f"{name}: {conf:.2f}"
+                    cv2.rectangle(display_frame, (x1, y1 - 25), (x1 + 200, y1), color, -1)
+                    cv2.putText(display_frame, label, (x1, y1 - 5),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
+                    found[name] = found.get(name, 0) + 1
+
+            frame_target = sum(found.values())
             if frame_target > 0:
-                target_detections += frame_target
-                cv2.putText(display_frame, f"Detections ({target_person}): {frame_target}",
+                cv2.putText(display_frame, f"Detections ({target_label}): {frame_target}",
                             (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
             else:
-                cv2.putText(display_frame, f"{target_person} not detected",
+                cv2.putText(display_frame, f"{target_label} not detected",
                             (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
         except Exception as e:
-            print(f"❌ Error processing at {format_ts(current_ms)}: {e}")
+            if error_log.allow():
+                print(f"❌ Error processing at {format_ts(current_ms)}: {e}")
             cv2.putText(display_frame, "Error processing", (10, 30),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
+        stats.update(found, current_ms / 1000.0)
+        # Crops come from the clean frame; boxes are drawn on display_frame
+        gallery.update(frame, shots, current_ms / 1000.0)
+
         # Overlay waktu
         cv2.putText(display_frame, f"Time: {format_ts(current_ms)}",
                     (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        cv2.putText(display_frame, f"Frame: {int(cap.get(cv2.CAP_PROP_POS_FRAMES))}/{total_frames}",
+        cv2.putText(display_frame, f"Frame: {int(round(current_ms * fps / 1000.0))}/{total_frames}",
                     (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        cv2.putText(display_frame, f"Target: {target_person}",
+        cv2.putText(display_frame, f"Target: {target_label}",
                     (10, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-        cv2.putText(display_frame, f"Total {target_person}: {target_detections}",
-                    (10, 180), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-
-        # Real-time sync
-        desired_wall = playback_anchor_wall + (current_ms - anchor_video_ms) / 1000.0
-        now = time.time()
-        diff = desired_wall - now
+        # Total per target, in that target's box colour
+        for i, name in enumerate(targets.names):
+            cv2.putText(display_frame, f"Total {name}: {stats.counts.get(name, 0)}",
+                        (10, 180 + 30 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.6, targets.colors[name], 2)
 
+        # Real-time pacing comes from the capture thread; no grab() catch-up
         cv2.imshow(win_name, display_frame)
-        if diff > 0:
-            key = cv2.waitKey(max(1, min(int(diff * 1000), 30))) & 0xFF
-        else:
-            cap.grab()
-            key = cv2.waitKey(1) & 0xFF
+        key = cv2.waitKey(1) & 0xFF
 
-        if not handle_keys(key, cap, model, target_person, target_detections):
+        if not handle_keys(key, cap):
             break
 
-    cap.release()
+    cap.stop()
+    gallery.close()
     cv2.destroyAllWindows()
 
+    # Ringkasan kemunculan tiap target (detik video)
+    for name, info in stats.snapshot(targets.names).items():
+        spans = ", ".join(f"{format_ts(a * 1000)}-{format_ts(b * 1000)}" for a, b in info['appearances'])
+        print(f"🎯 {name}: {info['detections']} deteksi | muncul: {spans or '-'}")
+
 # ======== HELPER FUNCTIONS ========
-def get_class_id(model, target_person_l):
-    names = getattr(model, "names", None)
-    if isinstance(names, dict):
-        for k, v in names.items():
-            if str(v).strip().lower() == target_person_l:
-                return int(k)
-    return None
-
-def handle_keys(key, cap, model, target_person, target_detections):
+def handle_keys(key, cap):
     """Handle key events; return False to exit"""
-    global TARGETS
     if key == ord('q'):
         return False
     elif key == ord('p'):
         return True  # pause handled in loop
     elif key == ord('s'):
-        filename = f"saved_frame_{int(cap.get(cv2.CAP_PROP_POS_FRAMES)):04d}.jpg"
-        ret, frame = cap.read()
-        if ret:
+        seq, frame, _ = cap.latest()
+        if frame is not None:
+            filename = f"saved_frame_{seq:04d}.jpg"
             cv2.imwrite(filename, frame)
             print(f"Frame saved: {filename}")
     elif key == ord('r'):
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        cap.seek(0)
         print("Restarted video")
-    elif key == ord('t'):
-        # cycle to next target
-        try:
-            idx = TARGETS.index(target_person)
-        except ValueError:
-            idx = -1
-        target_person = TARGETS[(idx + 1) % len(TARGETS)]
-        print(f"Target changed to: {target_person}")
     return True
 
 # ======== MAIN ========
@@ -210,4 +202,4 @@ if __name__ == "__main__":
         print(f"❌ Video not found: {video_path}")
         sys.exit(1)
 
-    realtime_person_tracker(model_path, video_path, target_person="Fajar", conf_threshold=CONF_THRESHOLD)
+    realtime_person_tracker(model_path, video_path, target_person=TARGETS, conf_threshold=CONF_THRESHOLD)
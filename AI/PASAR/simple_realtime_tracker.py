@@ -4,9 +4,17 @@ from pathlib import Path
 import time
 import sys
 
+# Shared helpers live in AI/ (one level up)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from clip_recorder import ClipIndex, ClipRecorder
+from log_setup import RateLimiter
+
 # ======== CONFIG ========
 CONF_THRESHOLD = 0.25
 TARGETS = []
+CLIP_DIR = "clips"    # Satu klip per kemunculan target (bukan seluruh video)
+PRE_ROLL = 5.0        # Detik sebelum target muncul yang ikut disimpan
+POST_ROLL = 3.0       # Klip ditutup setelah target hilang selama ini
 
 # ======== UTILS ========
 def load_yolo_model(model_path):
@@ -51,32 +59,32 @@ def realtime_person_tracker(model_path, video_path, target_person="Fajar", conf_
     cv2.namedWindow(win_name, cv2.WINDOW_NORMAL)
     cv2.resizeWindow(win_name, 960, 540)
 
-    # ===== Video Writer untuk demo =====
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(
-        "demo_output.mp4",
-        fourcc,
-        fps,
-        (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
-    )
+    # ===== Perekam klip berbasis event (encoding di thread terpisah) =====
+    clip_index = ClipIndex(CLIP_DIR)
+    recorder = ClipRecorder("tracker", clip_index, fps=fps, pre_roll=PRE_ROLL, post_roll=POST_ROLL)
 
     paused = False
+    error_log = RateLimiter(5.0)  # A broken frame repeats; report it once per 5s
     playback_anchor_wall = None
     anchor_video_ms = 0.0
 
     target_person_l = target_person.strip().lower()
     target_class_id = get_class_id(model, target_person_l)
 
+    # One buffer for the whole run: each read() decodes into it and overlays are
+    # drawn straight onto it (the recorder copies what it keeps)
+    display_frame = None
+
     while True:
         if not paused:
-            ret, frame = cap.read()
+            ret, display_frame = cap.read(image=display_frame)
             if not ret:
                 break
         else:
-            frame_display = frame.copy()
-            cv2.putText(frame_display, "PAUSED", (frame_display.shape[1] - 150, 30),
+            # The last shown frame is still in display_frame; stamp it instead of copying
+            cv2.putText(display_frame, "PAUSED", (display_frame.shape[1] - 150, 30),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-            cv2.imshow(win_name, frame_display)
+            cv2.imshow(win_name, display_frame)
             key = cv2.waitKey(30) & 0xFF
             target_person, target_class_id = handle_keys(key, cap, model, target_person)
             if target_person is None:
@@ -90,9 +98,9 @@ def realtime_person_tracker(model_path, video_path, target_person="Fajar", conf_
             playback_anchor_wall = time.time()
             anchor_video_ms = current_ms
 
-        display_frame = frame.copy()
-
+        frame_target = 0
         try:
+            # Inference runs before anything is drawn into the buffer
             if target_class_id is not None:
                 results = model(display_frame, conf=conf_threshold, classes=[target_class_id], verbose=False)
             else:
@@ -105,13 +113,15 @@ def realtime_person_tracker(model_path, video_path, target_person="Fajar", conf_
                     boxes = result.boxes
                     class_names = result.names if hasattr(result, 'names') else getattr(model, "names", None)
 
-                    for box in boxes:
-                        cls_id = int(box.cls[0].cpu().numpy())
+                    # Box tensors leave the device once per frame, not once per box
+                    cls_ids = boxes.cls.cpu().numpy().astype(int)
+                    confs = boxes.conf.cpu().numpy()
+                    xyxy = boxes.xyxy.cpu().numpy().astype(int)
+                    for cls_id, conf, (x1, y1, x2, y2) in zip(cls_ids, confs, xyxy):
                         cls_name = class_names[cls_id] if class_names else f"Class {cls_id}"
                         if str(cls_name).strip().lower() != target_person_l:
                             continue
-                        x1, y1, x2, y2 = map(int, box.xyxy[0].cpu().numpy())
-                        conf = float(box.conf[0].cpu().numpy())
+                        x1, y1, x2, y2, conf = int(x1), int(y1), int(x2), int(y2), float(conf)
                         color = (0, 255, 255)
                         cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, 2)
                         label = f"🎯 {cls_name}: {conf:.2f}"
@@ -128,7 +138,8 @@ def realtime_person_tracker(model_path, video_path, target_person="Fajar", conf_
                             (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
         except Exception as e:
-            print(f"❌ Error processing at {format_ts(current_ms)}: {e}")
+            if error_log.allow():
+                print(f"❌ Error processing at {format_ts(current_ms)}: {e}")
             cv2.putText(display_frame, "Error processing", (10, 30),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
@@ -138,8 +149,9 @@ def realtime_person_tracker(model_path, video_path, target_person="Fajar", conf_
         cv2.putText(display_frame, f"Target: {target_person}",
                     (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
 
-        # ===== Save ke file video =====
-        out.write(display_frame)
+        # ===== Rekam hanya saat target terlihat (+ pre-roll) =====
+        # Timestamp video, bukan jam dinding, agar durasi klip sesuai video
+        recorder.push(display_frame, {target_person} if frame_target > 0 else (), ts=current_ms / 1000.0)
 
         # Tampilkan di window
         cv2.imshow(win_name, display_frame)
@@ -151,9 +163,10 @@ def realtime_person_tracker(model_path, video_path, target_person="Fajar", conf_
         win_name = f"Real-time Tracker - {target_person}"
 
     cap.release()
-    out.release()
+    recorder.close()
     cv2.destroyAllWindows()
-    print("💾 Video demo tersimpan: demo_output.mp4")
+    saved = clip_index.query(camera="tracker")
+    print(f"💾 {len(saved)} klip tersimpan di {CLIP_DIR}/")
 
 # ======== HELPER FUNCTIONS ========
 def get_class_id(model, target_person_l):
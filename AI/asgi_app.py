@@ -0,0 +1,90 @@
+import asyncio
+
+from asgiref.wsgi import WsgiToAsgi
+
+from frame_hub import BOUNDARY
+
+
+def create_asgi_app(flask_app, get_hub, on_connect=None, stream_prefix='/video_feed'):
+    """Serve MJPEG streams from the event loop and delegate the rest to Flask.
+
+    Stream paths (stream_prefix, or stream_prefix/<camera>) are answered
+    natively in asyncio straight from the camera's FrameHub, as returned by
+    get_hub(camera), so an idle viewer costs a coroutine instead of an OS
+    thread.
+    Control routes (/set_target, /get_* ...) keep running in Flask through
+    asgiref's WSGI adapter, which executes them on a small thread pool.
+    on_connect(camera), if given, runs in the default executor before a stream
+    starts.
+    """
+    wsgi = WsgiToAsgi(flask_app)
+
+    async def not_found(send):
+        await send({'type': 'http.response.start', 'status': 404,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body',
+                    'body': b'{"error": "Kamera tidak ditemukan"}'})
+
+    async def stream(camera, receive, send):
+        # May ask the engine whether the camera exists: keep it off the event loop
+        hub = await asyncio.get_running_loop().run_in_executor(None, get_hub, camera)
+        if hub is None:
+            await not_found(send)
+            return
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    disconnected.set()
+                    return
+
+        if on_connect is not None:
+            await asyncio.get_running_loop().run_in_executor(None, on_connect, camera)
+        watcher = asyncio.create_task(watch_disconnect())
+        hub.viewer_joined()
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'multipart/x-mixed-replace; boundary=' + BOUNDARY),
+                    (b'cache-control', b'no-cache'),
+                    (b'access-control-allow-origin', b'*'),
+                ],
+            })
+            last_seq = 0
+            while not disconnected.is_set():
+                seq, part = await hub.wait_async(last_seq, part=True)
+                if part is None or seq == last_seq:
+                    continue
+                last_seq = seq
+                await send({'type': 'http.response.body', 'body': part, 'more_body': True})
+                hub.count_sent(len(part))
+        except OSError:
+            pass
+        finally:
+            hub.viewer_left()
+            watcher.cancel()
+
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['method'] == 'GET' and (
+                scope['path'] == stream_prefix or scope['path'].startswith(stream_prefix + '/')):
+            camera = scope['path'][len(stream_prefix) + 1:] or None
+            await stream(camera, receive, send)
+        else:
+            await wsgi(scope, receive, send)
+
+    return application
@@ -0,0 +1,241 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from camera_config import DEFAULT_CONF
+from overlay import OverlayCompositor
+from synthetic import SyntheticModel, write_synthetic_video
+from targets import TargetFilter, parse_targets, target_detections
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_VIDEOS = [BASE_DIR / "MORN_CITY" / "vidio" / "Day_Dublin.mp4",
+                  BASE_DIR / "PIM" / "vidio" / "PIM.mp4"]
+STAGES = ("decode", "inference", "postprocess", "overlay", "encode")
+JPEG_QUALITY = 85  # Same as the stream encoder in camera_session
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def alloc_counters():
+    """(minor page faults, GC collections) so far: fresh frame-sized arrays show up as faults"""
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+    return faults, sum(generation['collections'] for generation in gc.get_stats())
+
+
+def summarize(samples):
+    """Throughput and latency percentiles of per-frame times in seconds"""
+    if not samples:
+        return {'frames': 0}
+    values = np.asarray(samples) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'frames': len(samples),
+        'fps': round(len(samples) / (values.sum() / 1000.0), 2),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+    }
+
+
+def load_model(model_path):
+    """YOLO weights if given and present, else the synthetic stand-in"""
+    if model_path and Path(model_path).exists():
+        from ultralytics import YOLO
+        return YOLO(str(model_path)), Path(model_path).name
+    if model_path:
+        print(f"⚠️ Model not found: {model_path}; using the synthetic model")
+    return SyntheticModel(), "synthetic"
+
+
+def run_config(video_path, model, targets, imgsz, frames, warmup, reuse=True):
+    """Run the whole pipeline on one video, timing every stage of every frame.
+
+    With reuse the frame is decoded into the same buffer every time and drawn
+    into in place, as the server does; without it every frame is a new array.
+    """
+    overlay = OverlayCompositor()
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {video_path}")
+    kwargs = {'conf': DEFAULT_CONF, 'verbose': False}
+    if targets.classes is not None:
+        kwargs['classes'] = targets.classes
+    if imgsz:
+        kwargs['imgsz'] = imgsz
+    names = getattr(model, 'names', None)
+
+    times = {stage: [] for stage in STAGES}
+    pipeline = []
+    total = 0
+    # Reset after every warm-up frame; with --warmup 0 the run starts here
+    started_run = time.perf_counter()
+    counters = alloc_counters()
+    frame = None
+    while total < warmup + frames:
+        t0 = time.perf_counter()
+        ok, frame = cap.read(image=frame if reuse else None)
+        if not ok:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Loop short videos, like the server
+            continue
+        t1 = time.perf_counter()
+        results = model(frame, **kwargs)
+        t2 = time.perf_counter()
+        detections = target_detections(results[0], targets, names) if results else []
+        t3 = time.perf_counter()
+        overlay.draw_detections(frame, detections, targets.colors)
+        overlay.draw_text(frame, f"Frame: {total}", (10, 30), (255, 255, 255))
+        overlay.draw_text(frame, f"Target: {targets.label()}", (10, 60), (0, 255, 255))
+        overlay.draw_text(frame, f"Detections: {len(detections)}", (10, 90), (0, 255, 255))
+        t4 = time.perf_counter()
+        cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        t5 = time.perf_counter()
+
+        total += 1
+        if total <= warmup:
+            started_run = time.perf_counter()
+            counters = alloc_counters()
+            continue
+        for stage, (a, b) in zip(STAGES, ((t0, t1), (t1, t2), (t2, t3), (t3, t4), (t4, t5))):
+            times[stage].append(b - a)
+        pipeline.append(t5 - t0)
+    elapsed = time.perf_counter() - started_run
+    faults, collections = (now - before for now, before in zip(alloc_counters(), counters))
+    width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    summary = summarize(pipeline)
+    summary['wall_fps'] = round(frames / elapsed, 2) if elapsed > 0 else None
+    return {
+        'resolution': [width, height],
+        'stages': {stage: summarize(samples) for stage, samples in times.items()},
+        'pipeline': summary,
+        'peak_rss_mb': peak_rss_mb(),
+        'page_faults_per_frame': round(faults / frames, 1) if frames else None,
+        'gc_collections': collections,
+    }
+
+
+def run_key(run):
+    return f"{run['video']}|{run['model']}|{run['imgsz']}"
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of report against baseline: slower p95 or lower throughput"""
+    previous = {run_key(run): run for run in baseline.get('runs', [])}
+    regressions = []
+    for run in report['runs']:
+        old = previous.get(run_key(run))
+        if old is None:
+            continue
+        checks = [(f"{stage} p95_ms", run['stages'][stage].get('p95_ms'),
+                   old['stages'].get(stage, {}).get('p95_ms'), True) for stage in STAGES]
+        checks.append(("pipeline p95_ms", run['pipeline'].get('p95_ms'),
+                       old['pipeline'].get('p95_ms'), True))
+        checks.append(("pipeline fps", run['pipeline'].get('fps'), old['pipeline'].get('fps'), False))
+        for label, new, ref, lower_is_better in checks:
+            if not new or not ref:
+                continue
+            change = (new - ref) / ref
+            if (change > tolerance) if lower_is_better else (change < -tolerance):
+                regressions.append({'run': run_key(run), 'metric': label,
+                                    'baseline': ref, 'current': new,
+                                    'change_pct': round(change * 100, 1)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark decode, inference, postprocess, overlay and JPEG encode "
+                    "per stage and end to end, on the bundled videos or synthetic input.")
+    parser.add_argument("--video", action="append", help="Video file (repeatable); default: bundled videos")
+    parser.add_argument("--model", action="append", help="Model weights, any format YOLO() loads "
+                        "(.pt, .onnx, .engine, ...; repeatable); default: synthetic model")
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[640], help="Inference sizes to compare")
+    parser.add_argument("--targets", default=None, help="Target names, e.g. 'Fajar, Dublin'; default: first class")
+    parser.add_argument("--frames", type=int, default=150, help="Measured frames per run")
+    parser.add_argument("--warmup", type=int, default=10, help="Frames run before measuring")
+    parser.add_argument("--synthetic", action="store_true", help="Use a generated 1080p video only")
+    parser.add_argument("--no-reuse", action="store_true",
+                        help="Decode every frame into a new array, to compare against buffer reuse")
+    parser.add_argument("--out", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Compare against a previous JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown vs. baseline (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    videos = [] if args.synthetic else [Path(v) for v in (args.video or DEFAULT_VIDEOS)]
+    missing = [v for v in videos if not v.exists()]
+    for video in missing:
+        print(f"⚠️ Video not found: {video}")
+    videos = [v for v in videos if v.exists()]
+    tmp_dir = None
+    if not videos:
+        tmp_dir = tempfile.TemporaryDirectory()
+        print("🎞️ Generating a synthetic 1080p video...")
+        videos = [write_synthetic_video(Path(tmp_dir.name) / "synthetic_1080p.mp4",
+                                        count=min(300, args.frames + args.warmup))]
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'frames': args.frames,
+            'warmup': args.warmup,
+            'reuse': not args.no_reuse,
+        },
+        'runs': [],
+    }
+    for model_path in (args.model or [None]):
+        model, model_name = load_model(model_path)
+        names = getattr(model, 'names', {}) or {}
+        targets = TargetFilter(parse_targets(args.targets or next(iter(names.values()), "")), names)
+        for video in videos:
+            for imgsz in args.imgsz:
+                print(f"⏱️ {video.name} | {model_name} | imgsz={imgsz}")
+                run = run_config(video, model, targets, imgsz, args.frames, args.warmup, not args.no_reuse)
+                run.update(video=video.name, model=model_name, imgsz=imgsz)
+                report['runs'].append(run)
+                p = run['pipeline']
+                stages = "  ".join(f"{s}={run['stages'][s]['p50_ms']:.1f}" for s in STAGES)
+                print(f"   {p['fps']:.1f} FPS  p50={p['p50_ms']:.1f} p95={p['p95_ms']:.1f} "
+                      f"p99={p['p99_ms']:.1f} ms  [{stages}]  RSS={run['peak_rss_mb']} MB  "
+                      f"faults/frame={run['page_faults_per_frame']}  gc={run['gc_collections']}")
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+    regressions = []
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        report['regressions'] = regressions
+        for r in regressions:
+            print(f"❌ {r['run']} {r['metric']}: {r['baseline']} -> {r['current']} ({r['change_pct']:+.1f}%)")
+        if not regressions:
+            print("✅ No regressions against the baseline")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=1))
+        print(f"💾 Report saved: {args.out}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import queue
+import threading
+from datetime import datetime
+
+import cv2
+
+from log_setup import get_logger
+from naming import slug
+
+THUMB_MAX_SIDE = 256  # Thumbnails are downscaled so the longest side fits this
+
+
+class BestShotGallery:
+    """Keep the best crop of each target sighting and save it as a thumbnail.
+
+    A sighting (track) lasts while its target keeps being detected with gaps
+    shorter than end_after seconds. update() only copies a crop when the
+    detection's confidence beats the track's best so far, so the per-frame
+    cost is a comparison per detection. When the track ends, the best crop is
+    JPEG-encoded and indexed on a background thread.
+    """
+
+    def __init__(self, camera_id, index, end_after=2.0, margin=0.1, jpeg_quality=85):
+        self.camera_id = camera_id
+        self.log = get_logger(__name__, camera_id)
+        self.index = index  # clip_recorder.ClipIndex over the gallery directory
+        self.end_after = end_after
+        self.margin = margin
+        self.jpeg_quality = jpeg_quality
+        self._tracks = {}  # target name -> open track
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._writer, daemon=True,
+                                        name=f"gallery-{camera_id}")
+        self._thread.start()
+
+    def update(self, frame, detections, ts):
+        """Feed one frame's target detections: iterable of (name, conf, x1, y1, x2, y2).
+
+        frame must be the clean image (before boxes and labels are drawn).
+        """
+        for name, conf, x1, y1, x2, y2 in detections:
+            track = self._tracks.get(name)
+            if track is not None and ts < track['last_seen']:
+                # Time went backwards (video looped): close the old sighting
+                self._end(name)
+                track = None
+            if track is None:
+                track = self._tracks[name] = {'start': ts, 'last_seen': ts,
+                                              'conf': -1.0, 'crop': None}
+            track['last_seen'] = ts
+            if conf > track['conf']:
+                crop = self._crop(frame, x1, y1, x2, y2)
+                if crop is not None:
+                    track['conf'] = conf
+                    track['crop'] = crop
+
+        for name in [n for n, t in self._tracks.items() if ts - t['last_seen'] > self.end_after]:
+            self._end(name)
+
+    def flush(self):
+        """End every open sighting (e.g. when the stream stops)"""
+        for name in list(self._tracks):
+            self._end(name)
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+
+    def _crop(self, frame, x1, y1, x2, y2):
+        height, width = frame.shape[:2]
+        pad_x, pad_y = (x2 - x1) * self.margin, (y2 - y1) * self.margin
+        x1, y1 = max(int(x1 - pad_x), 0), max(int(y1 - pad_y), 0)
+        x2, y2 = min(int(x2 + pad_x), width), min(int(y2 + pad_y), height)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return frame[y1:y2, x1:x2].copy()
+
+    def _end(self, name):
+        track = self._tracks.pop(name)
+        if track['crop'] is not None:
+            self._queue.put((name, track))
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            name, track = item
+            try:
+                self._save(name, track)
+            except Exception as e:
+                self.log.error("❌ Thumbnail error: %s", e)
+
+    def _save(self, name, track):
+        crop = track['crop']
+        scale = THUMB_MAX_SIDE / max(crop.shape[:2])
+        if scale < 1.0:
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        now = datetime.now()
+        # Target names come from users: only their slug goes into the file name
+        shot_id = (f"{slug(self.camera_id, 'camera')}_{slug(name, 'target')}"
+                   f"_{now:%Y%m%d-%H%M%S}_{now.microsecond // 1000:03d}")
+        self.index.out_dir.mkdir(parents=True, exist_ok=True)
+        filename = f"{shot_id}.jpg"
+        if not cv2.imwrite(str(self.index.out_dir / filename), crop,
+                           [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]):
+            return
+        self.index.add({
+            'id': shot_id,
+            'camera': self.camera_id,
+            'targets': [name],
+            'start': round(track['start'], 3),
+            'end': round(track['last_seen'], 3),
+            'confidence': round(track['conf'], 3),
+            'file': filename,
+        })
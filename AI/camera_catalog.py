@@ -0,0 +1,218 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import cv2
+
+from capture import is_live_source
+from log_setup import get_logger
+from naming import slug
+from result_cache import file_fingerprint
+
+VIDEO_SUBDIR = "vidio"
+MODEL_SUBDIR = "models"
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+MODEL_EXTENSIONS = (".pt", ".onnx", ".engine", ".torchscript")
+
+log = get_logger(__name__)
+
+
+def list_files(directory, extensions):
+    if not directory.is_dir():
+        return []
+    return sorted(p.resolve() for p in directory.iterdir() if p.suffix.lower() in extensions)
+
+
+def fourcc_name(value):
+    code = int(value)
+    name = "".join(chr((code >> 8 * i) & 0xFF) for i in range(4))
+    return name.strip("\x00 ") or None
+
+
+def probe_video(path):
+    """Resolution, FPS, frame count and codec of a video file"""
+    cap = cv2.VideoCapture(str(path))
+    try:
+        if not cap.isOpened():
+            return {'error': 'unreadable'}
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        return {
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': round(fps, 3),
+            'frame_count': frames,
+            'duration_s': round(frames / fps, 2) if fps else None,
+            'codec': fourcc_name(cap.get(cv2.CAP_PROP_FOURCC)),
+        }
+    finally:
+        cap.release()
+
+
+def resolve_file(asset_dir, configured, subdir, candidates):
+    """Configured file if present, else the first file found in the asset subdirectory"""
+    if configured:
+        path = (asset_dir / configured).resolve()
+        if path.exists():
+            return path
+    fallback = (asset_dir / subdir).resolve()
+    return next((p for p in candidates if p.parent == fallback), None)
+
+
+class CameraCatalog:
+    """Cameras and their asset files, resolved once per scan.
+
+    Every directory under base_dir with a vidio/ or models/ subdirectory is
+    an asset directory. Configured cameras are resolved against them (with
+    the old first-file fallback), and videos no camera claims become cameras
+    of their own. Video metadata, fingerprints and model class lists are
+    cached in cache_path by (size, mtime), so a rescan only probes new or
+    changed files and requests never touch the filesystem.
+    """
+
+    def __init__(self, base_dir, cache_path, configs):
+        self.base_dir = Path(base_dir).resolve()
+        self.cache_path = Path(cache_path)
+        self.configured = dict(configs)
+        self.cameras = {}   # Camera id -> config with resolved "video_file"/"model_file"
+        self.files = {}     # Absolute path -> cached metadata
+        self.scanned_at = None
+        self._lock = threading.Lock()
+        try:
+            self.files = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            pass
+
+    def scan(self):
+        """Rescan asset directories; returns the resolved camera configs"""
+        started = time.perf_counter()
+        asset_dirs = [d for d in sorted(self.base_dir.iterdir())
+                      if (d / VIDEO_SUBDIR).is_dir() or (d / MODEL_SUBDIR).is_dir()]
+        videos = [v for d in asset_dirs for v in list_files(d / VIDEO_SUBDIR, VIDEO_EXTENSIONS)]
+        models = [m for d in asset_dirs for m in list_files(d / MODEL_SUBDIR, MODEL_EXTENSIONS)]
+
+        cameras = {}
+        for camera_id, config in self.configured.items():
+            asset_dir = self.base_dir / config.get("base_dir", "MORN_CITY")
+            source = config.get("source")
+            video = None
+            if not (source and is_live_source(source)):
+                video = resolve_file(asset_dir, source or config.get("video_path"), VIDEO_SUBDIR, videos)
+            model = resolve_file(asset_dir, config.get("model_path"), MODEL_SUBDIR, models)
+            cameras[camera_id] = dict(config, video_file=video, model_file=model)
+
+        # Videos no configured camera uses become cameras named after their directory
+        claimed = {c["video_file"] for c in cameras.values()}
+        for video in videos:
+            if video in claimed:
+                continue
+            asset_dir = video.parent.parent
+            camera_id = slug(asset_dir.name, "camera")
+            if camera_id in cameras:
+                camera_id = f"{camera_id}_{slug(video.stem, 'video')}"
+            model = next((m for m in models if m.parent.parent == asset_dir), None)
+            cameras[camera_id] = {
+                "base_dir": asset_dir.name,
+                "video_path": str(video.relative_to(asset_dir)),
+                "model_path": str(model.relative_to(asset_dir)) if model else None,
+                "default_target": "",
+                "discovered": True,
+                "video_file": video,
+                "model_file": model,
+            }
+
+        with self._lock:
+            for config in cameras.values():
+                for kind in ("video", "model"):
+                    path = config[f"{kind}_file"]
+                    if path is not None:
+                        self._refresh(path, kind)
+            for config in cameras.values():
+                model = config["model_file"]
+                classes = self.files.get(str(model), {}).get('classes') if model else None
+                if config.get("discovered") and classes:
+                    config["default_target"] = classes[min(classes, key=int)]
+                config["video_fingerprint"] = (self.files[str(config["video_file"])]['fingerprint']
+                                               if config["video_file"] else None)
+                # Startable with the YOLO backend: a video or live source and resolvable weights
+                has_source = bool(config["video_file"] or is_live_source(config.get("source") or ""))
+                config["available"] = has_source and config["model_file"] is not None
+            self.cameras = cameras
+            self.scanned_at = time.time()
+            self._save()
+        no_video = [c for c, config in cameras.items()
+                    if not (config["video_file"] or is_live_source(config.get("source") or ""))]
+        no_model = [c for c, config in cameras.items() if config["model_file"] is None]
+        log.info("🗂️ Camera catalog: %d cameras (%d discovered)%s%s in %.2fs", len(cameras),
+                 sum(1 for c in cameras.values() if c.get("discovered")),
+                 f", no video for {', '.join(no_video)}" if no_video else "",
+                 f", no model for {', '.join(no_model)}" if no_model else "", time.perf_counter() - started)
+        return cameras
+
+    def _refresh(self, path, kind):
+        """Cached metadata of path, re-probed when its size or mtime changed"""
+        stat = path.stat()
+        entry = self.files.get(str(path))
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry
+        entry = {'kind': kind, 'size': stat.st_size, 'mtime': stat.st_mtime,
+                 'fingerprint': file_fingerprint(path)}
+        if kind == "video":
+            entry['video'] = probe_video(path)
+        self.files[str(path)] = entry
+        return entry
+
+    def record_classes(self, model_file, names):
+        """Remember a loaded model's class list for the catalog endpoint"""
+        if model_file is None or not isinstance(names, dict):
+            return
+        classes = {str(k): v for k, v in names.items()}
+        with self._lock:
+            entry = self.files.get(str(model_file))
+            if entry is None or entry.get('classes') == classes:
+                return
+            entry['classes'] = classes
+            self._save()
+
+    def fingerprint(self, path):
+        entry = self.files.get(str(path)) if path else None
+        return entry['fingerprint'] if entry else None
+
+    def _display(self, path):
+        if path is None:
+            return None
+        try:
+            return str(path.relative_to(self.base_dir))
+        except ValueError:
+            return str(path)
+
+    def _save(self):
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.files, indent=1))
+            tmp.replace(self.cache_path)
+        except OSError as e:
+            log.warning("⚠️ Could not save camera catalog cache: %s", e)
+
+    def describe(self):
+        """Catalog as JSON: per camera its files, video metadata and model classes"""
+        with self._lock:
+            cameras = {}
+            for camera_id, config in self.cameras.items():
+                video, model = config["video_file"], config["model_file"]
+                video_entry = self.files.get(str(video), {}) if video else {}
+                model_entry = self.files.get(str(model), {}) if model else {}
+                cameras[camera_id] = {
+                    'available': config["available"],
+                    'discovered': bool(config.get("discovered")),
+                    'source': config.get("source"),
+                    'video': self._display(video),
+                    'video_meta': video_entry.get('video'),
+                    'model': self._display(model),
+                    'model_size_bytes': model_entry.get('size'),
+                    'classes': model_entry.get('classes'),
+                    'default_target': config.get("default_target"),
+                }
+            return {'scanned_at': self.scanned_at, 'cameras': cameras}
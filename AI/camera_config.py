@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+from log_setup import get_logger
+
+DEFAULT_CONF = 0.25    # Detection confidence unless a camera sets "conf"
+DEFAULT_MAX_FPS = 25   # Processed frames per second unless a camera sets "max_fps"
+# Read by the frame loop on every frame, so changing only these never restarts a camera
+LIVE_KEYS = frozenset({"conf", "max_fps", "roi", "default_target", "reid", "occupancy"})
+# Changing any of these drops the loaded model before the restart
+MODEL_KEYS = frozenset({"model_path", "model_file"})
+
+log = get_logger(__name__)
+
+
+def validate(camera_id, config):
+    """Raise ValueError for settings the session would choke on later"""
+    if not (config.get("video_path") or config.get("source")):
+        raise ValueError(f"{camera_id}: video_path or source is required")
+    conf = config.get("conf", DEFAULT_CONF)
+    if not 0 < float(conf) <= 1:
+        raise ValueError(f"{camera_id}: conf must be in (0, 1], got {conf}")
+    if float(config.get("max_fps", DEFAULT_MAX_FPS)) <= 0:
+        raise ValueError(f"{camera_id}: max_fps must be positive")
+    roi = config.get("roi")
+    if roi is not None:
+        if len(roi) != 4 or not all(0 <= float(v) <= 1 for v in roi) or roi[0] >= roi[2] or roi[1] >= roi[3]:
+            raise ValueError(f"{camera_id}: roi must be [x1, y1, x2, y2] fractions with x1 < x2, y1 < y2")
+
+
+def load_camera_config(path):
+    """{camera id: settings} from a YAML file, with "defaults" merged into each camera"""
+    import yaml  # PyYAML; also a dependency of ultralytics
+    data = yaml.safe_load(Path(path).read_text()) or {}
+    defaults = data.get("defaults") or {}
+    configs = {}
+    for camera_id, settings in (data.get("cameras") or {}).items():
+        camera_id = str(camera_id).strip().lower()
+        config = dict(defaults, **(settings or {}))
+        config.setdefault("default_target", "")
+        validate(camera_id, config)
+        configs[camera_id] = config
+    return configs
+
+
+def changed_keys(old, new):
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+class ConfigWatcher:
+    """Poll a config file and call on_change(configs) after each valid edit.
+
+    A file that fails to parse or validate is logged and ignored; the
+    running configuration stays in place until the next good save.
+    """
+
+    def __init__(self, path, on_change, interval=2.0):
+        self.path = Path(path)
+        self.on_change = on_change
+        self.interval = interval
+        self._mtime = self._stat()
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name="config-watcher").start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            mtime = self._stat()
+            if mtime is None or mtime == self._mtime:
+                continue
+            self._mtime = mtime
+            try:
+                configs = load_camera_config(self.path)
+            except Exception as e:
+                log.error("❌ Camera config not applied (%s): %s", self.path.name, e)
+                continue
+            try:
+                self.on_change(configs)
+            except Exception as e:
+                log.error("❌ Applying camera config failed: %s", e)
@@ -0,0 +1,701 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import cv2
+
+from camera_config import DEFAULT_CONF, DEFAULT_MAX_FPS, LIVE_KEYS, MODEL_KEYS, changed_keys
+from capture import FrameSource, is_live_source
+from best_shot import BestShotGallery
+from clip_recorder import ClipRecorder
+from frame_hub import FrameHub
+from inference_pool import shared_pool
+from log_setup import RateLimiter, get_logger
+from metrics import PipelineMetrics
+from occupancy import OccupancyGrid
+from synthetic import SyntheticModel, cached_synthetic_video
+from overlay import OverlayCompositor
+from reid import PersonMatcher
+from resources import plan_budgets
+from result_cache import LoopCache, file_fingerprint
+from targets import TargetFilter, TargetStats, parse_targets, target_detections
+from track_index import recorded_start
+from tracing import SamplingProfiler, StageTracer, ThreadProfiler
+
+overlay = OverlayCompositor()  # Shared by all sessions; the sprite cache is thread safe
+HOT_LOG_INTERVAL = 5.0  # Seconds between repeated per-frame debug/error messages
+# MODEL_BACKEND=synthetic replaces YOLO with synthetic.SyntheticModel and
+# missing videos with a generated clip, for load tests without weights
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "yolo").lower()
+SYNTHETIC_LATENCY = float(os.environ.get("SYNTHETIC_LATENCY", "0.03"))  # Seconds per inference
+# >0: models run in this many worker processes, fed through shared memory
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "0"))
+# Loop cache for file sources: "detections" (skip inference on later loops),
+# "jpeg" (replay annotated frames without decoding) or "off"; per camera via
+# the "result_cache" config key
+RESULT_CACHE = os.environ.get("RESULT_CACHE", "detections").lower()
+RESULT_CACHE_DIR = Path(os.environ.get("RESULT_CACHE_DIR", Path(__file__).resolve().parent / "cache"))
+RESULT_CACHE_MB = int(os.environ.get("RESULT_CACHE_MB", "1024"))
+# COCO detector that finds people for re-ID; ultralytics downloads it if missing
+REID_PERSON_MODEL = os.environ.get("REID_PERSON_MODEL", "yolov8n.pt")
+# Every Nth frame goes to the track indexer, and to the person detector for "people" occupancy
+TRACK_INDEX_STRIDE = int(os.environ.get("TRACK_INDEX_STRIDE", "3"))
+# Boxes behind the occupancy grid: "targets" (the frame's target detections, no
+# extra inference), "people" (opt-in: runs the COCO person detector every
+# TRACK_INDEX_STRIDE frames) or "off"; per camera via "occupancy"
+OCCUPANCY = os.environ.get("OCCUPANCY", "targets").lower()
+
+
+def load_person_model():
+    """Person detector for re-ID (a synthetic "person" box with the synthetic backend)"""
+    if MODEL_BACKEND == "synthetic":
+        return SyntheticModel(names={0: "person"}, latency=SYNTHETIC_LATENCY)
+    if INFERENCE_WORKERS > 0:
+        return shared_pool(INFERENCE_WORKERS).model(REID_PERSON_MODEL)
+    from ultralytics import YOLO
+    return YOLO(REID_PERSON_MODEL)
+
+
+class CameraSession:
+    """One camera: owns its capture, model, target filter, counters and thread.
+
+    The target filter is an immutable TargetFilter that is swapped in one
+    assignment, so the frame loop reads it once per frame without taking a
+    lock. All targets are searched in a single inference call.
+    """
+
+    def __init__(self, camera_id, config, base_dir, clip_index=None, gallery_index=None, budget=None,
+                 catalog=None, references=None, track_indexer=None, on_first_frame=None):
+        self.camera_id = camera_id
+        self.config = config  # Resolved by CameraCatalog: "video_file", "model_file", ...
+        self.log = get_logger(__name__, camera_id)
+        self._hot_log = RateLimiter(HOT_LOG_INTERVAL)
+        self.catalog = catalog
+        self.model = None
+        self.model_id = None  # Fingerprint of the weights, for the loop cache
+        self.capture = None
+        self.loop_cache = None  # LoopCache while streaming a file source
+        self.clip_index = clip_index
+        self.recorder = None  # ClipRecorder while streaming, if clips are enabled
+        self.gallery_index = gallery_index
+        self.gallery = None   # BestShotGallery while streaming, if enabled
+        self.budget = budget  # resources.ThreadBudget, None = library defaults
+        # Re-ID of targets that have reference photos instead of a model class
+        self.reid = PersonMatcher(references, references.detector) if references is not None else None
+        self.track_indexer = track_indexer
+        self.indexing = None  # While streaming into the track index: the video id, or True for live
+        self.index_start = None  # Recording time of a file's first frame; live tracks use the wall clock
+        self.occupancy = OccupancyGrid()  # Kept across restarts; its windows age out by themselves
+        self.thread_id = None  # Native id of the frame loop thread, for CPU accounting
+        self.hub = FrameHub()
+        self.mirror_hub = None  # Also fed while this is the active camera
+        self.on_first_frame = on_first_frame  # Called with the camera id after each start's first frame
+        self.is_streaming = False
+        self.frame_count = 0
+        self.detections_found = 0  # In the latest frame
+        self.total_detections = 0
+        self.stats = TargetStats()
+        self.metrics = PipelineMetrics()
+        self.last_captured_at = None  # Decode time of the frame being processed
+        self.tracer = None    # StageTracer while a stage trace is being captured
+        self.profiler = None  # ThreadProfiler until the frame loop has dumped it
+        self.sampler = None   # Last SamplingProfiler; busy until its file is written
+        self._capture_lock = threading.Lock()
+        self._targets = TargetFilter(parse_targets(config.get("default_target", "")))
+        self._thread = None
+        self._lock = threading.Lock()  # Serialises start/stop/model loading
+        self._model_lock = threading.Lock()  # Background warm-up and requests may both load
+
+    @property
+    def target(self):
+        """All targets as one display string, e.g. "Fajar, Budi\""""
+        return self._targets.label()
+
+    @property
+    def targets(self):
+        return list(self._targets.names)
+
+    def state(self):
+        return {
+            'camera': self.camera_id,
+            'target': self.target,
+            'targets': self.targets,
+            'per_target': self.stats.snapshot(self._targets.names),
+            'is_streaming': self.is_streaming,
+            'recording': bool(self.recorder and self.recorder.recording),
+            'frame_count': self.frame_count,
+            'detections': self.detections_found,
+            'people': self.occupancy.count,
+            'total_detections': self.total_detections,
+            'capture': self.capture.stats() if self.capture else None,
+            'cpu_budget': self.budget.describe() if self.budget else None,
+        }
+
+    def load_model(self):
+        """Load the YOLO model for this camera (once; concurrent callers wait)"""
+        with self._model_lock:
+            return self.model is not None or self._load_model()
+
+    def _load_model(self):
+        if MODEL_BACKEND == "synthetic":
+            if INFERENCE_WORKERS > 0:
+                self.model = shared_pool(INFERENCE_WORKERS).model(latency=SYNTHETIC_LATENCY)
+            else:
+                self.model = SyntheticModel(latency=SYNTHETIC_LATENCY)
+            self.model_id = "synthetic"
+            self.metrics.model_load_seconds = 0.0
+            self.log.info("🧪 Synthetic model loaded (%.0f ms per frame)", SYNTHETIC_LATENCY * 1000)
+            self.set_target(self.targets)
+            return True
+        try:
+            model_path = self.config.get("model_file")
+            if model_path is None:
+                self.log.error("❌ Model not found: %s", self.config.get("model_path"))
+                return False
+            started = time.perf_counter()
+            if INFERENCE_WORKERS > 0:
+                self.model = shared_pool(INFERENCE_WORKERS).model(model_path)
+            else:
+                # Imported here so the synthetic backend runs without ultralytics/torch
+                from ultralytics import YOLO
+                self.model = YOLO(str(model_path))
+            self.model_id = (self.catalog and self.catalog.fingerprint(model_path)) or file_fingerprint(model_path)
+            self.metrics.model_load_seconds = round(time.perf_counter() - started, 3)
+            self.log.info("✅ Model loaded in %.2fs: %s", self.metrics.model_load_seconds, model_path)
+
+            if hasattr(self.model, 'names'):
+                self.log.info("📋 Available classes: %s",
+                              ", ".join(f"{i}: {n}" for i, n in self.model.names.items()))
+            else:
+                self.log.warning("⚠️ No class names found in model")
+            if self.catalog is not None:
+                self.catalog.record_classes(model_path, getattr(self.model, 'names', None))
+
+            self.set_target(self.targets)
+            return True
+        except Exception as e:
+            self.log.error("❌ Error loading model: %s", e)
+            return False
+
+    def set_target(self, names):
+        """Swap the target filter; picked up by the frame loop on its next frame"""
+        self._targets = TargetFilter(parse_targets(names), getattr(self.model, 'names', None))
+
+    def start(self):
+        """Start the capture/inference thread; return False if it cannot start"""
+        with self._lock:
+            if self.is_streaming:
+                return True
+            if self.model is None and not self.load_model():
+                return False
+
+            source = self.source_path()
+            if source is None:
+                return False
+            self.capture = FrameSource(source, jitter_frames=self.config.get("jitter_frames", 3),
+                                       decode_histogram=self.metrics.stages["decode"],
+                                       budget=self.budget)
+            if not self.capture.start():
+                self.log.error("❌ Could not open video: %s", source)
+                self.capture = None
+                return False
+            if self.clip_index is not None and self.config.get("record_clips", True):
+                self.recorder = ClipRecorder(self.camera_id, self.clip_index,
+                                             fps=self.config.get("max_fps", DEFAULT_MAX_FPS),
+                                             pre_roll=self.config.get("clip_pre_roll", 5.0),
+                                             post_roll=self.config.get("clip_post_roll", 3.0))
+            video_id = None
+            if not self.capture.live:
+                video_id = (self.config.get("video_fingerprint") if source == self.config.get("video_file")
+                            else None) or file_fingerprint(source)
+            cache_mode = self.config.get("result_cache", RESULT_CACHE)
+            if cache_mode in ("detections", "jpeg") and video_id is not None:
+                self.loop_cache = LoopCache(RESULT_CACHE_DIR, video_id, self.model_id,
+                                            self.capture.frame_count, RESULT_CACHE_MB * 2 ** 20,
+                                            store_jpegs=cache_mode == "jpeg")
+            if self.gallery_index is not None and self.config.get("best_shots", True):
+                self.gallery = BestShotGallery(self.camera_id, self.gallery_index)
+            indexer = self.track_indexer
+            if (indexer is not None and self.config.get("track_index", True)
+                    and video_id not in indexer.index.videos):
+                # Live sources are indexed all the time, files once (their first full pass)
+                indexer.open(self.camera_id, video_id)
+                self.indexing = video_id or True
+                self.index_start = (recorded_start(source, self.capture.frame_count, self.capture.fps)
+                                    if video_id is not None else None)
+
+            self.is_streaming = True
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name=f"camera-{self.camera_id}")
+            self._thread.start()
+            self.log.info("🎬 Video streaming started")
+            return True
+
+    def stop(self):
+        """Stop the worker thread and release the capture"""
+        with self._lock:
+            self.is_streaming = False
+            if self._thread and self._thread is not threading.current_thread():
+                self._thread.join(timeout=2.0)  # Let the current frame finish
+            self._thread = None
+            if self.capture:
+                self.capture.stop()
+                self.capture = None
+            if self.recorder:
+                self.recorder.close()
+                self.recorder = None
+            if self.gallery:
+                self.gallery.close()
+                self.gallery = None
+            if self.indexing:
+                self.track_indexer.close(self.camera_id)
+                self.indexing = None
+            if self.loop_cache:
+                self.loop_cache.close()
+                self.loop_cache = None
+
+    def source_path(self):
+        """Live URL from "source", or the resolved local "video_path" file"""
+        source = self.config.get("source")
+        if source and is_live_source(source):
+            return source
+        video_path = self.config.get("video_file")
+        if video_path is None and MODEL_BACKEND == "synthetic":
+            return cached_synthetic_video()
+        if video_path is None:
+            self.log.error("❌ Video not found: %s", source or self.config.get("video_path"))
+            return None
+        return video_path
+
+    def restart(self):
+        self.stop()
+        return self.start()
+
+    def update_config(self, config):
+        """Swap in a config whose changes are all LIVE_KEYS; no restart"""
+        old, self.config = self.config, config
+        self._follow_default_target(old)
+
+    def _follow_default_target(self, old):
+        # A new default_target replaces the targets only while the camera is
+        # still on the old default, not after a /set_target by the user
+        default = parse_targets(self.config.get("default_target", ""))
+        before = parse_targets(old.get("default_target", ""))
+        if default != before and list(self._targets.names) == before:
+            self.set_target(default)
+            self.log.info("🎯 Default target changed: %s", self.target or "-")
+
+    def set_budget(self, budget):
+        """New CPU share without a restart; the running threads apply it on their next frame.
+
+        A changed decode_threads count takes effect when the capture is next opened.
+        """
+        self.budget = budget
+        capture = self.capture
+        if capture is not None:
+            capture.budget = budget
+
+    def reconfigure(self, config, reload_model=False, budget=None):
+        """Swap in a new config, restarting the stream if it was running"""
+        was_streaming = self.is_streaming
+        if was_streaming:
+            self.stop()
+        old, self.config = self.config, config
+        self._follow_default_target(old)
+        if budget is not None:
+            self.budget = budget
+        if reload_model:
+            with self._model_lock:
+                self.model = None  # Loaded again by start()
+                self.model_id = None
+        if was_streaming:
+            self.start()
+
+    @property
+    def capturing(self):
+        """True while a trace or profile of this camera is still running"""
+        sampler = self.sampler
+        return (self.tracer is not None or self.profiler is not None
+                or (sampler is not None and not sampler.done.is_set()))
+
+    def start_trace(self, seconds, out_dir):
+        """Record per-frame stage spans for the next `seconds` seconds; None while another capture runs"""
+        with self._capture_lock:
+            if self.capturing:
+                return None
+            self.tracer = StageTracer(self.camera_id, seconds, out_dir)
+            return self.tracer
+
+    def start_profile(self, seconds, out_dir, mode="sample"):
+        """Profile the frame loop with "sample" (stack sampling) or "cprofile" mode
+
+        Returns None while another capture runs or the loop is not running.
+        """
+        with self._capture_lock:
+            if self.capturing:
+                return None
+            if mode == "cprofile":
+                self.profiler = ThreadProfiler(self.camera_id, seconds, out_dir)
+                return self.profiler
+            thread = self._thread
+            if thread is None:
+                return None
+            self.sampler = SamplingProfiler(self.camera_id, thread.ident, seconds, out_dir).start()
+            return self.sampler
+
+    def _stage(self, name, start, end):
+        """Record one pipeline stage in the metrics and, while tracing, the trace"""
+        if name in self.metrics.stages:
+            self.metrics.observe(name, end - start)
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.span(name, start, end, self.frame_count)
+
+    def _update_captures(self, stopping=False):
+        """Start or finish trace/profile captures; runs on the frame loop thread"""
+        tracer = self.tracer
+        if tracer is not None and (stopping or tracer.expired()):
+            self.tracer = None
+            self.log.info("🧭 Stage trace saved: %s", tracer.finish())
+        profiler = self.profiler
+        if profiler is not None:
+            if stopping or (profiler.enabled and profiler.expired()):
+                self.profiler = None
+                if profiler.enabled:
+                    self.log.info("🧭 Profile saved: %s", profiler.finish())
+            elif not profiler.enabled:
+                profiler.enable()
+
+    def _run(self):
+        """Single producer: run detection once and publish frames to every viewer"""
+        self.thread_id = threading.get_native_id()
+        budget = self.budget
+        if budget is not None:
+            budget.apply("inference")
+        first = True
+        for frame_bytes in self.generate_frames():
+            started = time.perf_counter()
+            if self.budget is not budget:  # Re-planned by SessionRegistry.sync()
+                budget = self.budget
+                budget.apply("inference")
+            self.hub.publish(frame_bytes)
+            mirror = self.mirror_hub
+            if mirror is not None:
+                mirror.publish(frame_bytes)
+            if first:
+                first = False
+                if self.on_first_frame is not None:
+                    self.on_first_frame(self.camera_id)
+            tracer = self.tracer
+            if tracer is not None:
+                tracer.span("send", started, time.perf_counter(), self.frame_count)
+            now = time.time()
+            self.metrics.frame_out(now, now - (self.last_captured_at or now))
+
+    def generate_frames(self):
+        """Generate JPEG-encoded video frames with YOLO detection"""
+        model, video_capture, cache = self.model, self.capture, self.loop_cache
+        log, hot_log, stage = self.log, self._hot_log, self._stage
+        if not model or not video_capture:
+            log.error("❌ Model or video capture not available")
+            return
+
+        log.info("🎯 Starting frame generation for target: %s", self.target)
+        # Checked once: with debug off the per-frame messages cost nothing
+        debug = log.isEnabledFor(logging.DEBUG)
+
+        self.frame_count = 0
+        last_reset_time = time.time()
+        next_due = time.time()
+        fps = video_capture.fps or 30.0
+        last_pts = -1.0
+
+        while self.is_streaming:
+            # Reset frame counter every 5 minutes to prevent overflow
+            if time.time() - last_reset_time > 300:  # 5 minutes
+                self.frame_count = 0
+                last_reset_time = time.time()
+                log.debug("🔄 Frame counter reset")
+            if self.tracer is not None or self.profiler is not None:
+                self._update_captures()
+            # Newest frame from the capture thread; stale ones are skipped. It is a
+            # recycled buffer lent until the next read(), so overlays are drawn into it
+            started = time.perf_counter()
+            frame, pts_ms = video_capture.read(timeout=1.0)
+            if frame is None:
+                continue
+            stage("read", started, time.perf_counter())
+            self.last_captured_at = video_capture.last_captured_at
+
+            self.frame_count += 1
+            frame_count = self.frame_count
+
+            # One read of the swapped-in target filter per frame, no lock needed
+            targets = self._targets
+            current_time = pts_ms / 1000
+
+            # Swapped whole on a config reload; live settings apply from this frame
+            config = self.config
+            conf = config.get("conf", DEFAULT_CONF)
+            roi = config.get("roi")
+
+            # Targets found by re-ID; their matches depend on the gallery, so they are not cached
+            reid = self.reid
+            reid_wanted = reid.wanted(targets) if reid is not None and config.get("reid", True) else None
+            indexing = self.indexing
+            looped = pts_ms < last_pts
+            last_pts = pts_ms
+            if looped and indexing and indexing is not True:
+                # First pass done: every track of the file is indexed
+                self.track_indexer.close(self.camera_id, complete=True)
+                self.indexing = indexing = None
+
+            entry = None
+            if cache is not None and not reid_wanted:
+                frame_idx = int(round(pts_ms * fps / 1000.0))
+                entry = cache.entry(targets.names, conf, roi)
+                if looped:
+                    entry.wrapped(fps)
+                if entry.complete and entry.store_jpegs and not indexing:
+                    yield from self._replay(entry, targets, frame_idx, fps, config)
+                    next_due = time.time()
+                    continue
+
+            found = {}
+            fresh = None  # Newly computed detections, to be cached
+            try:
+                detections = entry.detections(frame_idx, targets.names) if entry is not None else None
+                if detections is None:
+                    # One YOLO pass restricted to every target class at once
+                    started = time.perf_counter()
+                    view, offset_x, offset_y = frame, 0, 0
+                    if roi:
+                        # Inference sees only the region of interest (a view, not a copy)
+                        height, width = frame.shape[:2]
+                        offset_x, offset_y = int(roi[0] * width), int(roi[1] * height)
+                        view = frame[offset_y:int(roi[3] * height), offset_x:int(roi[2] * width)]
+                    if targets.classes is not None:
+                        results = model(view, conf=conf, classes=targets.classes, verbose=False)
+                    else:
+                        results = model(view, conf=conf, verbose=False)
+                    stage("inference", started, time.perf_counter())
+
+                    # Process detections: keep only requested targets
+                    detections = []  # (target name, conf, x1, y1, x2, y2)
+                    if len(results) > 0:
+                        detections = target_detections(results[0], targets, getattr(model, "names", None))
+                    if offset_x or offset_y:
+                        detections = [(name, c, x1 + offset_x, y1 + offset_y, x2 + offset_x, y2 + offset_y)
+                                      for name, c, x1, y1, x2, y2 in detections]
+                    fresh = detections
+                occupancy = config.get("occupancy", OCCUPANCY)
+                if occupancy == "people" and (reid is None or reid.detector.failed):
+                    occupancy = "targets"  # No person detector: count the target boxes instead
+                if indexing and frame_count % TRACK_INDEX_STRIDE == 0:
+                    # A copy of the clean frame; detection and embedding run on the indexer thread
+                    start = self.index_start
+                    self.track_indexer.submit(self.camera_id, frame, time.time() if start is None
+                                              else start + pts_ms / 1000.0)
+                if reid_wanted or (occupancy == "people" and frame_count % TRACK_INDEX_STRIDE == 0):
+                    # One person detection pass serves re-ID and occupancy
+                    started = time.perf_counter()
+                    boxes, vectors = reid.people(frame, embed=bool(reid_wanted))
+                    if reid_wanted:
+                        detections = detections + reid.match(boxes, vectors, reid_wanted)
+                    if occupancy == "people" and reid.detector.ready():
+                        self.occupancy.update(boxes, frame.shape, time.time(), "people")
+                    stage("reid", started, time.perf_counter())
+                if debug and hot_log.allow("frame"):
+                    log.debug("📊 Frame %d: %d target detections", frame_count, len(detections))
+                started = time.perf_counter()
+
+                # Best shots are cropped from the clean frame, before drawing
+                gallery = self.gallery
+                if gallery is not None:
+                    gallery.update(frame, detections, time.time())
+                if occupancy == "targets":
+                    self.occupancy.update([box for _, _, *box in detections], frame.shape, time.time(), "targets")
+                stage_end = time.perf_counter()
+                stage("postprocess", started, stage_end)
+                started = stage_end
+
+                detections_found = len(detections)
+                overlay.draw_detections(frame, detections, targets.colors)
+                for target_name, conf, *_ in detections:
+                    found[target_name] = found.get(target_name, 0) + 1
+                    if debug and hot_log.allow(target_name):
+                        log.debug("🎯 Target '%s' detected with confidence: %.2f", target_name, conf)
+                self.detections_found = detections_found
+                self.total_detections += detections_found
+                self.stats.update(found, current_time)
+
+                # Add info overlay
+                minutes = int(current_time // 60)
+                seconds = int(current_time % 60)
+
+                overlay.draw_text(frame, f"Time: {minutes:02d}:{seconds:02d}", (10, 30), (255, 255, 255))
+                overlay.draw_text(frame, f"Video: {self.camera_id.upper()}", (10, 60), (255, 255, 0))
+                overlay.draw_text(frame, f"Target: {targets.label()}", (10, 90), (0, 255, 255))
+                overlay.draw_text(frame, f"Frame: {frame_count}", (10, 120), (255, 255, 255))
+                overlay.draw_text(frame, f"Detections: {detections_found}", (10, 150), (0, 255, 255))
+                if len(targets.names) > 1:
+                    # One counter line per target, in that target's box colour
+                    for i, name in enumerate(targets.names):
+                        overlay.draw_text(frame, f"{name}: {found.get(name, 0)}",
+                                          (10, 180 + 30 * i), targets.colors[name])
+                stage("overlay", started, time.perf_counter())
+
+            except Exception as e:
+                fresh = None  # Never cache a half-processed frame
+                if hot_log.allow("error"):
+                    log.error("❌ Error processing frame %d: %s", frame_count, e)
+                # Add error message to frame
+                cv2.putText(frame, f"Error: {str(e)}",
+                            (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+
+            # Convert frame to JPEG with timeout
+            try:
+                started = time.perf_counter()
+                ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+                stage("encode", started, time.perf_counter())
+                if ret:
+                    frame_bytes = buffer.tobytes()
+                    if fresh is not None and entry is not None:
+                        entry.put(frame_idx, fresh, frame_bytes)
+                    recorder = self.recorder
+                    if recorder is not None:
+                        # Reuses the stream JPEG; clip encoding runs on the recorder thread
+                        recorder.push(frame_bytes, found)
+                    yield frame_bytes
+                else:
+                    log.error("❌ Failed to encode frame %d", frame_count)
+            except Exception as e:
+                log.error("❌ Frame encoding error: %s", e)
+
+            # Cap the output rate; time already spent on this frame counts
+            next_due = max(next_due + 1 / config.get("max_fps", DEFAULT_MAX_FPS), time.time())
+            time.sleep(max(0.0, next_due - time.time()))
+
+        self._update_captures(stopping=True)
+
+    def _replay(self, entry, targets, frame_idx, fps, config):
+        """Serve a fully cached loop without decoding, until the targets change"""
+        video_capture = self.capture
+        video_capture.pause()
+        self.log.info("♻️ Replaying cached loop (%d frames)", entry.frame_count)
+        origin, origin_idx = time.time(), frame_idx
+        frame_count = max(1, entry.frame_count)
+        reid = self.reid
+        while self.is_streaming and self._targets is targets and self.config is config:
+            if reid is not None and config.get("reid", True) and reid.wanted(targets):
+                break  # A reference photo was added for a target: back to live processing
+            frame_idx = (origin_idx + int((time.time() - origin) * fps)) % frame_count
+            jpeg = entry.jpeg(frame_idx)
+            if jpeg is None:
+                break
+            detections = entry.detections(frame_idx, targets.names) or []
+            found = {}
+            for name, *_ in detections:
+                found[name] = found.get(name, 0) + 1
+            self.frame_count += 1
+            self.detections_found = len(detections)
+            self.total_detections += len(detections)
+            self.stats.update(found, frame_idx / fps)
+            self.last_captured_at = time.time()
+            recorder = self.recorder
+            if recorder is not None:
+                recorder.push(jpeg, found)
+            yield jpeg
+            time.sleep(1 / config.get("max_fps", DEFAULT_MAX_FPS))
+        video_capture.resume(frame_idx)
+
+
+class SessionRegistry:
+    """All camera sessions by id, plus the legacy "current video" selection.
+
+    Frames of the active camera are mirrored into active_hub, so viewers of
+    the un-parameterised /video_feed follow /set_video switches seamlessly.
+    """
+
+    def __init__(self, configs, base_dir, active_id, clip_index=None, gallery_index=None, catalog=None,
+                 references=None, track_indexer=None, on_first_frame=None):
+        self.base_dir = base_dir
+        self.clip_index = clip_index
+        self.gallery_index = gallery_index
+        self.catalog = catalog
+        self.references = references  # reid.ReferenceGallery shared by every camera
+        self.track_indexer = track_indexer  # track_index.TrackIndexer shared by every camera
+        self.on_first_frame = on_first_frame
+        budgets = plan_budgets(configs, in_process_inference=not INFERENCE_WORKERS)
+        self.sessions = {camera_id: CameraSession(camera_id, config, base_dir, clip_index, gallery_index,
+                                                  budgets[camera_id], catalog, references, track_indexer,
+                                                  on_first_frame)
+                         for camera_id, config in configs.items()}
+        self.active_hub = FrameHub()
+        self.active_id = None
+        self.activate(active_id)
+
+    def sync(self, configs):
+        """Apply resolved camera configs, touching only cameras that changed.
+
+        New cameras get a session, removed ones are stopped (except the active
+        camera), live-only changes are swapped in, and anything else restarts
+        that one camera; its model is reloaded only if the model changed.
+        When the CPU plan changes, every other camera gets its new share too.
+        Callers serialise syncs.
+        """
+        sessions = dict(self.sessions)  # Swapped in whole; readers iterate without a lock
+        report = {'added': [], 'removed': [], 'updated': [], 'restarted': []}
+        changes = {camera_id: changed_keys(sessions[camera_id].config, config)
+                   for camera_id, config in configs.items() if camera_id in sessions}
+        budgets = None
+        if set(configs) != set(sessions) or any(keys - LIVE_KEYS for keys in changes.values()):
+            budgets = plan_budgets(configs, in_process_inference=not INFERENCE_WORKERS)
+        for camera_id in list(sessions):
+            if camera_id not in configs and camera_id != self.active_id:
+                sessions.pop(camera_id).stop()
+                report['removed'].append(camera_id)
+        for camera_id, config in configs.items():
+            session = sessions.get(camera_id)
+            if session is None:
+                sessions[camera_id] = CameraSession(camera_id, config, self.base_dir, self.clip_index,
+                                                    self.gallery_index, budgets[camera_id], self.catalog,
+                                                    self.references, self.track_indexer,
+                                                    self.on_first_frame)
+                report['added'].append(camera_id)
+            elif changes[camera_id] and changes[camera_id] <= LIVE_KEYS:
+                session.update_config(config)
+                report['updated'].append(camera_id)
+            elif changes[camera_id]:
+                session.reconfigure(config, reload_model=bool(changes[camera_id] & MODEL_KEYS),
+                                    budget=budgets[camera_id])
+                report['restarted'].append(camera_id)
+            if (budgets is not None and camera_id not in report['added'] + report['restarted']
+                    and (session.budget is None or session.budget.describe() != budgets[camera_id].describe())):
+                session.set_budget(budgets[camera_id])
+                if camera_id not in report['updated']:
+                    report['updated'].append(camera_id)
+        self.sessions = sessions
+        return report
+
+    def __contains__(self, camera_id):
+        return camera_id in self.sessions
+
+    def get(self, camera_id=None):
+        """Session by id, or the active one when camera_id is None"""
+        return self.sessions.get(camera_id or self.active_id)
+
+    def hub(self, camera_id=None):
+        if camera_id is None:
+            return self.active_hub
+        session = self.sessions.get(camera_id)
+        return session.hub if session else None
+
+    def activate(self, camera_id):
+        """Make camera_id the target of the legacy /video_feed and /set_* routes"""
+        for session in self.sessions.values():
+            session.mirror_hub = self.active_hub if session.camera_id == camera_id else None
+        self.active_id = camera_id
+        return self.sessions[camera_id]
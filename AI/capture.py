@@ -0,0 +1,301 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from frame_pool import FramePool
+
+# Prefer TCP for RTSP: UDP drops whole frames on lossy links
+os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", "rtsp_transport;tcp")
+
+log = logging.getLogger(__name__)
+
+LIVE_SCHEMES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+OPEN_TIMEOUT_MS = 5000
+READ_TIMEOUT_MS = 5000
+BACKOFF_START = 0.5  # Seconds before the first reconnect attempt
+BACKOFF_MAX = 30.0
+
+
+def is_live_source(source):
+    return str(source).lower().startswith(LIVE_SCHEMES)
+
+
+def open_capture(source, threads=None):
+    """Open a file or stream URL with FFmpeg, with timeouts where supported"""
+    params = []
+    if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+        params += [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, OPEN_TIMEOUT_MS,
+                   cv2.CAP_PROP_READ_TIMEOUT_MSEC, READ_TIMEOUT_MS]
+    if threads and hasattr(cv2, "CAP_PROP_N_THREADS"):
+        params += [cv2.CAP_PROP_N_THREADS, threads]  # FFmpeg otherwise uses every core
+    cap = cv2.VideoCapture(str(source), cv2.CAP_FFMPEG, params)
+    if not cap.isOpened():
+        # Some builds reject the params list; fall back to the default backend
+        cap = cv2.VideoCapture(str(source))
+    # Keep the decoder's own queue short; buffering is done here instead
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+class FrameSource:
+    """Read a camera on a dedicated thread into a small jitter buffer.
+
+    Live sources (RTSP/HTTP/...) are read as fast as they arrive and
+    reconnected with exponential backoff when they drop. Files behave like a
+    live camera: they are paced to their native FPS and loop at the end.
+    read() always returns the newest buffered frame and discards older ones,
+    so a slow consumer never builds up a backlog; latest() peeks at it
+    without waiting. End-to-end latency is therefore bounded by one consumer
+    iteration (e.g. one inference) whatever the source FPS.
+
+    Frames are decoded into recycled buffers (cap.read(image=...)), so a
+    steady stream allocates nothing per frame. A frame returned by read() is
+    lent to the caller until its next read(); the caller may draw into it
+    but must copy anything it keeps longer.
+    """
+
+    def __init__(self, source, jitter_frames=3, loop=None, decode_histogram=None, budget=None):
+        self.source = str(source)
+        self.live = is_live_source(source)
+        self.loop = (not self.live) if loop is None else loop
+        self.fps = 0.0
+        self.frame_count = 0  # Total frames in a file source, 0 if unknown/live
+        self.seq = 0          # Number of the newest decoded frame
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+        self.connected = False
+        self.last_captured_at = None  # Wall time the last read() frame was decoded
+        self.decode_histogram = decode_histogram  # metrics.Histogram of cap.read() seconds
+        self.budget = budget  # resources.ThreadBudget: decoder threads and cores
+        self.thread_id = None  # Native id of the reader thread, for CPU accounting
+        self._buffer = deque(maxlen=jitter_frames)
+        # Buffered frames, the one being decoded and the one lent to the consumer
+        self._pool = FramePool(keep=jitter_frames + 2)
+        self._shape = None  # Decoded frame shape, once known
+        self._lent = None   # Frame returned by the last read()
+        self._cond = threading.Condition()
+        self._latest = (0, None, None)  # (seq, frame, pts_ms)
+        self._seek_to = None
+        self._paused = False
+        self._cap = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Open the source and start the reader thread.
+
+        Files must open immediately; live sources may come up later, so a
+        failed first connect is retried in the background.
+        """
+        self._cap = self._open()
+        self.connected = self._cap.isOpened()
+        if not self.connected:
+            self._cap.release()
+            self._cap = None
+            if not self.live:
+                return False
+        else:
+            self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 0.0
+            if not self.live:
+                self.frame_count = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self._running = True
+        self._thread = threading.Thread(target=self._reader, daemon=True,
+                                        name=f"capture-{os.path.basename(self.source)}")
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self.connected = False
+
+    def latest(self):
+        """Return (seq, frame, pts_ms) of the newest decoded frame without waiting.
+
+        The frame is a copy: its buffer is recycled once the consumer moves on.
+        """
+        with self._cond:
+            seq, frame, pts_ms = self._latest
+            return seq, (frame.copy() if frame is not None else None), pts_ms
+
+    def seek(self, frame_index=0):
+        """Ask the reader thread to jump to a frame (file sources only)"""
+        self._seek_to = frame_index
+
+    def pause(self):
+        """Stop decoding until resume(); the connection stays open"""
+        self._paused = True
+
+    def resume(self, frame_index=None):
+        if frame_index is not None:
+            self._seek_to = frame_index
+        self._paused = False
+
+    def read(self, timeout=1.0):
+        """Return (frame, pts_ms) of the newest frame, or (None, None) on timeout.
+
+        The previously returned frame goes back to the pool.
+        """
+        with self._cond:
+            if not self._buffer:
+                self._cond.wait(timeout)
+            if not self._buffer:
+                return None, None
+            frame, pts_ms, self.last_captured_at = self._buffer.pop()
+            self.frames_dropped += len(self._buffer)
+            for skipped, _, _ in self._buffer:
+                self._pool.give(skipped)
+            self._buffer.clear()
+            self._pool.give(self._lent)
+            self._lent = frame
+            return frame, pts_ms
+
+    def stats(self):
+        return {
+            'source': self.source,
+            'live': self.live,
+            'connected': self.connected,
+            'fps': round(self.fps, 2),
+            'frames_read': self.frames_read,
+            'frames_dropped': self.frames_dropped,
+            'reconnects': self.reconnects,
+            'frame_buffers': self._pool.allocated,
+        }
+
+    def _reconnect(self, delay):
+        """Reopen a dropped live source; return the next backoff delay"""
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self.connected = False
+        log.warning("⚠️ Stream lost: %s; reconnecting in %.1fs", self.source, delay)
+        deadline = time.time() + delay
+        while self._running and time.time() < deadline:
+            time.sleep(0.1)
+        if not self._running:
+            return delay
+        cap = self._open()
+        self.reconnects += 1
+        if not cap.isOpened():
+            cap.release()
+            return min(delay * 2, BACKOFF_MAX)
+        self._cap = cap
+        self.connected = True
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or self.fps
+        log.info("✅ Stream reconnected: %s", self.source)
+        return BACKOFF_START
+
+    def _open(self):
+        budget = self.budget
+        if budget is None:
+            return open_capture(self.source)
+        if not budget.cores:
+            return open_capture(self.source, budget.decode_threads)
+        # FFmpeg's decoder threads inherit the affinity of the thread that opens
+        opened = []
+        def open_pinned():
+            budget.apply("decode")
+            opened.append(open_capture(self.source, budget.decode_threads))
+        opener = threading.Thread(target=open_pinned, name="capture-open")
+        opener.start()
+        opener.join()
+        return opened[0]
+
+    def _reader(self):
+        self.thread_id = threading.get_native_id()
+        budget = self.budget
+        if budget is not None:
+            budget.apply("decode")
+        delay = BACKOFF_START
+        next_due = time.time()
+        while self._running:
+            cap = self._cap
+            if cap is None:
+                delay = self._reconnect(delay)
+                continue
+
+            if self.budget is not budget:  # Re-planned while streaming
+                budget = self.budget
+                budget.apply("decode")
+
+            if self._paused:
+                time.sleep(0.05)
+                next_due = time.time()
+                continue
+            if self._seek_to is not None:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, self._seek_to)
+                self._seek_to = None
+
+            started = time.perf_counter()
+            buffer = self._pool.take(self._shape) if self._shape else None
+            ret, frame = cap.read(image=buffer)
+            if not ret:
+                self._pool.give(buffer)
+                if self.loop:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                if self.live:
+                    delay = self._reconnect(delay)
+                    continue
+                break  # Finite file without looping: end of stream
+
+            if self.decode_histogram is not None:
+                self.decode_histogram.observe(time.perf_counter() - started)
+            if frame is not buffer:
+                self._shape = frame.shape  # First frame or a new resolution: OpenCV allocated
+            pts_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            self.frames_read += 1
+            with self._cond:
+                self.seq += 1
+                self._latest = (self.seq, frame, pts_ms)
+                if len(self._buffer) == self._buffer.maxlen:
+                    self.frames_dropped += 1
+                    self._pool.give(self._buffer[0][0])  # Evicted by the append below
+                self._buffer.append((frame, pts_ms, time.time()))
+                self._cond.notify_all()
+
+            if not self.live and self.fps > 0:
+                # Pace files to real time so they behave like a camera
+                next_due = max(next_due + 1.0 / self.fps, time.time() - 1.0)
+                wait = next_due - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+        self.connected = False
+
+
+if __name__ == "__main__":
+    # Smoke test against any source, e.g. a local file-loop stand-in:
+    #   ffmpeg -re -stream_loop -1 -i MORN_CITY/vidio/Day_Dublin.mp4 -c copy \
+    #          -f mpegts -listen 1 http://127.0.0.1:8554/cam.ts
+    #   python capture.py http://127.0.0.1:8554/cam.ts
+    # Another running backend's MJPEG feed also works as a live stand-in:
+    #   python capture.py http://127.0.0.1:5001/video_feed
+    if len(sys.argv) < 2:
+        print("Usage: python capture.py <file|rtsp://...|http://...> [seconds]")
+        sys.exit(1)
+    src = FrameSource(sys.argv[1])
+    if not src.start():
+        print(f"❌ Could not open {sys.argv[1]}")
+        sys.exit(1)
+    end = time.time() + (float(sys.argv[2]) if len(sys.argv) > 2 else 10.0)
+    consumed = 0
+    while time.time() < end:
+        frame, pts = src.read()
+        if frame is not None:
+            consumed += 1
+            time.sleep(0.05)  # Simulate slow inference: older frames get dropped
+    src.stop()
+    print(f"📊 consumed={consumed} {src.stats()}")
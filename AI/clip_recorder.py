@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from frame_pool import FramePool
+from log_setup import get_logger
+from naming import slug
+
+log = logging.getLogger(__name__)
+
+
+class ClipIndex:
+    """Clips on disk indexed by camera, target and time (persisted as JSON)"""
+
+    def __init__(self, out_dir, max_clips_per_camera=50):
+        self.out_dir = Path(out_dir)
+        self.max_clips_per_camera = max_clips_per_camera
+        self._path = self.out_dir / "index.json"
+        self._lock = threading.Lock()
+        self._clips = []
+        if self._path.exists():
+            try:
+                self._clips = json.loads(self._path.read_text())
+            except (OSError, ValueError) as e:
+                log.warning("⚠️ Could not read clip index %s: %s", self._path, e)
+
+    def add(self, clip):
+        with self._lock:
+            self._clips.append(clip)
+            # Retention: drop the oldest clips of this camera beyond the cap
+            own = [c for c in self._clips if c['camera'] == clip['camera']]
+            for old in own[:-self.max_clips_per_camera]:
+                self._clips.remove(old)
+                try:
+                    os.remove(self.out_dir / old['file'])
+                except OSError:
+                    pass
+            self._save()
+
+    def _save(self):
+        tmp = self._path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._clips, indent=1))
+        os.replace(tmp, self._path)
+
+    def query(self, target=None, camera=None, since=None, until=None):
+        """Clips newest first, filtered by target name, camera and time range"""
+        target_l = target.strip().lower() if target else None
+        with self._lock:
+            clips = list(self._clips)
+        return [
+            c for c in reversed(clips)
+            if (camera is None or c['camera'] == camera)
+            and (target_l is None or target_l in (t.lower() for t in c['targets']))
+            and (since is None or c['end'] >= since)
+            and (until is None or c['start'] <= until)
+        ]
+
+    def get(self, clip_id):
+        with self._lock:
+            for clip in self._clips:
+                if clip['id'] == clip_id:
+                    return clip
+        return None
+
+    def file_path(self, clip):
+        return self.out_dir / clip['file']
+
+
+class ClipRecorder:
+    """Record a clip per target appearance, including a pre-roll.
+
+    push() is the only call on the frame loop: it enqueues the frame (JPEG
+    bytes, or a BGR array copied into a pooled buffer, so the caller may
+    draw into or decode over its own array again) and returns.
+    A writer thread keeps a ring of the last pre_roll seconds as JPEG and, when
+    a target appears, writes that ring plus the live frames to an MP4 until
+    the targets have been absent for post_roll seconds. The MP4 frame rate is
+    measured from the frame timestamps; fps (max_fps) is only an upper bound
+    for the buffer sizes and the rate used before anything was measured.
+    """
+
+    def __init__(self, camera_id, index, fps=25.0, pre_roll=5.0, post_roll=3.0,
+                 max_clip_seconds=120.0, jpeg_quality=80):
+        self.camera_id = camera_id
+        self.log = get_logger(__name__, camera_id)
+        self.index = index
+        self.fps = fps
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.max_clip_seconds = max_clip_seconds
+        self.jpeg_quality = jpeg_quality
+        self.frames_dropped = 0
+        self._ring = deque(maxlen=max(1, int(pre_roll * fps)))
+        self._recent = deque(maxlen=max(2, int(fps * 2)))  # Latest frame timestamps, for the clip frame rate
+        self._queue = queue.Queue(maxsize=max(8, int(fps * 4)))
+        self._pool = FramePool(keep=8)  # Enough while the writer keeps up; a backlog allocates
+        self._clip = None
+        self._thread = threading.Thread(target=self._writer, daemon=True,
+                                        name=f"clips-{camera_id}")
+        self._thread.start()
+
+    def push(self, frame, targets, ts=None):
+        """Queue one frame with the set of target names visible in it"""
+        if self._queue.full():
+            self.frames_dropped += 1  # Checked first so a dropped frame is never copied
+            return
+        if not isinstance(frame, (bytes, bytearray)):
+            frame = self._pool.copy(frame)
+        try:
+            self._queue.put_nowait((time.time() if ts is None else ts, frame, frozenset(targets)))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def close(self):
+        """Finish any open clip and stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join(timeout=10.0)
+
+    @property
+    def recording(self):
+        return self._clip is not None
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._finish_clip()
+                return
+            ts, frame, targets = item
+            try:
+                if not isinstance(frame, (bytes, bytearray)):
+                    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                    self._pool.give(frame)
+                    if not ok:
+                        continue
+                    frame = buffer.tobytes()
+                self._handle(ts, frame, targets)
+            except Exception as e:
+                self.log.error("❌ Clip recorder error: %s", e)
+                self._clip = None
+
+    def measured_fps(self):
+        """Frame rate of the latest frames (dropped ones excluded); fps until measured"""
+        recent = self._recent
+        if len(recent) < 2 or recent[-1] <= recent[0]:
+            return self.fps
+        return (len(recent) - 1) / (recent[-1] - recent[0])
+
+    def _handle(self, ts, jpeg, targets):
+        self._recent.append(ts)
+        clip = self._clip
+        if clip is None:
+            if not targets:
+                ring = self._ring
+                ring.append((ts, jpeg))
+                while ts - ring[0][0] > self.pre_roll:
+                    ring.popleft()
+                return
+            self._start_clip(ts, targets)
+            clip = self._clip
+
+        self._write(jpeg)
+        if targets:
+            clip['last_seen'] = ts
+            clip['targets'].update(targets)
+        clip['end'] = ts
+        if ts - clip['last_seen'] > self.post_roll or ts - clip['start'] > self.max_clip_seconds:
+            self._finish_clip()
+
+    def _start_clip(self, ts, targets):
+        # Named by wall-clock time even when ts is a video timestamp
+        now = datetime.now()
+        clip_id = f"{slug(self.camera_id, 'camera')}_{now:%Y%m%d-%H%M%S}_{now.microsecond // 1000:03d}"
+        self.index.out_dir.mkdir(parents=True, exist_ok=True)
+        pre_roll = list(self._ring)
+        self._ring.clear()
+        self._clip = {
+            'id': clip_id,
+            'camera': self.camera_id,
+            'targets': set(targets),
+            'start': pre_roll[0][0] if pre_roll else ts,
+            'first_seen': ts,
+            'last_seen': ts,
+            'end': ts,
+            'frames': 0,
+            'fps': round(self.measured_fps(), 2),  # Fixed for the whole file
+            'writer': None,
+        }
+        self.log.info("🎥 Recording clip %s (%s)", clip_id, ", ".join(sorted(targets)))
+        for _, jpeg in pre_roll:
+            self._write(jpeg)
+
+    def _write(self, jpeg):
+        clip = self._clip
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return
+        if clip['writer'] is None:
+            height, width = frame.shape[:2]
+            path = self.index.out_dir / f"{clip['id']}.mp4"
+            clip['writer'] = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'),
+                                             clip['fps'], (width, height))
+        clip['writer'].write(frame)
+        clip['frames'] += 1
+
+    def _finish_clip(self):
+        clip, self._clip = self._clip, None
+        if clip is None or clip['writer'] is None:
+            return
+        clip['writer'].release()
+        entry = {
+            'id': clip['id'],
+            'camera': clip['camera'],
+            'targets': sorted(clip['targets']),
+            'start': round(clip['start'], 3),
+            'first_seen': round(clip['first_seen'], 3),
+            'end': round(clip['end'], 3),
+            'frames': clip['frames'],
+            'fps': clip['fps'],
+            'file': f"{clip['id']}.mp4",
+        }
+        self.index.add(entry)
+        self.log.info("💾 Clip saved: %s (%d frames at %.1f fps)", entry['file'], entry['frames'], entry['fps'])
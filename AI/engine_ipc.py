@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Wire format: 1 byte message kind + 4 byte big-endian length + payload
+HEADER = struct.Struct('>cI')
+KIND_JSON = b'J'
+KIND_FRAME = b'F'
+
+
+def send_message(sock, kind, payload):
+    sock.sendall(HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Engine socket closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock):
+    kind, size = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    return kind, _recv_exact(sock, size)
+
+
+class EngineServer:
+    """Expose the capture/inference engine to HTTP workers over a Unix socket.
+
+    A connection either sends {"cmd": "subscribe", "args": {"camera": id}} and
+    then receives every new JPEG from get_hub(id) (latest-only, so a slow
+    worker never backs up the engine), or sends any other command and gets a
+    JSON reply back per request. handle_command(cmd, args) must return a
+    (payload, status) tuple.
+    """
+
+    def __init__(self, path, get_hub, handle_command):
+        self.path = path
+        self.get_hub = get_hub
+        self.handle_command = handle_command
+        self._sock = None
+
+    def serve_forever(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        os.chmod(self.path, 0o660)
+        self._sock.listen(64)
+        log.info("🔌 Engine listening on %s", self.path)
+        while True:
+            conn, _ = self._sock.accept()
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def _serve_client(self, conn):
+        try:
+            while True:
+                kind, payload = recv_message(conn)
+                if kind != KIND_JSON:
+                    continue
+                request = json.loads(payload)
+                if request.get('cmd') == 'subscribe':
+                    self._stream_frames(conn, (request.get('args') or {}).get('camera'))
+                    return
+                try:
+                    result, status = self.handle_command(request.get('cmd'), request.get('args') or {})
+                except Exception as e:
+                    result, status = {'error': f'Error: {str(e)}'}, 500
+                reply = json.dumps({'payload': result, 'status': status}).encode()
+                send_message(conn, KIND_JSON, reply)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _stream_frames(self, conn, camera):
+        hub = self.get_hub(camera)
+        if hub is None:
+            return
+        last_seq = 0
+        while True:
+            seq, frame = hub.wait(last_seq)
+            if frame is None or seq == last_seq:
+                continue
+            last_seq = seq
+            send_message(conn, KIND_FRAME, frame)
+
+
+class EngineClient:
+    """Stateless HTTP worker side: forward commands, mirror frames locally.
+
+    Every call has a connection of its own, taken from a few idle ones kept
+    open, so a slow command (a video switch loading a model) never holds up
+    /health or the status routes of the same worker.
+    """
+
+    def __init__(self, path, timeout=10.0, command_timeouts=None, max_idle=4):
+        self.path = path
+        self.timeout = timeout
+        self.command_timeouts = command_timeouts or {}  # cmd -> seconds, for commands that may load a model
+        self.max_idle = max_idle
+        self._idle = []  # Open connections between calls
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+    def call(self, cmd, **args):
+        """Run a command in the engine and return its (payload, status).
+
+        Only a failed connect or send is retried (e.g. after an engine
+        restart). Once sent, a command may be running, and running a
+        non-idempotent one such as set_video twice is worse than an error.
+        """
+        message = json.dumps({'cmd': cmd, 'args': args}).encode()
+        timeout = self.command_timeouts.get(cmd, self.timeout)
+        for attempt in range(2):
+            conn = None
+            try:
+                # An idle connection may have died with an engine restart: the retry connects afresh
+                conn = self._take() if not attempt else None
+                if conn is None:
+                    conn = self._connect()
+                send_message(conn, KIND_JSON, message)
+            except OSError:  # Includes ConnectionError
+                if conn is not None:
+                    conn.close()
+                if attempt:
+                    return {'error': 'Engine tidak tersedia'}, 503
+                continue
+            try:
+                conn.settimeout(timeout)
+                _, payload = recv_message(conn)
+            except socket.timeout:
+                conn.close()  # Its late reply would be read as the next command's
+                return {'error': f'Engine tidak merespons dalam {timeout:.0f} detik'}, 504
+            except OSError:
+                conn.close()
+                return {'error': 'Engine tidak tersedia'}, 503
+            self._give(conn)
+            reply = json.loads(payload)
+            return reply['payload'], reply['status']
+
+    def _take(self):
+        with self._lock:
+            return self._idle.pop() if self._idle else None
+
+    def _give(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def start_relay(self, hub, camera=None):
+        """Republish a camera's engine frames into a local FrameHub"""
+        thread = threading.Thread(target=self._relay, args=(hub, camera), daemon=True)
+        thread.start()
+        return thread
+
+    def _relay(self, hub, camera):
+        delay = 0.5
+        while True:
+            sock = None
+            try:
+                sock = self._connect()
+                sock.settimeout(None)
+                send_message(sock, KIND_JSON, json.dumps({'cmd': 'subscribe', 'args': {'camera': camera}}).encode())
+                delay = 0.5
+                while True:
+                    kind, payload = recv_message(sock)
+                    if kind == KIND_FRAME:
+                        hub.publish(payload)
+            except (ConnectionError, OSError) as e:
+                if sock is not None:
+                    sock.close()
+                log.warning("⚠️ Engine relay disconnected: %s; retrying in %.1fs", e, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 10.0)
@@ -0,0 +1,234 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from benchmark import load_model
+from camera_config import DEFAULT_CONF
+from result_cache import file_fingerprint
+from synthetic import SyntheticModel
+from targets import TargetFilter, parse_targets, target_detections
+
+IOU_MATCH = 0.5  # A fast-config box counts as the same sighting above this IoU
+STRIDE = 32  # YOLO input sizes are multiples of this
+# A saved reference is only scored against runs with the same values
+REFERENCE_KEYS = ('video', 'model', 'targets', 'max_frames', 'imgsz')
+
+
+def parse_config(text):
+    """'imgsz=320,skip=2,conf=0.3,roi=0:0.2:1:1,model=x.onnx' -> dict"""
+    config = {'imgsz': None, 'skip': 1, 'conf': DEFAULT_CONF, 'roi': None, 'model': None}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        key, _, value = item.partition('=')
+        if key not in config:
+            raise ValueError(f"Unknown setting: {key}")
+        if key in ('imgsz', 'skip'):
+            config[key] = int(value)
+        elif key == 'conf':
+            config[key] = float(value)
+        elif key == 'roi':
+            config[key] = [float(v) for v in value.split(':')]  # x1:y1:x2:y2 as fractions
+        else:
+            config[key] = value
+    config['label'] = text or 'reference'
+    return config
+
+
+def detect_video(video_path, model, targets, config, max_frames=None):
+    """Detections of every frame under one configuration.
+
+    Frames skipped by config['skip'] reuse the last processed frame's boxes,
+    which is what a viewer of a frame-skipping stream would see.
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    kwargs = {'conf': config['conf'], 'verbose': False}
+    if targets.classes is not None:
+        kwargs['classes'] = targets.classes
+    if config['imgsz']:
+        kwargs['imgsz'] = config['imgsz']
+    names = getattr(model, 'names', None)
+
+    frames, last, index, busy = [], [], 0, 0.0
+    while max_frames is None or index < max_frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if index % config['skip'] == 0:
+            started = time.perf_counter()
+            offset_x = offset_y = 0
+            if config['roi']:
+                height, width = frame.shape[:2]
+                x1, y1, x2, y2 = config['roi']
+                offset_x, offset_y = int(x1 * width), int(y1 * height)
+                frame = frame[offset_y:int(y2 * height), offset_x:int(x2 * width)]
+            if isinstance(model, SyntheticModel):
+                kwargs['frame_index'] = index  # Same boxes for the same frame in every run
+            results = model(frame, **kwargs)
+            last = [(name, conf, bx1 + offset_x, by1 + offset_y, bx2 + offset_x, by2 + offset_y)
+                    for name, conf, bx1, by1, bx2, by2
+                    in (target_detections(results[0], targets, names) if results else [])]
+            busy += time.perf_counter() - started
+        frames.append(last)
+        index += 1
+    cap.release()
+    return {'fps': fps, 'frames': frames, 'inference_seconds': busy}
+
+
+def iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def score(reference, run, target_names):
+    """Recall, first-sighting delay and IoU of run against the reference"""
+    fps = reference['fps']
+    per_target = {}
+    for name in target_names:
+        present = hits = 0
+        ious = []
+        first_ref = first_run = None
+        for i, (ref_boxes, run_boxes) in enumerate(zip(reference['frames'], run['frames'])):
+            ref = [d[2:] for d in ref_boxes if d[0] == name]
+            got = [d[2:] for d in run_boxes if d[0] == name]
+            if got and first_run is None:
+                first_run = i
+            if not ref:
+                continue
+            if first_ref is None:
+                first_ref = i
+            present += 1
+            best = max((iou(r, g) for r in ref for g in got), default=0.0)
+            if best >= IOU_MATCH:
+                hits += 1
+                ious.append(best)
+        per_target[name] = {
+            'frames_present': present,
+            'recall': round(hits / present, 4) if present else None,
+            'mean_iou': round(float(np.mean(ious)), 4) if ious else None,
+            'first_seen_s': round(first_ref / fps, 2) if first_ref is not None else None,
+            'first_seen_delay_s': (round((first_run - first_ref) / fps, 2)
+                                   if first_ref is not None and first_run is not None else None),
+        }
+    recalls = [t['recall'] for t in per_target.values() if t['recall'] is not None]
+    processed = len(run['frames'])
+    return {
+        'recall': round(float(np.mean(recalls)), 4) if recalls else None,
+        'video_fps_capacity': (round(processed / run['inference_seconds'], 1)
+                               if run['inference_seconds'] > 0 else None),
+        'targets': per_target,
+    }
+
+
+def pareto(rows):
+    """Mark rows that no other row beats on both recall and throughput"""
+    for row in rows:
+        r, f = row['recall'] or 0.0, row['video_fps_capacity'] or 0.0
+        row['pareto'] = not any(
+            (o['recall'] or 0.0) >= r and (o['video_fps_capacity'] or 0.0) >= f
+            and ((o['recall'] or 0.0) > r or (o['video_fps_capacity'] or 0.0) > f)
+            for o in rows if o is not row)
+    return rows
+
+
+def native_imgsz(video_path):
+    """Longest side of the video rounded up to the model stride: inference without downscaling"""
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {video_path}")
+    side = max(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+    return -(-side // STRIDE) * STRIDE
+
+
+def run_identity(video, model_path, model_name, targets, max_frames, imgsz):
+    """What a reference run depends on, stored with it and checked when it is reused"""
+    return {
+        'video': f"{Path(video).name}:{file_fingerprint(video)}",
+        'model': f"{model_name}:{file_fingerprint(model_path)}" if model_path and Path(model_path).exists()
+                 else model_name,
+        'targets': list(targets.names),
+        'max_frames': max_frames,
+        'imgsz': imgsz,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare fast detection settings with a full-quality reference run "
+                    "(every frame, native size): target recall, first-sighting delay, box IoU "
+                    "and throughput, with the Pareto-optimal settings marked.")
+    parser.add_argument("video", help="Video file to evaluate on")
+    parser.add_argument("--model", help="Reference model weights; default: synthetic model")
+    parser.add_argument("--targets", help="Target names, e.g. 'Fajar, Dublin'; default: all classes")
+    parser.add_argument("--config", action="append", default=[],
+                        help="Fast setting, repeatable: 'imgsz=320,skip=2,conf=0.3,roi=0:0.3:1:1,"
+                             "model=int8.onnx'")
+    parser.add_argument("--reference", help="Reference detections JSON; created if missing")
+    parser.add_argument("--max-frames", type=int, help="Only evaluate the first N frames")
+    parser.add_argument("--out", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    model, model_name = load_model(args.model)
+    names = getattr(model, 'names', {}) or {}
+    targets = TargetFilter(parse_targets(args.targets or list(names.values())), names)
+
+    imgsz = native_imgsz(args.video)
+    identity = run_identity(args.video, args.model, model_name, targets, args.max_frames, imgsz)
+    reference_path = Path(args.reference) if args.reference else None
+    if reference_path and reference_path.exists():
+        reference = json.loads(reference_path.read_text())
+        stale = [key for key in REFERENCE_KEYS if reference.get(key) != identity[key]]
+        if stale:
+            raise SystemExit("❌ Reference " + str(reference_path) + " is for a different run ("
+                             + ", ".join(f"{key}: {reference.get(key)!r} != {identity[key]!r}" for key in stale)
+                             + "); delete it or pass another --reference")
+        print(f"📂 Reference loaded: {reference_path} ({len(reference['frames'])} frames)")
+    else:
+        print(f"🎯 Reference run: {model_name}, every frame, native size (imgsz={imgsz})...")
+        reference = dict(detect_video(args.video, model, targets, dict(parse_config(''), imgsz=imgsz),
+                                      args.max_frames), **identity)
+        if reference_path:
+            reference_path.write_text(json.dumps(reference))
+            print(f"💾 Reference saved: {reference_path}")
+
+    rows = [dict(config='reference', **score(reference, reference, targets.names))]
+    rows[0]['video_fps_capacity'] = (round(len(reference['frames']) / reference['inference_seconds'], 1)
+                                     if reference['inference_seconds'] > 0 else None)
+    # Each model with the targets resolved against its own class ids
+    models = {None: (model, targets)}
+    for text in args.config:
+        config = parse_config(text)
+        if config['model'] not in models:
+            other = load_model(config['model'])[0]
+            models[config['model']] = (other, TargetFilter(targets.names, getattr(other, 'names', {}) or {}))
+        run_model, run_targets = models[config['model']]
+        print(f"⏱️ {config['label']}...")
+        run = detect_video(args.video, run_model, run_targets, config, len(reference['frames']))
+        rows.append(dict(config=config['label'], **score(reference, run, targets.names)))
+
+    pareto(rows)
+    print(f"\n{'config':40} {'recall':>8} {'fps cap':>9} {'first-seen delay':>17}  pareto")
+    for row in rows:
+        delays = [t['first_seen_delay_s'] for t in row['targets'].values()
+                  if t['first_seen_delay_s'] is not None]
+        delay = f"{max(delays):.2f}s" if delays else "-"
+        print(f"{row['config'][:40]:40} {row['recall'] if row['recall'] is not None else '-':>8} "
+              f"{row['video_fps_capacity'] or '-':>9} {delay:>17}  {'✅' if row['pareto'] else ''}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({'video': str(args.video), 'model': model_name,
+                                              'targets': list(targets.names), 'runs': rows}, indent=1))
+        print(f"💾 Report saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,32 @@
-from flask import Flask, render_template, Response, request, jsonify
+from flask import Flask, render_template, Response, request, jsonify, send_file
 from flask_cors import CORS
-from ultralytics import YOLO
-import cv2
-import numpy as np
-import threading
-import time
 from pathlib import Path
-import threading
+import base64
+import binascii
 import os
+import threading
+import time
+
+from camera_catalog import CameraCatalog
+from camera_config import ConfigWatcher, load_camera_config
+from camera_session import INFERENCE_WORKERS, MODEL_BACKEND, SessionRegistry, load_person_model
+from occupancy import WINDOWS as OCCUPANCY_WINDOWS
+from clip_recorder import ClipIndex
+from engine_ipc import EngineClient, EngineServer
+from frame_hub import FrameHub
+from log_setup import get_logger, setup_logging
+from metrics import Exposition, process_rss_bytes, thread_cpu_seconds
+from reid import PersonDetector, ReferenceGallery, make_embedder
+from startup import StartupTimeline
+from targets import parse_targets
+from track_index import TrackIndex, TrackIndexer
+from tracing import MAX_CAPTURE_SECONDS, list_captures
+
+setup_logging()  # LOG_LEVEL / LOG_FORMAT; writes happen on a background thread
+log = get_logger(__name__)
+# Interpreter start and the light imports above; ultralytics/torch load in warm_up()
+startup = StartupTimeline()
+startup.mark('imports')
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Vue.js frontend
@@ -20,400 +39,815 @@ TEMPLATE_DIR = BASE_DIR / "PASAR" / "templates"
 # Ensure Flask knows where templates live (reuse PASAR templates)
 app.template_folder = str(TEMPLATE_DIR)
 
-# Global variables
-current_target = "Fajar"
-current_video = "pasar"
-model = None
-video_capture = None
-is_streaming = False
-stream_thread = None
-target_lock = threading.Lock()  # Thread safety for target changes
-video_lock = threading.Lock()   # Thread safety for video changes
-
-# Video configurations
-VIDEO_CONFIGS = {
-    # Pasar Central - uses AI/PASAR assets (Philippine)
-    "pasar": {
-        "base_dir": "PASAR",
-        "model_path": "models/Day_Philipine.pt",
-        "video_path": "vidio/Day_Philipine.mp4",
-        "default_target": "Fajar"
-    },
-    # Dublin - uses AI/MORN_CITY assets
-    "dublin": {
-        "base_dir": "MORN_CITY",
-        "model_path": "models/Day_Dublin.pt",
-        "video_path": "vidio/Day_Dublin.mp4",
-        "default_target": "Dublin"
-    },
-    # Night City - uses AI/NIGHT_CITY assets
-    "night_city": {
-        "base_dir": "NIGHT_CITY",
-        "model_path": "models/Night_Dublin.pt",
-        "video_path": "vidio/Night_Dublin.mp4",
-        "default_target": "George"
-    }
-}
+# Process role: standalone (default), engine (inference only) or worker (HTTP only)
+ENGINE_ROLE = os.environ.get('ENGINE_ROLE', 'standalone').lower()
+ENGINE_SOCKET = os.environ.get('ENGINE_SOCKET', '/tmp/ui-aic-engine.sock')
+# Worker-side wait for commands that may load a model or start a capture (others: 10s)
+ENGINE_SLOW_TIMEOUT = float(os.environ.get('ENGINE_SLOW_TIMEOUT', '180'))
+SLOW_COMMANDS = ('set_video', 'start_stream', 'restart_stream', 'add_reference', 'search_tracks',
+                 'rescan_catalog')
+engine_client = None  # Set in worker processes by create_worker_app()
+worker_hubs = {}      # Worker only: camera id (None = active) -> relayed FrameHub
+worker_hubs_lock = threading.Lock()
+# Rescans (HTTP) and config reloads (watcher thread) each scan the catalog and
+# sync the sessions; one at a time, or a camera could be added or restarted twice
+sync_lock = threading.Lock()
 
-def get_asset_dir(video_type: str) -> Path:
-    config = VIDEO_CONFIGS.get(video_type, {})
-    base_dir_name = config.get("base_dir", "MORN_CITY")
-    return BASE_DIR / base_dir_name
+# Camera configurations (see cameras.yaml), reloaded when the file changes.
+# Paths are resolved by the camera catalog, which also adds a camera for every
+# video under an asset directory (<dir>/vidio/*.mp4) that none of these use.
+CAMERA_CONFIG = Path(os.environ.get('CAMERA_CONFIG', BASE_DIR / "cameras.yaml"))
+# Target-appearance clips (pre-roll + live) and best shots, indexed by camera/target/time
+CLIP_DIR = Path(os.environ.get('CLIP_DIR', BASE_DIR / "clips"))
+# Reference photos of people without a model class (missing-person reports);
+# any target name with photos here is found by re-ID on every camera
+REID_DIR = Path(os.environ.get('REID_DIR', BASE_DIR / "reid"))
+REID_MAX_PHOTO_BYTES = 10 * 2 ** 20
+# One appearance embedding per person track from every camera, appended to
+# disk, for "has this person been seen" queries without re-running detection.
+# Off by default: it runs the person detector on sampled frames of every
+# camera, on a background thread. /tracks/search also works on an index
+# filled only by the backfill CLI (python track_index.py VIDEO --camera ID).
+TRACK_INDEX_DIR = Path(os.environ.get('TRACK_INDEX_DIR', BASE_DIR / "tracks"))
+TRACK_INDEX = os.environ.get('TRACK_INDEX', 'false').lower() in ('1', 'true', 'yes', 'on')
 
-def load_model(video_type):
-    """Load YOLO model for specific video type"""
-    global model
-    try:
-        base_dir = get_asset_dir(video_type)
-        configured = (base_dir / VIDEO_CONFIGS[video_type]["model_path"]).resolve()
-        model_path = configured
-        if not model_path.exists():
-            # Fallback: pick any .pt inside models dir
-            models_dir = (base_dir / "models").resolve()
-            candidates = list(models_dir.glob("*.pt")) if models_dir.exists() else []
-            if candidates:
-                model_path = candidates[0]
-        if model_path.exists():
-            model = YOLO(str(model_path))
-            print(f"✅ Model loaded: {model_path}")
-            
-            # Print available class names
-            if hasattr(model, 'names'):
-                print("📋 Available classes in model:")
-                for class_id, class_name in model.names.items():
-                    print(f"   {class_id}: {class_name}")
-            else:
-                print("⚠️ No class names found in model")
-            
-            return True
-        else:
-            print(f"❌ Model not found: {model_path}")
-            return False
-    except Exception as e:
-        print(f"❌ Error loading model: {e}")
-        return False
-
-def get_class_id(target_name):
-    """Get class ID for target person"""
-    if model and hasattr(model, 'names'):
-        names = model.names
-        if isinstance(names, dict):
-            for k, v in names.items():
-                if str(v).strip().lower() == target_name.strip().lower():
-                    return int(k)
-    return None
+# Stage traces and profiles taken through /admin/trace and /admin/profile
+TRACE_DIR = Path(os.environ.get('TRACE_DIR', BASE_DIR / "traces"))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')  # If set, required as X-Admin-Token
 
-def generate_frames():
-    """Generate video frames with YOLO detection"""
-    global current_target, current_video, model, video_capture, is_streaming
-    
-    if not model or not video_capture:
-        print("❌ Model or video capture not available")
+def mark_ready(camera_id):
+    """First frame of any camera start: the service is ready, even if warm-up failed"""
+    if startup.ready.is_set():
         return
+    startup.error = None
+    startup.ready.set()
+    log.info("✅ Ready %.2fs after process start (first frame of %s)",
+             startup.snapshot()['uptime_s'], camera_id)
+
+if ENGINE_ROLE == 'worker':
+    # HTTP only: every command and frame goes through the engine, which owns
+    # all of the state below (and rewrites the catalog and index files)
+    clip_index = gallery_index = references = track_index = track_indexer = None
+    catalog = registry = None
+else:
+    clip_index = ClipIndex(CLIP_DIR)
+    gallery_index = ClipIndex(CLIP_DIR / "gallery", max_clips_per_camera=500)
+    # The person detector is loaded once and shared by the gallery, re-ID on every camera and the indexer
+    references = ReferenceGallery(REID_DIR, PersonDetector(load_person_model))
+    track_index = TrackIndex(TRACK_INDEX_DIR, references.embedder)
+    track_indexer = TrackIndexer(track_index, references.detector, make_embedder()) if TRACK_INDEX else None
+
+    # Asset files and their metadata, scanned at startup and on /admin/catalog/rescan
+    catalog = CameraCatalog(BASE_DIR, Path(os.environ.get('CATALOG_CACHE', BASE_DIR / "cache" / "catalog.json")),
+                            load_camera_config(CAMERA_CONFIG))
+    cameras = catalog.scan()
+    startup.mark('catalog')
+
+    # One session per camera; the first configured one is behind the legacy routes
+    registry = SessionRegistry(cameras, BASE_DIR, active_id=next(iter(cameras)),
+                               clip_index=clip_index, gallery_index=gallery_index, catalog=catalog,
+                               references=references, track_indexer=track_indexer,
+                               on_first_frame=mark_ready)
+    startup.mark('setup')
+
+def camera_not_found(camera):
+    return {'error': f'Kamera tidak ditemukan: {camera}'}, 404
+
+def available_videos():
+    """Cameras with a video or live source and a model file (all of them with the synthetic backend)"""
+    return [camera_id for camera_id, session in registry.sessions.items()
+            if session.config.get('available') or MODEL_BACKEND == 'synthetic']
+
+# ---- Control commands (run in whichever process owns the engine) ----
+
+def cmd_get_state(camera=None):
+    """Selection and counters for one camera (default: the active one)"""
+    session = registry.get(camera)
+    if session is None:
+        return camera_not_found(camera)
+    return dict(session.state(),
+                video=registry.active_id,
+                videos=available_videos()), 200
+
+def cmd_list_cameras():
+    """State of every camera session"""
+    return {
+        'active': registry.active_id,
+        'cameras': [session.state() for session in registry.sessions.values()]
+    }, 200
+
+def cmd_set_target(name='', camera=None):
+    """Change target person(s); name may be a string, "A, B" or a list"""
+    session = registry.get(camera)
+    if session is None:
+        return camera_not_found(camera)
     
-    print(f"🎯 Starting frame generation for target: {current_target} (Video: {current_video})")
+    names = parse_targets(name)
+    if not names:
+        return {'error': 'Nama target tidak boleh kosong'}, 400
     
-    frame_count = 0
-    last_reset_time = time.time()
+    # Picked up by the camera's frame loop on its next frame
+    session.set_target(names)
+    session.log.info("🎯 Target changed to: %s", session.target)
     
-    while is_streaming:
-        # Reset frame counter every 5 minutes to prevent overflow
-        if time.time() - last_reset_time > 300:  # 5 minutes
-            frame_count = 0
-            last_reset_time = time.time()
-            print("🔄 Frame counter reset")
-        try:
-            ret, frame = video_capture.read()
-            if not ret:
-                print("🔄 Video ended, restarting...")
-                video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                time.sleep(0.1)  # Small delay before restart
-                continue
-        except Exception as e:
-            print(f"❌ Video read error: {e}")
-            time.sleep(0.1)
-            continue
-        
-        frame_count += 1
-        
-        # Get current target class ID (updated every frame) with thread safety
-        with target_lock:
-            current_target_safe = current_target
-        
-        with video_lock:
-            current_video_safe = current_video
-            
-        target_class_id = get_class_id(current_target_safe)
-        
-        try:
-            # Run YOLO detection only for target class
-            if target_class_id is not None:
-                results = model(frame, conf=0.25, classes=[target_class_id], verbose=False)
-            else:
-                results = model(frame, conf=0.25, verbose=False)
-            
-            # Process detections
-            detections_found = 0
-            if len(results) > 0:
-                result = results[0]
-                if result.boxes is not None and len(result.boxes) > 0:
-                    boxes = result.boxes
-                    class_names = result.names if hasattr(result, 'names') else getattr(model, "names", None)
-                    
-                    # Reduce debug output - only print every 30 frames
-                    if frame_count % 30 == 0:
-                        print(f"📊 Frame {frame_count}: Found {len(boxes)} detections")
-                    
-                    for box in boxes:
-                        cls_id = int(box.cls[0].cpu().numpy())
-                        cls_name = class_names[cls_id] if class_names else f"Class {cls_id}"
-                        x1, y1, x2, y2 = map(int, box.xyxy[0].cpu().numpy())
-                        conf = float(box.conf[0].cpu().numpy())
-                        
-                        # Only show detection for target person
-                        if str(cls_name).strip().lower() == current_target_safe.strip().lower():
-                            color = (0, 255, 255)  # Yellow for target
-                            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
-                            label = f"🎯 {cls_name}: {conf:.2f}"
-                            cv2.rectangle(frame, (x1, y1 - 25), (x1 + 200, y1), color, -1)
-                            cv2.putText(frame, label, (x1, y1 - 5),
-                                      cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
-                            detections_found += 1
-                            # Only print detection every 10 frames to reduce spam
-                            if frame_count % 10 == 0:
-                                print(f"🎯 Target '{current_target_safe}' detected with confidence: {conf:.2f}")
-            
-            # Add info overlay
-            current_time = video_capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
-            minutes = int(current_time // 60)
-            seconds = int(current_time % 60)
-            
-            cv2.putText(frame, f"Time: {minutes:02d}:{seconds:02d}",
-                      (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            cv2.putText(frame, f"Video: {current_video_safe.upper()}",
-                      (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
-            cv2.putText(frame, f"Target: {current_target_safe}",
-                      (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-            cv2.putText(frame, f"Frame: {frame_count}",
-                      (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            cv2.putText(frame, f"Detections: {detections_found}",
-                      (10, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-            
-        except Exception as e:
-            print(f"❌ Error processing frame {frame_count}: {e}")
-            # Add error message to frame
-            cv2.putText(frame, f"Error: {str(e)}",
-                      (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-        
-        # Convert frame to JPEG with timeout
-        try:
-            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            if ret:
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            else:
-                print(f"❌ Failed to encode frame {frame_count}")
-        except Exception as e:
-            print(f"❌ Frame encoding error: {e}")
-        
-        # Control frame rate with adaptive timing
-        try:
-            time.sleep(1/25)  # Reduced to 25 FPS for stability
-        except Exception as e:
-            print(f"❌ Sleep error: {e}")
+    return {
+        'message': f'Target berhasil diubah ke {session.target}',
+        'target': session.target,
+        'targets': session.targets,
+        'camera': session.camera_id
+    }, 200
 
-def start_video_stream(video_type=None):
-    """Start video streaming thread"""
-    global video_capture, is_streaming, stream_thread, current_video
+def cmd_set_video(video=''):
+    """Switch the active camera used by the legacy routes"""
+    new_video = (video or '').strip().lower()
+    if new_video not in available_videos():
+        return {'error': f"Video tidak valid. Pilih: {', '.join(available_videos())}"}, 400
     
-    if is_streaming:
-        return
+    # Stop current stream
+    registry.get().stop()
     
-    # Use provided video type or current
-    if video_type:
-        current_video = video_type
+    # Activate new camera with its default target
+    session = registry.activate(new_video)
+    session.set_target(session.config.get("default_target", ""))
     
-    base_dir = get_asset_dir(current_video)
-    configured = (base_dir / VIDEO_CONFIGS[current_video]["video_path"]).resolve()
-    video_path = configured
-    if not video_path.exists():
-        # Fallback: first mp4 in vidio dir
-        vid_dir = (base_dir / "vidio").resolve()
-        candidates = list(vid_dir.glob("*.mp4")) if vid_dir.exists() else []
-        if candidates:
-            video_path = candidates[0]
-    if not video_path.exists():
-        print(f"❌ Video not found: {video_path}")
-        return
+    # Load model (kept loaded across switches) and start a fresh capture
+    if session.model is None and not session.load_model():
+        return {'error': 'Gagal memuat model untuk video ini'}, 500
+    session.start()
     
-    video_capture = cv2.VideoCapture(str(video_path))
-    if not video_capture.isOpened():
-        print(f"❌ Could not open video: {video_path}")
-        return
+    log.info("🎬 Video changed to: %s", new_video)
     
-    is_streaming = True
-    stream_thread = threading.Thread(target=generate_frames)
-    stream_thread.daemon = True
-    stream_thread.start()
-    print(f"🎬 Video streaming started for {current_video}")
+    return {
+        'message': f'Video berhasil diubah ke {new_video}',
+        'video': new_video,
+        'target': session.target
+    }, 200
+
+def cmd_start_stream(camera=None):
+    session = registry.get(camera)
+    if session is None:
+        return camera_not_found(camera)
+    session.start()
+    return {'message': 'Video streaming started', 'camera': session.camera_id}, 200
+
+def cmd_stop_stream(camera=None):
+    session = registry.get(camera)
+    if session is None:
+        return camera_not_found(camera)
+    session.stop()
+    return {'message': 'Video streaming stopped', 'camera': session.camera_id}, 200
+
+def cmd_restart_stream(camera=None):
+    session = registry.get(camera)
+    if session is None:
+        return camera_not_found(camera)
+    session.restart()
+    return {'message': 'Video streaming restarted', 'camera': session.camera_id}, 200
+
+def cmd_list_clips(target=None, camera=None, since=None, until=None):
+    """Recorded clips, newest first"""
+    return {'clips': clip_index.query(target, camera, since, until)}, 200
+
+def cmd_get_clip(clip_id=''):
+    clip = clip_index.get(clip_id)
+    if clip is None:
+        return {'error': f'Klip tidak ditemukan: {clip_id}'}, 404
+    return dict(clip, path=str(clip_index.file_path(clip))), 200
+
+def cmd_list_gallery(target=None, camera=None, since=None, until=None):
+    """Best-shot thumbnails, newest first"""
+    return {'shots': gallery_index.query(target, camera, since, until)}, 200
+
+def cmd_get_shot(shot_id=''):
+    shot = gallery_index.get(shot_id)
+    if shot is None:
+        return {'error': f'Foto tidak ditemukan: {shot_id}'}, 404
+    return dict(shot, path=str(gallery_index.file_path(shot))), 200
+
+def cmd_list_references():
+    """People with reference photos for re-ID"""
+    return {'people': references.describe()}, 200
+
+def decode_photo(photo):
+    """(bytes, None) from a base64 photo, or (None, error response)"""
+    try:
+        data = base64.b64decode(photo or '', validate=True)
+    except (binascii.Error, ValueError):
+        return None, ({'error': 'Foto tidak valid'}, 400)
+    if not data:
+        return None, ({'error': 'Foto tidak boleh kosong'}, 400)
+    return data, None
+
+def cmd_add_reference(name='', photo=''):
+    """Add a base64-encoded reference photo; name becomes a valid target"""
+    name = (name or '').strip()
+    if not name:
+        return {'error': 'Nama tidak boleh kosong'}, 400
+    data, error = decode_photo(photo)
+    if error:
+        return error
+    try:
+        person = references.add(name, data)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return dict(person, message=f'Foto referensi {name} berhasil ditambahkan'), 201
+
+def cmd_remove_reference(name=''):
+    if not references.remove(name or ''):
+        return {'error': f'Orang tidak ditemukan: {name}'}, 404
+    return {'message': f'Foto referensi {name} dihapus'}, 200
+
+def cmd_search_tracks(name=None, photo=None, hours=None, since=None, until=None, camera=None, k=20):
+    """Indexed person tracks most similar to a gallery person or a photo, best first"""
+    if int(k) < 1:
+        return {'error': 'k harus minimal 1'}, 400
+    if photo:
+        data, error = decode_photo(photo)
+        if error:
+            return error
+        try:
+            queries = references.embed_photo(data)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+    elif name:
+        queries = references.vectors(name)
+        if queries is None:
+            return {'error': f'Orang tidak ditemukan: {name}'}, 404
+    else:
+        return {'error': 'Nama atau foto diperlukan'}, 400
+    if hours and since is None:
+        since = time.time() - float(hours) * 3600
+    started = time.perf_counter()
+    tracks = track_index.search(queries, int(k), since, until, camera)
+    return {'tracks': tracks, 'indexed': track_index.count,
+            'search_ms': round((time.perf_counter() - started) * 1000, 1)}, 200
+
+def cmd_occupancy(camera=None, window=None):
+    """People counts and density grid per camera; window = seconds the grid averages"""
+    if camera is not None and camera not in registry:
+        return camera_not_found(camera)
+    if window is not None and not 0 < float(window) <= OCCUPANCY_WINDOWS[-1]:
+        return {'error': f'Window harus antara 1 dan {OCCUPANCY_WINDOWS[-1]} detik'}, 400
+    now = time.time()
+    sessions = [registry.get(camera)] if camera else list(registry.sessions.values())
+    return {
+        'time': round(now, 3),
+        'cameras': {session.camera_id: session.occupancy.snapshot(now, window and float(window))
+                    for session in sessions},
+    }, 200
+
+def add_hub_metrics(expo, hub, camera, prefix='uiaic'):
+    expo.add(f'{prefix}_stream_viewers', 'gauge', 'Connected MJPEG viewers',
+             hub.viewers, camera=camera)
+    expo.add(f'{prefix}_stream_bytes_sent_total', 'counter', 'MJPEG bytes sent to viewers',
+             hub.bytes_sent, camera=camera)
+
+def cmd_metrics():
+    """Pipeline metrics of every camera in the Prometheus text format"""
+    expo = Exposition()
+    for session in registry.sessions.values():
+        camera, metrics, capture = session.camera_id, session.metrics, session.capture
+        for stage, histogram in metrics.stages.items():
+            expo.add_histogram('uiaic_stage_seconds', 'Time per frame spent in each pipeline stage',
+                               histogram, camera=camera, stage=stage)
+        expo.add_histogram('uiaic_frame_latency_seconds', 'Time from decode to publish per frame',
+                           metrics.latency, camera=camera)
+        expo.add('uiaic_frames_total', 'counter', 'Annotated frames published',
+                 metrics.frames_out, camera=camera)
+        expo.add('uiaic_output_fps', 'gauge', 'Smoothed output frame rate',
+                 round(metrics.output_fps, 2) if session.is_streaming else 0, camera=camera)
+        expo.add('uiaic_streaming', 'gauge', '1 while the camera thread runs',
+                 int(session.is_streaming), camera=camera)
+        expo.add('uiaic_model_load_seconds', 'gauge', 'Time the last model load took',
+                 metrics.model_load_seconds, camera=camera)
+        if capture is not None:
+            expo.add('uiaic_capture_frames_read_total', 'counter', 'Frames decoded since the stream started',
+                     capture.frames_read, camera=camera)
+            expo.add('uiaic_capture_frames_dropped_total', 'counter', 'Decoded frames skipped as stale',
+                     capture.frames_dropped, camera=camera)
+            expo.add('uiaic_capture_reconnects_total', 'counter', 'Reconnect attempts of a live source',
+                     capture.reconnects, camera=camera)
+        budget = session.budget
+        if budget is not None:
+            expo.add('uiaic_cpu_threads', 'gauge', 'Thread budget of the camera (torch intra-op / FFmpeg decode)',
+                     budget.threads, camera=camera, pool='inference')
+            expo.add('uiaic_cpu_threads', 'gauge', 'Thread budget of the camera (torch intra-op / FFmpeg decode)',
+                     budget.decode_threads, camera=camera, pool='decode')
+            expo.add('uiaic_cpu_pinned_cores', 'gauge', 'Cores the camera threads are pinned to (0 = unpinned)',
+                     len(budget.cores or ()), camera=camera)
+        for thread, native_id in (('inference', session.thread_id if session.is_streaming else None),
+                                  ('capture', capture.thread_id if capture is not None else None)):
+            expo.add('uiaic_thread_cpu_seconds_total', 'counter', 'CPU time of a camera thread',
+                     thread_cpu_seconds(native_id), camera=camera, thread=thread)
+        expo.add('uiaic_people', 'gauge', 'People in the latest frame (occupancy source)',
+                 session.occupancy.count, camera=camera)
+        add_hub_metrics(expo, session.hub, camera)
+    add_hub_metrics(expo, registry.active_hub, 'active')
+    expo.add('uiaic_reid_people', 'gauge', 'People with reference photos for re-ID',
+             len(references.people))
+    expo.add('uiaic_reid_photos', 'gauge', 'Reference photos in the re-ID index',
+             len(references.index))
+    expo.add('uiaic_track_index_tracks', 'gauge', 'Person tracks in the appearance index',
+             track_index.count)
+    if track_indexer is not None:
+        expo.add('uiaic_track_indexer_dropped_total', 'counter',
+                 'Sampled frames the track indexer skipped because it was behind',
+                 track_indexer.frames_dropped)
+    expo.add('uiaic_ready', 'gauge', '1 once the model is loaded and the first frame is out',
+             int(startup.ready.is_set()))
+    for phase in startup.snapshot()['phases']:
+        expo.add('uiaic_startup_phase_seconds', 'gauge', 'Duration of each start-up phase',
+                 phase['seconds'], phase=phase['phase'])
+    expo.add('process_resident_memory_bytes', 'gauge', 'Resident memory of the inference process',
+             process_rss_bytes())
+    expo.add('process_cpu_seconds_total', 'counter', 'CPU time used by the inference process, all threads',
+             round(time.process_time(), 3))
+    return {'text': expo.render()}, 200
+
+def cmd_start_trace(camera=None, seconds=10.0):
+    """Trace every pipeline stage of one camera for a few seconds"""
+    session = registry.get(camera)
+    if session is None:
+        return camera_not_found(camera)
+    if not session.is_streaming:
+        return {'error': 'Kamera tidak sedang streaming'}, 409
+    tracer = session.start_trace(float(seconds), TRACE_DIR)
+    if tracer is None:
+        return {'error': 'Trace atau profil lain masih berjalan untuk kamera ini'}, 409
+    return {'message': 'Tracing dimulai', 'camera': session.camera_id,
+            'file': tracer.path.name}, 202
+
+def cmd_start_profile(camera=None, seconds=10.0, mode='sample'):
+    """Profile one camera's frame loop (mode: sample or cprofile)"""
+    session = registry.get(camera)
+    if session is None:
+        return camera_not_found(camera)
+    if mode not in ('sample', 'cprofile'):
+        return {'error': 'Mode profil tidak valid. Pilih: sample atau cprofile'}, 400
+    if not session.is_streaming:
+        return {'error': 'Kamera tidak sedang streaming'}, 409
+    profiler = session.start_profile(float(seconds), TRACE_DIR, mode)
+    if profiler is None:
+        return {'error': 'Trace atau profil lain masih berjalan untuk kamera ini'}, 409
+    return {'message': 'Profiling dimulai', 'camera': session.camera_id, 'mode': mode,
+            'file': profiler.path.name}, 202
+
+def cmd_list_traces():
+    return {'files': list_captures(TRACE_DIR)}, 200
+
+def cmd_catalog():
+    """Cameras with their video metadata and model classes"""
+    return catalog.describe(), 200
+
+def cmd_rescan_catalog():
+    """Rescan asset directories; new videos become cameras right away"""
+    with sync_lock:
+        changes = registry.sync(catalog.scan())
+    return dict(catalog.describe(), changes=changes), 200
+
+def apply_camera_config(configs):
+    """Hot reload of CAMERA_CONFIG: restart only the cameras whose settings changed"""
+    with sync_lock:
+        catalog.configured = configs
+        changes = registry.sync(catalog.scan())
+    log.info("🔄 Camera config reloaded: %s",
+             ", ".join(f"{kind} {', '.join(ids)}" for kind, ids in changes.items() if ids) or "no changes")
+
+def cmd_health():
+    """Readiness plus the start-up phase breakdown"""
+    return startup.snapshot(), 200
+
+COMMANDS = {
+    'get_state': cmd_get_state,
+    'list_cameras': cmd_list_cameras,
+    'set_target': cmd_set_target,
+    'set_video': cmd_set_video,
+    'start_stream': cmd_start_stream,
+    'stop_stream': cmd_stop_stream,
+    'restart_stream': cmd_restart_stream,
+    'list_clips': cmd_list_clips,
+    'get_clip': cmd_get_clip,
+    'list_gallery': cmd_list_gallery,
+    'get_shot': cmd_get_shot,
+    'list_references': cmd_list_references,
+    'add_reference': cmd_add_reference,
+    'remove_reference': cmd_remove_reference,
+    'search_tracks': cmd_search_tracks,
+    'occupancy': cmd_occupancy,
+    'metrics': cmd_metrics,
+    'start_trace': cmd_start_trace,
+    'start_profile': cmd_start_profile,
+    'list_traces': cmd_list_traces,
+    'health': cmd_health,
+    'catalog': cmd_catalog,
+    'rescan_catalog': cmd_rescan_catalog,
+}
+
+def handle_command(cmd, args):
+    """Dispatch a control command to the local engine"""
+    handler = COMMANDS.get(cmd)
+    if handler is None:
+        return {'error': f'Perintah tidak dikenal: {cmd}'}, 400
+    return handler(**args)
+
+def run_command(cmd, **args):
+    """Run a command locally, or in the engine process when this is a worker"""
+    try:
+        if engine_client is not None:
+            return engine_client.call(cmd, **args)
+        return handle_command(cmd, args)
+    except Exception as e:
+        return {'error': f'Error: {str(e)}'}, 500
+
+def ensure_stream(camera=None):
+    """Make sure frames are being produced for a new viewer"""
+    run_command('start_stream', camera=camera)
+
+def stream_hub(camera=None):
+    """FrameHub that viewers of a camera (None = active camera) read from"""
+    if engine_client is None:
+        return registry.hub(camera)
+    with worker_hubs_lock:
+        hub = worker_hubs.get(camera)
+    if hub is None:
+        # The engine's registry follows config reloads and rescans; this worker has none
+        if camera is not None and engine_client.call('get_state', camera=camera)[1] == 404:
+            return None
+        with worker_hubs_lock:
+            hub = worker_hubs.get(camera)
+            if hub is None:
+                hub = worker_hubs[camera] = FrameHub()
+                engine_client.start_relay(hub, camera)
+    return hub
+
+def camera_arg():
+    """Optional camera id from the query string or JSON body"""
+    data = request.get_json(silent=True) or {}
+    return request.args.get('camera') or data.get('camera') or None
+
+# ---- HTTP routes ----
 
 @app.route('/')
 def index():
     """Serve Vue.js frontend"""
+    state, _ = run_command('get_state')
     return render_template('index.html', 
-                         current_target=current_target,
-                         current_video=current_video,
+                         current_target=state.get('target'),
+                         current_video=state.get('video'),
                          status=None)
 
 @app.route('/video_feed')
-def video_feed():
-    """Video streaming endpoint"""
-    return Response(generate_frames(),
+@app.route('/video_feed/<camera>')
+def video_feed(camera=None):
+    """Video streaming endpoint (active camera, or a specific camera id)"""
+    hub = stream_hub(camera)
+    if hub is None:
+        payload, status = camera_not_found(camera)
+        return jsonify(payload), status
+    ensure_stream(camera)
+    return Response(hub.mjpeg_stream(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/cameras')
+def cameras():
+    """List all camera sessions and their state"""
+    payload, status = run_command('list_cameras')
+    return jsonify(payload), status
+
 @app.route('/set_target', methods=['POST'])
 def set_target():
     """Change target person"""
-    global current_target
-    
-    try:
-        data = request.get_json()
-        new_target = data.get('name', '').strip()
-        
-        if not new_target:
-            return jsonify({'error': 'Nama target tidak boleh kosong'}), 400
-        
-        # Update target without restarting stream (thread safe)
-        with target_lock:
-            current_target = new_target
-        print(f"🎯 Target changed to: {current_target}")
-        
-        return jsonify({
-            'message': f'Target berhasil diubah ke {current_target}',
-            'target': current_target
-        })
-    
-    except Exception as e:
-        return jsonify({'error': f'Error: {str(e)}'}), 500
+    data = request.get_json(silent=True) or {}
+    names = data.get('names') or data.get('name', '')
+    payload, status = run_command('set_target', name=names, camera=camera_arg())
+    return jsonify(payload), status
 
 @app.route('/set_video', methods=['POST'])
 def set_video():
     """Change video source"""
-    global current_video, current_target, is_streaming, video_capture
-    
-    try:
-        data = request.get_json()
-        new_video = data.get('video', '').strip().lower()
-        
-        if new_video not in VIDEO_CONFIGS:
-            return jsonify({'error': 'Video tidak valid. Pilih: pasar, dublin, atau night_city'}), 400
-        
-        # Stop current stream
-        if is_streaming:
-            is_streaming = False
-            if video_capture:
-                video_capture.release()
-                video_capture = None
-            time.sleep(0.5)  # Wait for thread to stop
-        
-        # Update video and target
-        with video_lock:
-            current_video = new_video
-        
-        # Set default target for new video
-        current_target = VIDEO_CONFIGS[current_video]["default_target"]
-        
-        # Load new model
-        if not load_model(current_video):
-            return jsonify({'error': 'Gagal memuat model untuk video ini'}), 500
-        
-        # Start new stream (ensure fresh capture)
-        start_video_stream(current_video)
-        
-        print(f"🎬 Video changed to: {current_video}")
-        
-        return jsonify({
-            'message': f'Video berhasil diubah ke {current_video}',
-            'video': current_video,
-            'target': current_target
-        })
-    
-    except Exception as e:
-        return jsonify({'error': f'Error: {str(e)}'}), 500
+    data = request.get_json(silent=True) or {}
+    payload, status = run_command('set_video', video=data.get('video', ''))
+    return jsonify(payload), status
 
 @app.route('/get_target')
 def get_target():
     """Get current target"""
-    return jsonify({'target': current_target})
+    state, status = run_command('get_state', camera=camera_arg())
+    return jsonify({'target': state.get('target'), 'targets': state.get('targets')}), status
 
 @app.route('/get_video')
 def get_video():
     """Get current video"""
-    return jsonify({'video': current_video})
+    state, status = run_command('get_state')
+    return jsonify({'video': state.get('video')}), status
 
 @app.route('/get_available_videos')
 def get_available_videos():
     """Get list of available videos"""
+    state, status = run_command('get_state')
     return jsonify({
-        'videos': list(VIDEO_CONFIGS.keys()),
-        'current_video': current_video
-    })
+        'videos': state.get('videos', []),
+        'current_video': state.get('video')
+    }), status
 
 @app.route('/start_stream')
 def start_stream():
     """Start video streaming"""
-    start_video_stream()
-    return jsonify({'message': 'Video streaming started'})
+    payload, status = run_command('start_stream', camera=camera_arg())
+    return jsonify(payload), status
 
 @app.route('/stop_stream')
 def stop_stream():
     """Stop video streaming"""
-    global is_streaming, video_capture
-    
-    is_streaming = False
-    if video_capture:
-        video_capture.release()
-        video_capture = None
-    
-    return jsonify({'message': 'Video streaming stopped'})
+    payload, status = run_command('stop_stream', camera=camera_arg())
+    return jsonify(payload), status
 
 @app.route('/restart_stream')
 def restart_stream():
     """Restart video streaming with current settings"""
-    global is_streaming, video_capture
-    
-    # Stop current stream
-    if is_streaming:
-        is_streaming = False
-        if video_capture:
-            video_capture.release()
-            video_capture = None
-        time.sleep(0.5)  # Wait for thread to stop
-    
-    # Start new stream
-    start_video_stream()
+    payload, status = run_command('restart_stream', camera=camera_arg())
+    return jsonify(payload), status
+
+@app.route('/clips')
+def clips():
+    """List clips; filter with ?target=, ?camera=, ?since=/?until= (unix time)"""
+    since = request.args.get('since', type=float)
+    until = request.args.get('until', type=float)
+    payload, status = run_command('list_clips', target=request.args.get('target'),
+                                  camera=camera_arg(), since=since, until=until)
+    return jsonify(payload), status
+
+@app.route('/clips/<clip_id>')
+def clip_file(clip_id):
+    """Download one clip as MP4"""
+    payload, status = run_command('get_clip', clip_id=clip_id)
+    if status != 200:
+        return jsonify(payload), status
+    return send_file(payload['path'], mimetype='video/mp4')
+
+@app.route('/gallery')
+def gallery():
+    """Best shot per target sighting; same filters as /clips"""
+    since = request.args.get('since', type=float)
+    until = request.args.get('until', type=float)
+    payload, status = run_command('list_gallery', target=request.args.get('target'),
+                                  camera=camera_arg(), since=since, until=until)
+    return jsonify(payload), status
+
+@app.route('/gallery/<shot_id>')
+def gallery_image(shot_id):
+    """One best-shot thumbnail as JPEG"""
+    payload, status = run_command('get_shot', shot_id=shot_id)
+    if status != 200:
+        return jsonify(payload), status
+    return send_file(payload['path'], mimetype='image/jpeg')
+
+@app.route('/reid/gallery', methods=['GET'])
+def reid_gallery():
+    """People with reference photos; each name can be used as a target"""
+    payload, status = run_command('list_references')
+    return jsonify(payload), status
+
+@app.route('/reid/gallery', methods=['POST'])
+def reid_gallery_add():
+    """Add a reference photo: multipart "name" + "photo" file, or JSON {"name", "photo": base64}"""
+    upload = request.files.get('photo')
+    if upload is not None:
+        name = request.form.get('name', '')
+        data = upload.read(REID_MAX_PHOTO_BYTES + 1)
+        if len(data) > REID_MAX_PHOTO_BYTES:
+            return jsonify({'error': 'Foto terlalu besar (maks. 10 MB)'}), 413
+        photo = base64.b64encode(data).decode()  # Commands travel as JSON to the engine
+    else:
+        body = request.get_json(silent=True) or {}
+        name, photo = body.get('name', ''), body.get('photo') or ''
+    payload, status = run_command('add_reference', name=name, photo=photo)
+    return jsonify(payload), status
+
+@app.route('/reid/gallery/<name>', methods=['DELETE'])
+def reid_gallery_remove(name):
+    denied = admin_denied()
+    if denied:
+        return denied
+    payload, status = run_command('remove_reference', name=name)
+    return jsonify(payload), status
+
+@app.route('/tracks/search', methods=['GET', 'POST'])
+def tracks_search():
+    """Where a person appeared: ?name= (gallery person) or a POSTed photo; ?hours=, ?camera=, ?k="""
+    upload = request.files.get('photo')
+    body = request.get_json(silent=True) or {}
+    photo = body.get('photo')
+    if upload is not None:
+        data = upload.read(REID_MAX_PHOTO_BYTES + 1)
+        if len(data) > REID_MAX_PHOTO_BYTES:
+            return jsonify({'error': 'Foto terlalu besar (maks. 10 MB)'}), 413
+        photo = base64.b64encode(data).decode()
+    payload, status = run_command('search_tracks', name=request.args.get('name') or body.get('name'),
+                                  photo=photo, hours=request.args.get('hours', type=float),
+                                  since=request.args.get('since', type=float),
+                                  until=request.args.get('until', type=float), camera=camera_arg(),
+                                  k=min(request.args.get('k', 20, type=int), 1000))
+    return jsonify(payload), status
+
+@app.route('/occupancy')
+def occupancy():
+    """Live people counts (10s/60s/300s mean and max) and density grid; ?camera=, ?window= seconds"""
+    payload, status = run_command('occupancy', camera=camera_arg(),
+                                  window=request.args.get('window', type=float))
+    return jsonify(payload), status
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    payload, status = run_command('metrics')
+    if status != 200:
+        return jsonify(payload), status
+    text = payload['text']
+    if engine_client is not None:
+        # Viewers connect to the HTTP workers, so each worker reports its own
+        expo = Exposition()
+        with worker_hubs_lock:
+            hubs = list(worker_hubs.items())
+        for camera, hub in hubs:
+            add_hub_metrics(expo, hub, camera or 'active', prefix='uiaic_worker')
+        expo.add('uiaic_worker_resident_memory_bytes', 'gauge', 'Resident memory of this HTTP worker',
+                 process_rss_bytes(), worker=os.getpid())
+        text += expo.render()
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/catalog')
+def camera_catalog():
+    """Every camera's video (resolution, FPS, frames, codec) and model classes"""
+    payload, status = run_command('catalog')
+    return jsonify(payload), status
+
+@app.route('/health')
+def health():
+    """Liveness: 200 as soon as the server is up; the body reports readiness"""
+    payload, status = run_command('health')
+    return jsonify(payload), status
+
+@app.route('/health/ready')
+def health_ready():
+    """Readiness: 503 until the model is loaded and the first frame is out"""
+    payload, status = run_command('health')
+    if status == 200 and not payload.get('ready'):
+        status = 503
+    return jsonify(payload), status
+
+def admin_denied():
+    """Error response when ADMIN_TOKEN is set and the request lacks it"""
+    if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'error': 'Akses ditolak'}), 403
+    return None
+
+def capture_seconds(data):
+    """Validated "seconds" of a trace/profile request, capped; None if it is not a positive number"""
+    try:
+        seconds = float(data.get('seconds', 10.0))
+    except (TypeError, ValueError):
+        return None
+    if not 0 < seconds < float('inf'):  # Also rejects NaN
+        return None
+    return min(seconds, MAX_CAPTURE_SECONDS)
+
+@app.route('/admin/trace', methods=['POST'])
+def admin_trace():
+    """Capture a Chrome/Perfetto stage trace: {"camera": id, "seconds": n}"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    seconds = capture_seconds(request.get_json(silent=True) or {})
+    if seconds is None:
+        return jsonify({'error': 'seconds harus berupa angka positif'}), 400
+    payload, status = run_command('start_trace', camera=camera_arg(), seconds=seconds)
+    return jsonify(payload), status
+
+@app.route('/admin/profile', methods=['POST'])
+def admin_profile():
+    """Profile a camera's frame loop: {"camera": id, "seconds": n, "mode": "sample"|"cprofile"}"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    seconds = capture_seconds(data)
+    if seconds is None:
+        return jsonify({'error': 'seconds harus berupa angka positif'}), 400
+    payload, status = run_command('start_profile', camera=camera_arg(),
+                                  seconds=seconds, mode=data.get('mode', 'sample'))
+    return jsonify(payload), status
+
+@app.route('/admin/traces')
+def admin_traces():
+    """Finished traces and profiles, newest first"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    payload, status = run_command('list_traces')
+    return jsonify(payload), status
+
+@app.route('/admin/traces/<name>')
+def admin_trace_file(name):
+    denied = admin_denied()
+    if denied:
+        return denied
+    path = TRACE_DIR / Path(name).name
+    if not path.is_file():
+        return jsonify({'error': f'File tidak ditemukan: {name}'}), 404
+    return send_file(path, as_attachment=True)
+
+@app.route('/admin/catalog/rescan', methods=['POST'])
+def rescan_catalog():
+    denied = admin_denied()
+    if denied:
+        return denied
+    payload, status = run_command('rescan_catalog')
+    return jsonify(payload), status
+
+def create_worker_app():
+    """ASGI app for a stateless HTTP worker (e.g. one of several gunicorn
+    UvicornWorkers). Frames and commands go through the engine process
+    listening on ENGINE_SOCKET, so no model or capture is loaded here.
+    """
+    global engine_client
+    from asgi_app import create_asgi_app
     
-    return jsonify({'message': 'Video streaming restarted'})
+    engine_client = EngineClient(ENGINE_SOCKET, command_timeouts=dict.fromkeys(SLOW_COMMANDS, ENGINE_SLOW_TIMEOUT))
+    return create_asgi_app(app, stream_hub, on_connect=ensure_stream)
+
+def warm_up():
+    """Heavy imports, model load and the first frame of the active camera.
+
+    Runs on a background thread so the server binds immediately; requests
+    that need the model meanwhile wait on the session's model lock.
+    """
+    session = registry.get()
+    try:
+        if MODEL_BACKEND != 'synthetic' and not INFERENCE_WORKERS:
+            with startup.phase('import_ultralytics'):
+                import ultralytics  # noqa: F401 (pulls in torch)
+        with startup.phase('model_load'):
+            loaded = session.load_model()
+        if not loaded:
+            startup.fail('Gagal memuat model')
+            log.error("❌ Failed to load model; serving without inference")
+            return
+        if registry.get() is not session:
+            # /set_video picked another camera while the model loaded; that start counts
+            log.info("⏭️ Active camera changed during warm-up; not starting %s", session.camera_id)
+            return
+        with startup.phase('stream_start'):
+            started = session.start()
+        if not started:
+            startup.fail('Gagal membuka video')
+            return
+        with startup.phase('first_frame'):
+            # Set by mark_ready() on the first frame of this or any other camera
+            seen = startup.ready.wait(timeout=60.0)
+        if not seen:
+            startup.fail('Tidak ada frame dalam 60 detik')
+    except Exception as e:
+        startup.fail(f'Error: {e}')
+        log.error("❌ Warm-up failed: %s", e)
+
+def start_background():
+    """Warm-up plus the camera config watcher, in the process that owns the sessions"""
+    threading.Thread(target=warm_up, daemon=True, name='warm-up').start()
+    ConfigWatcher(CAMERA_CONFIG, apply_camera_config).start()
+
+def run_engine():
+    """Run capture + inference only, serving workers over ENGINE_SOCKET"""
+    start_background()
+    EngineServer(ENGINE_SOCKET, registry.hub, handle_command).serve_forever()
 
 if __name__ == '__main__':
-    # Load initial model
-    if load_model(current_video):
+    if ENGINE_ROLE == 'engine':
+        run_engine()
+    else:
+        # Bind right away; the model loads and the active camera starts in the background
+        start_background()
         host = os.environ.get('FLASK_HOST', '0.0.0.0')
         port = int(os.environ.get('FLASK_PORT', '5001'))
-        debug_env = os.environ.get('FLASK_DEBUG', 'true').lower()
+        debug_env = os.environ.get('FLASK_DEBUG', 'false').lower()
         debug = debug_env in ('1', 'true', 'yes', 'on')
+        server_mode = os.environ.get('SERVER_MODE', 'flask').lower()
 
-        print("🚀 Flask app starting...")
-        print(f"📱 Base URL: http://{host}:{port}")
-        print(f"🎬 Video stream: http://{host}:{port}/video_feed")
-        print(f"🎯 Current video: {current_video}")
-        print(f"🎯 Current target: {current_target}")
+        log.info("🚀 Flask app starting...")
+        log.info("📱 Base URL: http://%s:%s", host, port)
+        log.info("🎬 Video stream: http://%s:%s/video_feed", host, port)
+        log.info("🎯 Current video: %s", registry.active_id)
+        log.info("🎯 Current target: %s", registry.get().target)
         
-        # Start video streaming
-        start_video_stream()
-        
-        # Run Flask app
-        app.run(host=host, port=port, debug=debug, threaded=True)
-    else:
-        print("❌ Failed to load model. Exiting...")
+        if server_mode == 'asgi':
+            # Production: streams served from the asyncio loop, inference stays
+            # on the camera session threads
+            import uvicorn
+            from asgi_app import create_asgi_app
+            
+            log.info("⚡ Serving with uvicorn (ASGI)")
+            uvicorn.run(create_asgi_app(app, stream_hub, on_connect=ensure_stream),
+                        host=host, port=port, log_level='warning')
+        else:
+            # Development: Werkzeug server, one thread per viewer
+            app.run(host=host, port=port, debug=debug, threaded=True, use_reloader=False)
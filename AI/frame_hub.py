@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+BOUNDARY = b'frame'
+
+
+def mjpeg_part(jpeg_bytes, timestamp=None):
+    """Wrap one JPEG in a multipart/x-mixed-replace part.
+
+    X-Timestamp (publish time, unix seconds) lets clients measure frame age.
+    """
+    headers = b'Content-Type: image/jpeg\r\nContent-Length: %d\r\n' % len(jpeg_bytes)
+    if timestamp is not None:
+        headers += b'X-Timestamp: %.3f\r\n' % timestamp
+    return b'--' + BOUNDARY + b'\r\n' + headers + b'\r\n' + jpeg_bytes + b'\r\n'
+
+
+class FrameHub:
+    """Latest-frame buffer shared by one producer and any number of viewers.
+
+    The producer thread calls publish() once per encoded frame. Threaded
+    viewers block on a Condition; asyncio viewers await a per-loop Event, so
+    waking thousands of async connections costs one call_soon_threadsafe per
+    event loop rather than one per connection. Slow viewers never queue up
+    frames: they always receive the newest one. The multipart chunk is built
+    once per frame in publish() and shared by every viewer.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._part = None  # mjpeg_part() of _frame
+        self._seq = 0
+        self._loop_events = {}  # event loop -> asyncio.Event for the next frame
+        self._loops_lock = threading.Lock()
+        self.viewers = 0     # Connected streams, for /metrics
+        self.bytes_sent = 0
+        self._stats_lock = threading.Lock()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def latest(self, part=False):
+        """Return (seq, jpeg_bytes) of the newest frame, or (0, None).
+
+        With part=True the frame comes as a ready-to-send multipart chunk.
+        """
+        with self._cond:
+            return self._seq, (self._part if part else self._frame)
+
+    def publish(self, jpeg_bytes):
+        """Store a new frame and wake all waiting viewers"""
+        part = mjpeg_part(jpeg_bytes, time.time())
+        with self._cond:
+            self._frame = jpeg_bytes
+            self._part = part
+            self._seq += 1
+            self._cond.notify_all()
+        with self._loops_lock:
+            loops = list(self._loop_events.items())
+        for loop, event in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake_loop, loop, event)
+            except RuntimeError:
+                # Event loop already closed
+                with self._loops_lock:
+                    self._loop_events.pop(loop, None)
+
+    def viewer_joined(self):
+        with self._stats_lock:
+            self.viewers += 1
+
+    def viewer_left(self):
+        with self._stats_lock:
+            self.viewers -= 1
+
+    def count_sent(self, nbytes):
+        with self._stats_lock:
+            self.bytes_sent += nbytes
+
+    def wait(self, last_seq, timeout=1.0, part=False):
+        """Block until a frame newer than last_seq exists; return (seq, frame)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != last_seq, timeout=timeout)
+            return self._seq, (self._part if part else self._frame)
+
+    def _wake_loop(self, loop, event):
+        with self._loops_lock:
+            if self._loop_events.get(loop) is event:
+                self._loop_events[loop] = asyncio.Event()
+        event.set()
+
+    async def wait_async(self, last_seq, timeout=1.0, part=False):
+        """Await a frame newer than last_seq from inside an event loop"""
+        if self._seq != last_seq:
+            return self.latest(part)
+        loop = asyncio.get_running_loop()
+        with self._loops_lock:
+            event = self._loop_events.get(loop)
+            if event is None:
+                event = self._loop_events[loop] = asyncio.Event()
+        if self._seq == last_seq:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.latest(part)
+
+    def mjpeg_stream(self, keep_going=lambda: True):
+        """Blocking generator of multipart chunks for WSGI responses"""
+        last_seq = 0
+        self.viewer_joined()
+        try:
+            while keep_going():
+                seq, part = self.wait(last_seq, part=True)
+                if part is None or seq == last_seq:
+                    continue
+                last_seq = seq
+                self.count_sent(len(part))
+                yield part
+        finally:
+            self.viewer_left()
@@ -0,0 +1,43 @@
+import threading
+
+import numpy as np
+
+
+class FramePool:
+    """Recycle frame-sized buffers instead of allocating one per frame.
+
+    A 1080p BGR frame is ~6 MB, above glibc's mmap threshold, so every fresh
+    array is a new mapping that the kernel zero-fills page by page and
+    unmaps again when freed. take() hands out a free buffer of the requested
+    shape and only allocates while the pool warms up or after a resolution
+    change; give() returns a buffer once nothing refers to it any more.
+    """
+
+    def __init__(self, keep=4):
+        self.keep = keep      # Free buffers held at most; extras are left to the GC
+        self.allocated = 0    # Buffers created so far; flat once the pool is warm
+        self._free = []
+        self._lock = threading.Lock()
+
+    def take(self, shape, dtype=np.uint8):
+        with self._lock:
+            while self._free:
+                buffer = self._free.pop()
+                if buffer.shape == shape and buffer.dtype == dtype:
+                    return buffer
+                # Left over from another resolution: let it go
+            self.allocated += 1
+        return np.empty(shape, dtype)
+
+    def give(self, buffer):
+        if buffer is None:
+            return
+        with self._lock:
+            if len(self._free) < self.keep:
+                self._free.append(buffer)
+
+    def copy(self, frame):
+        """Pooled copy of frame"""
+        buffer = self.take(frame.shape, frame.dtype)
+        np.copyto(buffer, frame)
+        return buffer
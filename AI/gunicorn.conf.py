@@ -0,0 +1,10 @@
+# Stateless HTTP workers for multi-worker deployments (ENGINE_ROLE=worker).
+# Each worker mirrors frames from the engine process over ENGINE_SOCKET,
+# so models and captures are loaded once no matter how many workers run.
+import os
+
+bind = f"{os.environ.get('FLASK_HOST', '0.0.0.0')}:{os.environ.get('FLASK_PORT', '5001')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '4'))
+worker_class = 'uvicorn.workers.UvicornWorker'
+timeout = 0  # MJPEG responses never finish
+graceful_timeout = 5
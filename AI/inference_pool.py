@@ -0,0 +1,328 @@
+import argparse
+import atexit
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+
+import numpy as np
+
+from engine_ipc import KIND_JSON, recv_message, send_message
+from log_setup import get_logger, setup_logging
+from resources import CPU_PIN, usable_cores
+from synthetic import SyntheticModel, make_result
+
+INFER_TIMEOUT = 30.0       # Seconds a frame may wait for its worker
+MODEL_LOAD_TIMEOUT = 300.0
+
+log = get_logger(__name__)
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool(workers):
+    """Process-wide pool, started on first use and stopped at exit"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = InferencePool(workers)
+            atexit.register(_shared.close)
+        return _shared
+
+
+class InferenceWorker:
+    """One worker process; requests are answered in order through Futures.
+
+    The process is restarted, and its models reloaded, on the first request
+    after it died.
+    """
+
+    def __init__(self, index, threads, cores=None):
+        self.index = index
+        self.threads = threads
+        self.cores = cores
+        self.specs = {}  # Model key -> spec, replayed after a restart
+        self.process = None
+        self._sock = None
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._closed = False
+        self._lock = threading.Lock()
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        parent, child = socket.socketpair()
+        args = [sys.executable, str(Path(__file__).resolve()), "--fd", str(child.fileno()),
+                "--threads", str(self.threads), "--index", str(self.index)]
+        if self.cores:
+            args += ["--cores", ",".join(map(str, self.cores))]
+        self.process = subprocess.Popen(args, pass_fds=(child.fileno(),))
+        child.close()
+        self._sock = parent
+        threading.Thread(target=self._read_replies, args=(parent,), daemon=True,
+                         name=f"inference-{self.index}").start()
+        for key, spec in self.specs.items():
+            self._send({'cmd': 'load', 'key': key, 'spec': spec})
+        log.info("🧠 Inference worker %d started (pid %d, %d threads%s)", self.index, self.process.pid,
+                 self.threads, f", cores {self.cores}" if self.cores else "")
+
+    def _send(self, request):
+        future = Future()
+        request_id = next(self._ids)
+        self._pending[request_id] = future
+        try:
+            send_message(self._sock, KIND_JSON, json.dumps(dict(request, id=request_id)).encode())
+        except OSError as e:
+            self._pending.pop(request_id, None)
+            future.set_exception(RuntimeError(f"Inference worker {self.index} unavailable: {e}"))
+        return future
+
+    def call(self, request):
+        """Send a request; the Future resolves to the worker's reply dict"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Inference pool is closed")
+            if self.process.poll() is not None:
+                log.warning("⚠️ Inference worker %d exited (%s); restarting", self.index, self.process.returncode)
+                self._sock.close()
+                self._start()
+            return self._send(request)
+
+    def _read_replies(self, sock):
+        try:
+            while True:
+                _, payload = recv_message(sock)
+                reply = json.loads(payload)
+                future = self._pending.pop(reply.pop('id'), None)
+                if future is None:
+                    continue
+                if 'error' in reply:
+                    future.set_exception(RuntimeError(reply['error']))
+                else:
+                    future.set_result(reply)
+        except (ConnectionError, OSError):
+            pass
+        with self._lock:
+            if sock is self._sock:
+                pending, self._pending = self._pending, {}
+            else:
+                pending = {}
+        for future in pending.values():
+            future.set_exception(RuntimeError(f"Inference worker {self.index} exited"))
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._sock.close()
+            self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class RemoteModel:
+    """Model living in a worker process, callable like an ultralytics model.
+
+    Frames travel through a shared memory slot owned by this object, so it
+    supports one frame in flight at a time (one per camera thread). A slot
+    whose frame timed out may still be read by the worker, so it is retired
+    rather than overwritten.
+    """
+
+    def __init__(self, worker, key, names):
+        self.worker = worker
+        self.key = key
+        self.names = names
+        self._slot = None
+        self._release = []  # Retired slot names the worker should close with the next request
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _retire_slot(self):
+        # Unlinking only removes the name; a worker still reading keeps its mapping
+        slot, self._slot = self._slot, None
+        if slot is not None:
+            slot.close()
+            slot.unlink()
+            self._release.append(slot.name)
+
+    def submit(self, frame, conf=0.25, classes=None, **kwargs):
+        """Start inference on frame; returns a Future of the worker's reply"""
+        # An ROI view is copied straight into the slot, not made contiguous first
+        frame = np.asarray(frame, dtype=np.uint8)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Inference pool is closed")
+            if self._slot is None or self._slot.size < frame.size:
+                self._retire_slot()
+                self._slot = shared_memory.SharedMemory(create=True, size=frame.size)
+            slot, release, self._release = self._slot, self._release, []
+            np.ndarray(frame.shape, np.uint8, buffer=slot.buf)[:] = frame
+        return self.worker.call({'cmd': 'infer', 'key': self.key, 'slot': slot.name, 'release': release,
+                                 'shape': list(frame.shape), 'conf': conf, 'classes': classes,
+                                 'kwargs': kwargs})
+
+    def __call__(self, frame, conf=0.25, classes=None, verbose=False, **kwargs):
+        future = self.submit(frame, conf, classes, **kwargs)
+        try:
+            reply = future.result(INFER_TIMEOUT)
+        except FutureTimeout:
+            with self._lock:
+                self._retire_slot()
+            raise
+        return [make_result(self.names, np.asarray(reply['xyxy'], dtype=np.float32).reshape(-1, 4),
+                            np.asarray(reply['conf'], dtype=np.float32),
+                            np.asarray(reply['cls'], dtype=np.float32))]
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._retire_slot()
+
+
+class InferencePool:
+    """Worker processes that each hold a shard of the models.
+
+    Every distinct model is loaded in exactly one worker, the one holding
+    the fewest models at the time; cameras sharing weights share it. Frames
+    go through shared memory and results come back as Futures, so the
+    camera threads only copy frames while inference runs on other cores.
+    """
+
+    def __init__(self, workers, threads=0):
+        cores = usable_cores()
+        share = max(1, len(cores) // workers)
+        self.workers = [InferenceWorker(i, threads or share,
+                                        cores[i * share % len(cores):][:share] if CPU_PIN else None)
+                        for i in range(workers)]
+        self.models = []
+        self._assigned = {}  # Model key -> worker
+        self._lock = threading.Lock()
+
+    def model(self, path=None, latency=0.0):
+        """RemoteModel for YOLO weights at path, or the synthetic model"""
+        key = str(path) if path else f"synthetic:{latency}"
+        spec = {'path': str(path) if path else None, 'latency': latency}
+        with self._lock:
+            worker = self._assigned.get(key)
+            if worker is None:
+                # Placement counts loads still in flight; a failed one is forgotten below
+                assigned = list(self._assigned.values())
+                worker = self._assigned[key] = min(self.workers, key=assigned.count)
+        try:
+            reply = worker.call({'cmd': 'load', 'key': key, 'spec': spec}).result(MODEL_LOAD_TIMEOUT)
+        except Exception:
+            with self._lock:
+                if key not in worker.specs:
+                    self._assigned.pop(key, None)
+            raise
+        model = RemoteModel(worker, key, {int(k): v for k, v in reply['names'].items()})
+        with self._lock:
+            worker.specs[key] = spec  # Only loaded models are replayed after a worker restart
+            self.models.append(model)
+        return model
+
+    def close(self):
+        for model in self.models:
+            model.close()
+        for worker in self.workers:
+            worker.close()
+
+
+# ---- Worker process ----
+
+def attach_slot(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the segment for removal at
+        # exit; the parent owns it, so unregister
+        slot = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(slot._name, "shared_memory")
+        return slot
+
+
+def load_model(spec, threads):
+    if spec['path'] is None:
+        return SyntheticModel(latency=spec['latency'])
+    from ultralytics import YOLO
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+    return YOLO(spec['path'])
+
+
+def infer(model, slot, request):
+    """Run model on the frame in slot; plain lists for the JSON reply"""
+    frame = np.ndarray(request['shape'], np.uint8, buffer=slot.buf)  # No copy
+    kwargs = dict(request.get('kwargs') or {}, conf=request['conf'], verbose=False)
+    if request.get('classes') is not None:
+        kwargs['classes'] = request['classes']
+    results = model(frame, **kwargs)
+    boxes = results[0].boxes if results else None
+    if boxes is None or len(boxes) == 0:
+        return {'cls': [], 'conf': [], 'xyxy': []}
+    return {'cls': boxes.cls.cpu().numpy().tolist(),
+            'conf': boxes.conf.cpu().numpy().tolist(),
+            'xyxy': boxes.xyxy.cpu().numpy().tolist()}
+
+
+def serve(sock, threads, worker_log):
+    models, slots = {}, {}
+    while True:
+        try:
+            _, payload = recv_message(sock)
+        except (ConnectionError, OSError):
+            return  # Parent went away
+        request = json.loads(payload)
+        try:
+            if request['cmd'] == 'load':
+                model = models.get(request['key'])
+                if model is None:
+                    model = models[request['key']] = load_model(request['spec'], threads)
+                    worker_log.info("✅ Model loaded: %s", request['key'])
+                reply = {'names': getattr(model, 'names', None) or {}}
+            elif request['cmd'] == 'infer':
+                for name in request.get('release') or ():
+                    released = slots.pop(name, None)
+                    if released is not None:
+                        released.close()
+                slot = slots.get(request['slot'])
+                if slot is None:
+                    slot = slots[request['slot']] = attach_slot(request['slot'])
+                reply = infer(models[request['key']], slot, request)
+            else:
+                reply = {'error': f"Unknown command: {request['cmd']}"}
+        except Exception as e:
+            reply = {'error': f"{type(e).__name__}: {e}"}
+        reply['id'] = request.get('id')
+        try:
+            send_message(sock, KIND_JSON, json.dumps(reply).encode())
+        except OSError:
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference worker process (started by InferencePool)")
+    parser.add_argument("--fd", type=int, required=True, help="Socket inherited from the parent")
+    parser.add_argument("--threads", type=int, default=1, help="torch intra-op threads")
+    parser.add_argument("--index", type=int, default=0)
+    parser.add_argument("--cores", help="Pin this process to these cores, e.g. 0,1")
+    args = parser.parse_args()
+    setup_logging()
+    worker_log = get_logger(__name__, f"worker-{args.index}")
+    if args.cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, [int(c) for c in args.cores.split(",")])
+    serve(socket.socket(fileno=args.fd), args.threads, worker_log)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+BOUNDARY = b'--frame\r\n'
+HEADER_END = b'\r\n\r\n'
+READ_CHUNK = 64 * 1024
+
+
+def parse_url(base_url):
+    parts = urlsplit(base_url)
+    return parts.hostname or '127.0.0.1', parts.port or 80
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 1) if values else None
+
+
+class Viewer(threading.Thread):
+    """One MJPEG client; read_kbps limits how fast it drains the socket"""
+
+    def __init__(self, base_url, path, until, read_kbps=None):
+        super().__init__(daemon=True)
+        self.host, self.port = parse_url(base_url)
+        self.path = path
+        self.until = until
+        self.read_kbps = read_kbps
+        self.frames = 0
+        self.bytes = 0
+        self.ages_ms = []
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    def run(self):
+        self.started = time.time()
+        try:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=10)
+            conn.request('GET', self.path)
+            response = conn.getresponse()
+            if response.status != 200:
+                self.error = f"HTTP {response.status}"
+                return
+            buffer = bytearray()
+            while time.time() < self.until:
+                chunk = response.read1(READ_CHUNK)
+                if not chunk:
+                    self.error = "stream closed"
+                    break
+                self.bytes += len(chunk)
+                buffer += chunk
+                self._parse(buffer)
+                if self.read_kbps:
+                    time.sleep(len(chunk) / (self.read_kbps * 1024))
+            conn.close()
+        except (OSError, http.client.HTTPException) as e:
+            self.error = str(e)
+        finally:
+            self.finished = time.time()
+
+    def _parse(self, buffer):
+        """Consume complete multipart frames from the front of buffer"""
+        while True:
+            start = buffer.find(BOUNDARY)
+            if start < 0:
+                return
+            head_end = buffer.find(HEADER_END, start)
+            if head_end < 0:
+                return
+            headers = bytes(buffer[start:head_end])
+            length = re.search(rb'Content-Length: (\d+)', headers)
+            if length is None:
+                # Older servers: a frame ends where the next boundary starts
+                next_start = buffer.find(BOUNDARY, head_end)
+                if next_start < 0:
+                    return
+                body_end = next_start
+            else:
+                body_end = head_end + len(HEADER_END) + int(length.group(1)) + 2
+                if len(buffer) < body_end:
+                    return
+            self.frames += 1
+            stamp = re.search(rb'X-Timestamp: ([\d.]+)', headers)
+            if stamp is not None:
+                self.ages_ms.append((time.time() - float(stamp.group(1))) * 1000.0)
+            del buffer[:body_end]
+
+    def fps(self):
+        duration = (self.finished or time.time()) - (self.started or time.time())
+        return self.frames / duration if duration > 0 else 0.0
+
+
+class Churn(threading.Thread):
+    """Change target and video every interval seconds, like busy dashboard users"""
+
+    def __init__(self, base_url, until, interval, targets, videos):
+        super().__init__(daemon=True)
+        self.host, self.port = parse_url(base_url)
+        self.until = until
+        self.interval = interval
+        self.targets = targets
+        self.videos = videos
+        self.latencies_ms = []
+        self.errors = 0
+        self.last_error = None
+
+    def _post(self, path, body):
+        started = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            conn.request('POST', path, json.dumps(body), {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            if response.status >= 400:
+                self.errors += 1
+                self.last_error = f"{path}: HTTP {response.status}"
+        except (OSError, http.client.HTTPException) as e:
+            self.errors += 1
+            self.last_error = f"{path}: {e}"
+        self.latencies_ms.append((time.perf_counter() - started) * 1000.0)
+
+    def run(self):
+        rng = random.Random(0)
+        while time.time() + self.interval < self.until:
+            time.sleep(self.interval)
+            self._post('/set_target', {'name': rng.sample(self.targets, rng.randint(1, len(self.targets)))})
+            if self.videos:
+                self._post('/set_video', {'video': rng.choice(self.videos)})
+
+
+class ServerSampler(threading.Thread):
+    """Poll /metrics for the server's CPU time and resident memory"""
+
+    def __init__(self, base_url, until, interval=1.0):
+        super().__init__(daemon=True)
+        self.host, self.port = parse_url(base_url)
+        self.until = until
+        self.interval = interval
+        self.cpu_pct = []
+        self.rss_mb = []
+
+    def _scrape(self):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=5)
+        conn.request('GET', '/metrics')
+        text = conn.getresponse().read().decode()
+        conn.close()
+        values = {}
+        for name in ('process_cpu_seconds_total', 'process_resident_memory_bytes'):
+            match = re.search(rf'^{name} ([\d.e+]+)$', text, re.M)
+            values[name] = float(match.group(1)) if match else None
+        return values
+
+    def run(self):
+        last = None
+        while time.time() < self.until:
+            try:
+                values = self._scrape()
+            except (OSError, http.client.HTTPException):
+                time.sleep(self.interval)
+                continue
+            now = time.time()
+            cpu = values['process_cpu_seconds_total']
+            if last is not None and cpu is not None and last[1] is not None:
+                self.cpu_pct.append(100.0 * (cpu - last[1]) / (now - last[0]))
+            last = (now, cpu)
+            if values['process_resident_memory_bytes']:
+                self.rss_mb.append(values['process_resident_memory_bytes'] / 2 ** 20)
+            time.sleep(self.interval)
+
+
+def spawn_server(port, server_mode, latency):
+    """Start flask_app_combined.py with the synthetic model; return the process"""
+    env = dict(os.environ, FLASK_HOST='127.0.0.1', FLASK_PORT=str(port), SERVER_MODE=server_mode,
+               MODEL_BACKEND='synthetic', SYNTHETIC_LATENCY=str(latency), LOG_LEVEL='WARNING')
+    process = subprocess.Popen([sys.executable, 'flask_app_combined.py'], cwd=BASE_DIR, env=env)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/get_video')
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not come up within 60s")
+
+
+def group_report(viewers):
+    if not viewers:
+        return None
+    fps = [v.fps() for v in viewers]
+    ages = [a for v in viewers for a in v.ages_ms]
+    return {
+        'clients': len(viewers),
+        'errors': sum(1 for v in viewers if v.error),
+        'fps_mean': round(float(np.mean(fps)), 2),
+        'fps_min': round(min(fps), 2),
+        'fps_max': round(max(fps), 2),
+        'frame_age_p50_ms': percentile(ages, 50),
+        'frame_age_p95_ms': percentile(ages, 95),
+        'mbytes_received': round(sum(v.bytes for v in viewers) / 2 ** 20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Open many concurrent /video_feed viewers (fast and deliberately slow) "
+                    "plus /set_target and /set_video churn, and report delivered FPS, frame "
+                    "age and server CPU/memory.")
+    parser.add_argument("--url", default="http://127.0.0.1:5001", help="Backend base URL")
+    parser.add_argument("--spawn", action="store_true",
+                        help="Start a local backend with MODEL_BACKEND=synthetic (no weights needed)")
+    parser.add_argument("--server-mode", default="asgi", choices=("flask", "asgi"),
+                        help="SERVER_MODE of the spawned backend")
+    parser.add_argument("--latency", type=float, default=0.03, help="Synthetic inference seconds per frame")
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent viewers")
+    parser.add_argument("--slow-fraction", type=float, default=0.2, help="Share of viewers that read slowly")
+    parser.add_argument("--slow-kbps", type=float, default=200.0, help="Read speed of slow viewers")
+    parser.add_argument("--camera", help="Watch /video_feed/<camera> instead of the active camera")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which viewers connect")
+    parser.add_argument("--churn-interval", type=float, default=5.0,
+                        help="Seconds between /set_target (and /set_video) calls; 0 disables")
+    parser.add_argument("--targets", default="Fajar,Dublin,George", help="Names used for /set_target churn")
+    parser.add_argument("--videos", default="", help="Cameras used for /set_video churn, e.g. pasar,dublin")
+    parser.add_argument("--out", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    process = None
+    if args.spawn:
+        port = parse_url(args.url)[1]
+        print(f"🚀 Starting backend on port {port} (synthetic model, {args.server_mode})")
+        process = spawn_server(port, args.server_mode, args.latency)
+
+    try:
+        start = time.time()
+        until = start + args.ramp + args.duration
+        path = f"/video_feed/{args.camera}" if args.camera else "/video_feed"
+        slow_count = int(round(args.clients * args.slow_fraction))
+        viewers = []
+        sampler = ServerSampler(args.url, until)
+        sampler.start()
+        for i in range(args.clients):
+            viewer = Viewer(args.url, path, until, args.slow_kbps if i < slow_count else None)
+            viewer.start()
+            viewers.append(viewer)
+            time.sleep(args.ramp / max(1, args.clients))
+        churn = None
+        if args.churn_interval > 0:
+            churn = Churn(args.url, until, args.churn_interval,
+                          [t.strip() for t in args.targets.split(',') if t.strip()],
+                          [v.strip() for v in args.videos.split(',') if v.strip()])
+            churn.start()
+        print(f"👀 {args.clients} viewers ({slow_count} slow at {args.slow_kbps:.0f} KB/s) "
+              f"for {args.duration:.0f}s...")
+        for viewer in viewers:
+            viewer.join(timeout=max(0.0, until - time.time()) + 15)
+        sampler.join(timeout=5)
+        if churn is not None:
+            churn.join(timeout=30)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k != 'out'},
+        'fast': group_report(viewers[slow_count:]),
+        'slow': group_report(viewers[:slow_count]),
+        'control': {
+            'requests': len(churn.latencies_ms),
+            'errors': churn.errors,
+            'last_error': churn.last_error,
+            'p50_ms': percentile(churn.latencies_ms, 50),
+            'p95_ms': percentile(churn.latencies_ms, 95),
+        } if churn else None,
+        'server': {
+            'cpu_pct_mean': round(float(np.mean(sampler.cpu_pct)), 1) if sampler.cpu_pct else None,
+            'cpu_pct_max': round(max(sampler.cpu_pct), 1) if sampler.cpu_pct else None,
+            'rss_mb_max': round(max(sampler.rss_mb), 1) if sampler.rss_mb else None,
+        },
+    }
+    print(json.dumps(report, indent=1))
+    errors = [v.error for v in viewers if v.error]
+    if errors:
+        print(f"⚠️ {len(errors)} viewer errors, e.g. {errors[0]}")
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=1))
+        print(f"💾 Report saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+# LOG_LEVEL: DEBUG, INFO (default), WARNING, ERROR or OFF (no logging at all)
+# LOG_FORMAT: text (default, human readable) or json (one object per line)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        camera = getattr(record, "camera", None)
+        prefix = f"[{camera}] " if camera else ""
+        line = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname[0]} {prefix}{record.getMessage()}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        camera = getattr(record, "camera", None)
+        if camera:
+            entry["camera"] = camera
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level=None, fmt=None):
+    """Route all records through a queue to one writer thread (idempotent).
+
+    The frame loop only appends to an in-memory queue; formatting output and
+    the write syscall happen on the listener thread.
+    """
+    global _listener
+    level = (level or LOG_LEVEL).upper()
+    with _setup_lock:
+        if _listener is not None:
+            return
+        root = logging.getLogger()
+        if level == "OFF":
+            # Every logger call becomes a single integer comparison
+            logging.disable(logging.CRITICAL)
+            return
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+        log_queue = queue.SimpleQueue()
+        root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+        root.setLevel(level)
+        _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+class CameraLogger(logging.LoggerAdapter):
+    """Logger that tags every record with a camera id"""
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = dict(kwargs.get("extra") or {}, camera=self.extra["camera"])
+        return msg, kwargs
+
+
+def get_logger(name, camera=None):
+    logger = logging.getLogger(name)
+    return CameraLogger(logger, {"camera": camera}) if camera else logger
+
+
+class RateLimiter:
+    """Allow a hot-path message at most once per interval seconds per key"""
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._last = {}
+
+    def allow(self, key=None):
+        now = time.monotonic()
+        if now - self._last.get(key, float("-inf")) < self.interval:
+            return False
+        self._last[key] = now
+        return True
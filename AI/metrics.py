@@ -0,0 +1,136 @@
+import os
+import resource
+import threading
+from bisect import bisect_left
+
+STAGES = ("decode", "inference", "reid", "postprocess", "overlay", "encode")
+# Upper bounds in seconds; per-stage times on CPU range from ~1ms to ~1s
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FPS_SMOOTHING = 0.1  # Weight of the newest frame interval in the output FPS average
+
+
+class Histogram:
+    """Prometheus-style histogram; observe() is a bisect plus three additions"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """Return (cumulative bucket counts, sum, count)"""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for n in counts:
+            running += n
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class PipelineMetrics:
+    """Stage timings and output counters of one camera's frame loop"""
+
+    def __init__(self):
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.latency = Histogram(LATENCY_BUCKETS)  # Decoded -> published
+        self.frames_out = 0
+        self.output_fps = 0.0
+        self.model_load_seconds = None
+        self._last_out = None
+
+    def observe(self, stage, seconds):
+        self.stages[stage].observe(seconds)
+
+    def frame_out(self, now, latency):
+        """Record one published frame"""
+        self.frames_out += 1
+        self.latency.observe(latency)
+        if self._last_out is not None and now > self._last_out:
+            fps = 1.0 / (now - self._last_out)
+            self.output_fps += FPS_SMOOTHING * (fps - self.output_fps)
+        self._last_out = now
+
+
+def process_rss_bytes():
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def thread_cpu_seconds(native_id):
+    """User + system CPU time of one thread of this process (Linux), else None"""
+    if native_id is None:
+        return None
+    try:
+        with open(f"/proc/self/task/{native_id}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _escape(value, quote=True):
+    """Backslash, newline (and in label values the double quote) as the text format requires"""
+    value = str(value).replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quote else value
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    # Values may be user input (target names, camera ids from the config)
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class Exposition:
+    """Collect samples and render them in the Prometheus text format.
+
+    Samples are grouped per metric family, so callers can add them camera by
+    camera in any order.
+    """
+
+    def __init__(self):
+        self._families = {}  # name -> (type, help, lines), in insertion order
+
+    def _family(self, name, kind, help_text):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (kind, help_text, [])
+        return family[2]
+
+    def add(self, name, kind, help_text, value, **labels):
+        if value is None:
+            return
+        self._family(name, kind, help_text).append(f"{name}{_labels(labels)} {value}")
+
+    def add_histogram(self, name, help_text, histogram, **labels):
+        lines = self._family(name, "histogram", help_text)
+        cumulative, total, count = histogram.snapshot()
+        bounds = [str(b) for b in histogram.buckets] + ["+Inf"]
+        for bound, n in zip(bounds, cumulative):
+            lines.append(f"{name}_bucket{_labels(dict(labels, le=bound))} {n}")
+        lines.append(f"{name}_sum{_labels(labels)} {total}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+
+    def render(self):
+        out = []
+        for name, (kind, help_text, lines) in self._families.items():
+            out.append(f"# HELP {name} {_escape(help_text, quote=False)}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
@@ -0,0 +1,6 @@
+import re
+
+
+def slug(text, fallback):
+    """Lower-case name safe for file names and ids; fallback when nothing is left"""
+    return re.sub(r"\W+", "_", str(text).lower()).strip("_") or fallback
@@ -0,0 +1,109 @@
+import threading
+
+import numpy as np
+
+GRID_COLS, GRID_ROWS = 32, 18   # Density cells across and down the frame
+BUCKET_SECONDS = 1.0            # Resolution of the sliding windows
+WINDOWS = (10, 60, 300)         # Seconds reported by snapshot(); the longest sets the history kept
+
+
+class OccupancyGrid:
+    """Crowd density and people counts of one camera over sliding windows.
+
+    Every update drops each person's foot point (bottom centre of the box)
+    into a coarse grid with one bincount. Grids, frame counts and people
+    counts are summed into one-second buckets of a ring buffer covering the
+    longest window, so a window's density is a sum over its buckets divided
+    by the frames they saw: people per frame in each cell.
+    """
+
+    def __init__(self, cols=GRID_COLS, rows=GRID_ROWS, windows=WINDOWS, bucket_seconds=BUCKET_SECONDS):
+        self.cols, self.rows = cols, rows
+        self.windows = tuple(sorted(windows))
+        self.bucket_seconds = bucket_seconds
+        size = int(np.ceil(self.windows[-1] / bucket_seconds))
+        self._grids = np.zeros((size, rows * cols), np.float32)
+        self._frames = np.zeros(size, np.int64)
+        self._people = np.zeros(size, np.int64)   # Sum of per-frame counts
+        self._peak = np.zeros(size, np.int64)     # Highest per-frame count
+        self._bucket = None  # Absolute number of the newest bucket
+        self.count = 0       # People in the latest frame
+        self.source = None   # "people" (person detector) or "targets" (target boxes)
+        self.updated_at = None
+        self._lock = threading.Lock()  # update() runs on the frame loop, snapshot() on requests
+
+    def _advance(self, ts):
+        """Make the bucket of ts current, clearing the ones skipped since the last update"""
+        bucket = int(ts // self.bucket_seconds)
+        size = len(self._frames)
+        if self._bucket is not None and bucket <= self._bucket:
+            return self._bucket % size  # Same second (or clock went back): keep adding
+        if self._bucket is None or bucket - self._bucket >= size:
+            stale = slice(None)
+        else:
+            stale = np.arange(self._bucket + 1, bucket + 1) % size
+        self._grids[stale] = 0
+        self._frames[stale] = 0
+        self._people[stale] = 0
+        self._peak[stale] = 0
+        self._bucket = bucket
+        return bucket % size
+
+    def update(self, boxes, shape, ts, source):
+        """Add one frame: boxes is an (n, 4+) array-like of x1, y1, x2, y2 in pixels"""
+        boxes = np.asarray(boxes, np.float32).reshape(-1, 4) if len(boxes) else np.empty((0, 4), np.float32)
+        height, width = shape[:2]
+        cols = ((boxes[:, 0] + boxes[:, 2]) * (0.5 * self.cols / width)).astype(np.int64).clip(0, self.cols - 1)
+        rows = (boxes[:, 3] * (self.rows / height)).astype(np.int64).clip(0, self.rows - 1)
+        cells = np.bincount(rows * self.cols + cols, minlength=self.rows * self.cols)
+        with self._lock:
+            slot = self._advance(ts)
+            self._grids[slot] += cells
+            self._frames[slot] += 1
+            self._people[slot] += len(boxes)
+            self._peak[slot] = max(self._peak[slot], len(boxes))
+            self.count = len(boxes)
+            self.source = source
+            self.updated_at = ts
+
+    def snapshot(self, now, grid_window=None):
+        """Counts for every window plus the density grid of grid_window (default: the shortest)"""
+        grid_window = grid_window or self.windows[0]
+        size = len(self._frames)
+        with self._lock:
+            newest = self._bucket
+            if newest is None:
+                return {'count': 0, 'source': None, 'updated_at': None, 'windows': {}, 'grid': None}
+            current = int(now // self.bucket_seconds)
+
+            def buckets(seconds):
+                """Ring slots of the last `seconds` up to now"""
+                first = max(current - int(np.ceil(seconds / self.bucket_seconds)) + 1, newest - size + 1)
+                return np.arange(first, min(newest, current) + 1) % size
+
+            windows = {}
+            for seconds in self.windows:
+                slots = buckets(seconds)
+                frames = int(self._frames[slots].sum())
+                windows[f"{seconds:g}s"] = {
+                    'frames': frames,
+                    'mean': round(float(self._people[slots].sum()) / frames, 2) if frames else 0.0,
+                    'max': int(self._peak[slots].max()) if len(slots) else 0,
+                }
+            slots = buckets(grid_window)
+            frames = int(self._frames[slots].sum())
+            density = self._grids[slots].sum(axis=0) / max(frames, 1)
+            live = self.updated_at is not None and current - newest <= 1
+            return {
+                'count': self.count if live else 0,
+                'source': self.source,
+                'updated_at': round(self.updated_at, 3),
+                'windows': windows,
+                'grid': {
+                    'cols': self.cols,
+                    'rows': self.rows,
+                    'window': f"{grid_window:g}s",
+                    'frames': frames,
+                    'cells': np.round(density, 3).reshape(self.rows, self.cols).tolist(),
+                },
+            }
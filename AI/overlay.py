@@ -0,0 +1,125 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+# Label bar above a bounding box, as cv2.rectangle((x, y - 25), (x + 200, y))
+# drew it: corners are inclusive, so the bar is 26 x 201 pixels
+LABEL_HEIGHT = 25
+LABEL_BASELINE = 5  # Text baseline above the box edge
+
+
+class OverlayCompositor:
+    """Render text once into cached sprites and alpha-blend them into frames.
+
+    Sprites are keyed by (text, colour, background, scale, thickness) so a HUD
+    line is only rasterised again when its value actually changes.
+    """
+
+    def __init__(self, max_sprites=256):
+        self.max_sprites = max_sprites
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _render(self, text, color, background, scale, thickness, min_width, height):
+        """Rasterise text into a (BGR, inverse alpha) sprite"""
+        if background is not None:
+            return self._render_label(text, color, background, scale, thickness, min_width, height)
+        (text_w, text_h), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+        pad = thickness + 1
+        width = max(text_w + 2 * pad, min_width)
+        height = text_h + baseline + 2 * pad
+        text_y = pad + text_h
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.putText(mask, text, (pad, text_y), FONT, scale, 255, thickness, cv2.LINE_AA)
+        # Premultiplied foreground and inverse alpha, so blitting is two
+        # saturating cv2 ops instead of a NumPy uint16 round trip
+        alpha = cv2.merge([mask, mask, mask])
+        fg = np.empty((height, width, 3), dtype=np.uint8)
+        fg[:] = color
+        bgr = cv2.multiply(fg, alpha, scale=1 / 255)
+        inv_alpha = cv2.bitwise_not(alpha)
+        # pad/text_y convert a cv2.putText-style origin (baseline-left) to top-left
+        return bgr, inv_alpha, pad, text_y
+
+    @staticmethod
+    def _render_label(text, color, background, scale, thickness, bar_width, height):
+        """Solid bar with aliased text at its left edge, as rectangle + putText drew it.
+
+        Opaque unless the text runs past the bar; that part is blended with
+        its (binary) mask so the frame shows through around the glyphs.
+        """
+        text_y = height - 1 - LABEL_BASELINE
+        (text_w, _), _ = cv2.getTextSize(text, FONT, scale, thickness)
+        width = max(bar_width, text_w + thickness + 1)
+        bgr = np.zeros((height, width, 3), dtype=np.uint8)
+        bgr[:, :bar_width] = background
+        cv2.putText(bgr, text, (0, text_y), FONT, scale, color, thickness)
+        inv_alpha = None
+        if width > bar_width:
+            mask = np.zeros((height, width), dtype=np.uint8)
+            cv2.putText(mask, text, (0, text_y), FONT, scale, 255, thickness)
+            mask[:, :bar_width] = 255
+            inv_alpha = cv2.bitwise_not(cv2.merge([mask, mask, mask]))
+        return bgr, inv_alpha, 0, text_y
+
+    def sprite(self, text, color, background=None, scale=0.6, thickness=2,
+               min_width=0, height=None):
+        """Return a cached sprite, rendering it on first use"""
+        key = (text, tuple(color), tuple(background) if background else None,
+               scale, thickness, min_width, height)
+        with self._lock:
+            cached = self._sprites.get(key)
+            if cached is not None:
+                self._sprites.move_to_end(key)
+                return cached
+        rendered = self._render(text, color, background, scale, thickness, min_width, height)
+        with self._lock:
+            self._sprites[key] = rendered
+            while len(self._sprites) > self.max_sprites:
+                self._sprites.popitem(last=False)
+        return rendered
+
+    @staticmethod
+    def blit(frame, sprite, left, top):
+        """Blend a sprite into frame at (left, top), clipped to the frame bounds"""
+        bgr, inv_alpha, _, _ = sprite
+        frame_h, frame_w = frame.shape[:2]
+        sprite_h, sprite_w = bgr.shape[:2]
+        x0, y0 = max(left, 0), max(top, 0)
+        x1, y1 = min(left + sprite_w, frame_w), min(top + sprite_h, frame_h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        sx, sy = x0 - left, y0 - top
+        src = bgr[sy:sy + (y1 - y0), sx:sx + (x1 - x0)]
+        roi = frame[y0:y1, x0:x1]
+        if inv_alpha is None:
+            roi[:] = src
+            return
+        inv = inv_alpha[sy:sy + (y1 - y0), sx:sx + (x1 - x0)]
+        # In place on the frame: no temporary per sprite
+        cv2.multiply(roi, inv, dst=roi, scale=1 / 255)
+        cv2.add(roi, src, dst=roi)
+
+    def draw_text(self, frame, text, org, color, scale=0.6, thickness=2):
+        """Drop-in replacement for cv2.putText using cached sprites"""
+        sprite = self.sprite(text, color, scale=scale, thickness=thickness)
+        _, _, pad, text_y = sprite
+        self.blit(frame, sprite, org[0] - pad, org[1] - text_y)
+
+    def draw_label(self, frame, text, x, y, color, text_color=(0, 0, 0),
+                   scale=0.6, thickness=2, min_width=200):
+        """Draw a filled label bar with text whose bottom-left corner is (x, y)"""
+        sprite = self.sprite(text, text_color, background=color, scale=scale,
+                             thickness=thickness, min_width=min_width + 1,
+                             height=LABEL_HEIGHT + 1)
+        self.blit(frame, sprite, x, y - LABEL_HEIGHT)
+
+    def draw_detections(self, frame, detections, colors, thickness=3):
+        """Box and "name: conf" label for each (name, conf, x1, y1, x2, y2)"""
+        for name, conf, x1, y1, x2, y2 in detections:
+            color = colors[name]
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
+            self.draw_label(frame, f"{name}: {conf:.2f}", x1, y1, color)
@@ -0,0 +1,327 @@
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from log_setup import get_logger
+from naming import slug
+from vector_index import FlatIndex, normalize
+
+# Optional ONNX re-ID network (e.g. OSNet, 256x128 input, dynamic batch);
+# without it crops are described by colour stripes
+REID_MODEL = os.environ.get("REID_MODEL")
+REID_THRESHOLD = float(os.environ.get("REID_THRESHOLD", "0.85"))  # Cosine similarity that counts as a match
+REID_PERSON_CONF = float(os.environ.get("REID_PERSON_CONF", "0.4"))
+STRIPES = 6           # Horizontal body bands (head, shoulders, torso, ..., feet)
+CROP_SIZE = (32, 64)  # (width, height) every crop is shrunk to before it is described
+HUE_BINS, GRAY_BINS, SAT_BINS, VAL_BINS = 16, 4, 4, 4
+MIN_SATURATION = 40   # Below this a pixel's hue is noise and it counts as gray
+
+log = get_logger(__name__)
+
+
+def clip_boxes(boxes, shape):
+    """Boxes clipped to the frame, without the ones that end up empty"""
+    height, width = shape[:2]
+    boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+    boxes[:, 0::2] = boxes[:, 0::2].clip(0, width)
+    boxes[:, 1::2] = boxes[:, 1::2].clip(0, height)
+    return boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+
+
+class StripeEmbedder:
+    """Colour histograms of horizontal body stripes: CPU only, no weights.
+
+    Crops are shrunk to 32x64 and converted to HSV in one call, and the box
+    edges are dropped as background. Each stripe gets a hue histogram of its
+    saturated pixels, a gray-level histogram of the rest and saturation/value
+    histograms, all counted by one bincount.
+    The square root makes the cosine similarity a Hellinger kernel.
+    """
+
+    BINS = HUE_BINS + GRAY_BINS + SAT_BINS + VAL_BINS
+    dim = STRIPES * BINS
+
+    def embed(self, crops):
+        """(len(crops), dim) unit vectors for BGR crops"""
+        if not crops:
+            return np.empty((0, self.dim), np.float32)
+        width, height = CROP_SIZE
+        tiles = np.concatenate([cv2.resize(crop, CROP_SIZE, interpolation=cv2.INTER_AREA) for crop in crops])
+        hsv = cv2.cvtColor(tiles, cv2.COLOR_BGR2HSV).reshape(len(crops), height, width, 3)
+        # The outer fifth on each side of a box is mostly background
+        hsv = hsv[:, :, width // 5:width - width // 5].astype(np.int32)
+        hue, sat, val = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+        tone = np.where(sat >= MIN_SATURATION, hue * HUE_BINS // 180, HUE_BINS + val * GRAY_BINS // 256)
+        stripe = (np.arange(height) * STRIPES // height)[None, :, None]
+        base = (np.arange(len(crops))[:, None, None] * STRIPES + stripe) * self.BINS
+        index = np.concatenate([
+            (base + tone).ravel(),
+            (base + HUE_BINS + GRAY_BINS + sat * SAT_BINS // 256).ravel(),
+            (base + HUE_BINS + GRAY_BINS + SAT_BINS + val * VAL_BINS // 256).ravel(),
+        ])
+        hist = np.bincount(index, minlength=len(crops) * self.dim).reshape(len(crops), self.dim)
+        return normalize(np.sqrt(hist, dtype=np.float32))
+
+
+class OnnxEmbedder:
+    """Re-ID network run through cv2.dnn, so no extra runtime is needed"""
+
+    MEAN = np.array([0.485, 0.456, 0.406], np.float32).reshape(1, 3, 1, 1)
+    STD = np.array([0.229, 0.224, 0.225], np.float32).reshape(1, 3, 1, 1)
+
+    def __init__(self, path, size=(128, 256)):
+        self.net = cv2.dnn.readNetFromONNX(str(path))
+        self.size = size  # (width, height) of the network input
+        self.dim = self.embed([np.zeros((size[1], size[0], 3), np.uint8)]).shape[1]
+
+    def embed(self, crops):
+        if not crops:
+            return np.empty((0, self.dim), np.float32)
+        blob = cv2.dnn.blobFromImages(crops, 1 / 255.0, self.size, swapRB=True)
+        self.net.setInput((blob - self.MEAN) / self.STD)
+        return normalize(self.net.forward().reshape(len(crops), -1))
+
+
+def embed_boxes(embedder, frame, boxes):
+    """Embeddings of the boxed crops of frame (boxes already clipped)"""
+    return embedder.embed([frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes])
+
+
+def make_embedder():
+    """ONNX network from REID_MODEL if set, else the colour-stripe descriptor"""
+    return OnnxEmbedder(REID_MODEL) if REID_MODEL else StripeEmbedder()
+
+
+class PersonDetector:
+    """Generic detector restricted to its "person" class, loaded on first use.
+
+    ready() starts loading on a background thread so a camera keeps
+    streaming meanwhile (finding no one); ready(block=True) waits instead.
+    One instance is shared by the gallery, every camera and the track
+    indexer, so the model is loaded once; detect() runs one call at a time.
+    """
+
+    def __init__(self, load, conf=REID_PERSON_CONF):
+        self._load = load
+        self.conf = conf
+        self.model = None
+        self.classes = None
+        self.failed = False
+        self._started = False
+        self._lock = threading.Lock()
+        self._infer_lock = threading.Lock()  # Neither YOLO nor a RemoteModel takes concurrent calls
+
+    def ready(self, block=False):
+        if self.model is not None:
+            return True
+        if block:
+            self._load_model()
+        elif not self._started:
+            self._started = True
+            threading.Thread(target=self._load_model, daemon=True, name="person-detector").start()
+        return self.model is not None
+
+    def _load_model(self):
+        with self._lock:
+            if self.model is not None or self.failed:
+                return
+            try:
+                model = self._load()
+            except Exception as e:
+                self.failed = True
+                log.error("❌ Could not load person detector: %s", e)
+                return
+            names = getattr(model, 'names', None) or {}
+            self.classes = [int(i) for i, name in names.items() if str(name).lower() == "person"]
+            if not self.classes:
+                self.failed = True
+                log.error("❌ Person detector has no 'person' class")
+                return
+            self.model = model
+            log.info("✅ Person detector loaded")
+
+    def detect(self, frame):
+        """(n, 4) int boxes of the people in frame"""
+        with self._infer_lock:
+            results = self.model(frame, conf=self.conf, classes=self.classes, verbose=False)
+        boxes = results[0].boxes if results else None
+        if boxes is None or len(boxes) == 0:
+            return np.empty((0, 4), np.int32)
+        return clip_boxes(boxes.xyxy.cpu().numpy(), frame.shape)
+
+
+class ReferenceGallery:
+    """Reference photos of people to look for, e.g. from missing-person reports.
+
+    Each photo is cut down to the person in it, saved under
+    directory/<name>/ and embedded once; the vectors of everyone sit in one
+    FlatIndex labelled by person. Saved photos are embedded again at start,
+    so switching REID_MODEL needs no migration.
+    """
+
+    def __init__(self, directory, detector=None):
+        self.directory = Path(directory)
+        self.detector = detector  # PersonDetector for cutting people out of uploads
+        self.embedder = make_embedder()
+        self.index = FlatIndex(self.embedder.dim)
+        self.people = {}   # Lower-case name -> {'name', 'label', 'photos', 'created'}
+        self.by_key = {}   # Lower-case name -> label; replaced whole, read by camera threads
+        self._labels = itertools.count()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            saved = json.loads((self.directory / "index.json").read_text())
+        except (OSError, ValueError):
+            return
+        for person in saved:
+            folder = self.directory / slug(person['name'], "person")
+            crops = [crop for crop in (cv2.imread(str(folder / photo)) for photo in person['photos'])
+                     if crop is not None]
+            if not crops:
+                continue
+            person['label'] = next(self._labels)
+            self.index.add(self.embedder.embed(crops), [person['label']] * len(crops))
+            self.people[person['name'].lower()] = person
+        self.by_key = {key: person['label'] for key, person in self.people.items()}
+        log.info("🧍 Re-ID gallery: %d people, %d photos", len(self.people), len(self.index))
+
+    def _save(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        saved = [{k: v for k, v in person.items() if k != 'label'} for person in self.people.values()]
+        tmp = self.directory / "index.json.tmp"
+        tmp.write_text(json.dumps(saved, indent=1))
+        tmp.replace(self.directory / "index.json")
+
+    def _person_crop(self, image):
+        """Largest person in the photo, or the whole photo if none is found"""
+        if self.detector is None or not self.detector.ready(block=True):
+            return image
+        boxes = self.detector.detect(image)
+        if not len(boxes):
+            return image
+        x1, y1, x2, y2 = max(boxes, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]))
+        return image[y1:y2, x1:x2]
+
+    def _embed_photo(self, data):
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Foto tidak dapat dibaca")
+        crop = self._person_crop(image)
+        return crop, self.embedder.embed([crop])
+
+    def embed_photo(self, data):
+        """(1, dim) embedding of the person in a JPEG/PNG photo"""
+        with self._lock:
+            return self._embed_photo(data)[1]
+
+    def vectors(self, name):
+        """Reference embeddings of name, or None if there are no photos"""
+        label = self.by_key.get(name.lower())
+        if label is None:
+            return None
+        with self._lock:
+            return self.index.vectors[self.index.labels == label]
+
+    def add(self, name, data):
+        """Add a JPEG/PNG reference photo of name; returns the person's entry"""
+        with self._lock:
+            crop, vector = self._embed_photo(data)
+            key = name.lower()
+            person = self.people.get(key)
+            if person is None:
+                person = {'name': name, 'label': next(self._labels), 'photos': [], 'created': time.time()}
+            folder = self.directory / slug(name, "person")
+            folder.mkdir(parents=True, exist_ok=True)
+            filename = f"{int(time.time() * 1000)}.jpg"
+            cv2.imwrite(str(folder / filename), crop, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            person['photos'].append(filename)
+            self.index.add(vector, [person['label']])
+            self.people[key] = person
+            self.by_key = dict(self.by_key, **{key: person['label']})
+            self._save()
+        log.info("🧍 Reference photo added for %s (%d photos)", name, len(person['photos']))
+        return self._describe(person)
+
+    def remove(self, name):
+        with self._lock:
+            person = self.people.pop(name.lower(), None)
+            if person is None:
+                return False
+            self.by_key = {key: label for key, label in self.by_key.items() if key != name.lower()}
+            self.index.remove(person['label'])
+            shutil.rmtree(self.directory / slug(person['name'], "person"), ignore_errors=True)
+            self._save()
+        log.info("🧍 Reference photos removed for %s", person['name'])
+        return True
+
+    def labels_for(self, names):
+        """{label: name} for the names that have reference photos"""
+        by_key = self.by_key
+        return {by_key[name.lower()]: name for name in names if name.lower() in by_key}
+
+    def _describe(self, person):
+        return {'name': person['name'], 'photos': len(person['photos']), 'created': person['created']}
+
+    def describe(self):
+        with self._lock:
+            return [self._describe(person) for person in self.people.values()]
+
+
+class PersonMatcher:
+    """Re-ID for one camera: find people, embed their crops, search the gallery.
+
+    Only runs while a target has reference photos. Every reference person
+    is matched to at most one box per frame, best similarity first, so
+    results look like model detections with the similarity as confidence.
+    """
+
+    def __init__(self, gallery, detector, threshold=REID_THRESHOLD):
+        self.gallery = gallery
+        self.detector = detector
+        self.embedder = make_embedder()  # cv2.dnn nets are not shared between threads
+        self.threshold = threshold
+
+    def wanted(self, targets):
+        """{gallery label: target name} for targets the model has no class for"""
+        if not self.gallery.by_key:
+            return {}
+        known = targets.by_class_id.values()
+        return self.gallery.labels_for([name for name in targets.names if name not in known])
+
+    def people(self, frame, embed=True):
+        """Person boxes in frame and their embeddings (none while the detector loads)"""
+        if not self.detector.ready():
+            return np.empty((0, 4), np.int32), np.empty((0, self.embedder.dim), np.float32)
+        boxes = self.detector.detect(frame)
+        return boxes, embed_boxes(self.embedder, frame, boxes) if embed else None
+
+    def match(self, boxes, vectors, wanted):
+        """(target name, similarity, x1, y1, x2, y2) per wanted person among the boxes"""
+        if not len(boxes):
+            return []
+        scores, labels = self.gallery.index.search(vectors, len(self.gallery.index))
+        detections, used_names, used_boxes = [], set(), set()
+        for flat in np.argsort(-scores, axis=None):
+            box, rank = divmod(int(flat), scores.shape[1])
+            score = float(scores[box, rank])
+            if score < self.threshold:
+                break
+            name = wanted.get(int(labels[box, rank]))
+            if name is None or name in used_names or box in used_boxes:
+                continue
+            used_names.add(name)
+            used_boxes.add(box)
+            x1, y1, x2, y2 = (int(v) for v in boxes[box])
+            detections.append((name, score, x1, y1, x2, y2))
+            if len(detections) == len(wanted):
+                break
+        return detections
@@ -0,0 +1,125 @@
+import os
+import sys
+import threading
+
+import cv2
+
+from log_setup import get_logger
+
+# Deployment-wide settings; per-camera "threads", "decode_threads" and
+# "cores" config keys override the automatic split.
+CPU_CORES = os.environ.get("CPU_CORES", "")            # e.g. "0-7"; default: all usable cores
+CPU_PIN = os.environ.get("CPU_PIN", "false").lower() in ("1", "true", "yes", "on")
+CAMERA_THREADS = int(os.environ.get("CAMERA_THREADS", "0"))  # 0 = cores / cameras
+DECODE_THREADS = int(os.environ.get("DECODE_THREADS", "2"))  # FFmpeg threads per capture
+OPENCV_THREADS = int(os.environ.get("OPENCV_THREADS", "0"))  # 0 = largest camera budget
+
+log = get_logger(__name__)
+
+# torch's intra-op pool is process-wide: plan_budgets() picks one size for it
+# (0 = inference runs in worker processes, which size their own pool)
+_torch_threads = 0
+_torch_applied = 0
+_torch_lock = threading.Lock()
+
+
+def parse_cores(spec):
+    """'0-3,6' or [0, 1] -> sorted list of core ids"""
+    if isinstance(spec, (list, tuple)):
+        return sorted(int(c) for c in spec)
+    cores = set()
+    for part in filter(None, (p.strip() for p in str(spec).split(","))):
+        first, _, last = part.partition("-")
+        cores.update(range(int(first), int(last or first) + 1))
+    return sorted(cores)
+
+
+def usable_cores():
+    if CPU_CORES:
+        return parse_cores(CPU_CORES)
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # Not Linux
+        return list(range(os.cpu_count() or 1))
+
+
+def pin_current_thread(cores):
+    """Restrict the calling thread (and threads it starts later) to cores"""
+    if not cores or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(threading.get_native_id(), cores)
+        return True
+    except OSError as e:
+        log.warning("⚠️ Could not pin thread to cores %s: %s", cores, e)
+        return False
+
+
+def apply_torch_threads():
+    """Size torch's process-wide pool once torch is loaded, and again only if the plan changes"""
+    global _torch_applied
+    torch = sys.modules.get("torch")  # Only if the model backend loaded it
+    if torch is None or not _torch_threads or _torch_threads == _torch_applied:
+        return
+    with _torch_lock:
+        if _torch_threads != _torch_applied:
+            torch.set_num_threads(_torch_threads)
+            _torch_applied = _torch_threads
+
+
+class ThreadBudget:
+    """CPU share of one camera: inference threads, decoder threads, cores.
+
+    apply() is called on the camera's own threads; pinning is inherited by
+    the pool threads they spawn afterwards. The inference thread count is
+    advisory per camera: torch has one pool per process, sized by plan_budgets().
+    """
+
+    def __init__(self, camera_id, threads, decode_threads, cores=None):
+        self.camera_id = camera_id
+        self.threads = threads
+        self.decode_threads = decode_threads
+        self.cores = cores  # None = not pinned
+
+    def apply(self, role):
+        """Apply to the calling thread; role is "inference" or "decode\""""
+        pinned = pin_current_thread(self.cores)
+        if role == "inference":
+            apply_torch_threads()
+        return pinned
+
+    def describe(self):
+        return {'threads': self.threads, 'decode_threads': self.decode_threads,
+                'cores': self.cores}
+
+
+def plan_budgets(configs, in_process_inference=True):
+    """Split the usable cores evenly across cameras, honouring per-camera overrides.
+
+    A camera's share covers its decoder threads too, so inference gets the
+    rest. With in_process_inference False (INFERENCE_WORKERS > 0) torch in
+    this process is left alone.
+    """
+    global _torch_threads
+    cores = usable_cores()
+    share = max(1, len(cores) // max(1, len(configs)))
+    budgets = {}
+    for i, (camera_id, config) in enumerate(configs.items()):
+        start = (i * share) % len(cores)
+        own = parse_cores(config["cores"]) if "cores" in config else cores[start:start + share]
+        pinned = "cores" in config or CPU_PIN
+        decode_threads = int(config.get("decode_threads", DECODE_THREADS))
+        budgets[camera_id] = ThreadBudget(
+            camera_id,
+            threads=int(config.get("threads") or CAMERA_THREADS or max(1, len(own) - decode_threads)),
+            decode_threads=decode_threads,
+            cores=own if pinned else None)
+    threads = max((b.threads for b in budgets.values()), default=1)
+    cv2.setNumThreads(OPENCV_THREADS or threads)  # One process-wide pool shared by every camera
+    _torch_threads = threads if in_process_inference else 0
+    apply_torch_threads()
+    log.info("🧮 CPU budget: %d cores, %s inference + decode threads per camera, OpenCV %d threads, torch %s%s",
+             len(cores), ", ".join(f"{c}={b.threads}+{b.decode_threads}" for c, b in budgets.items()),
+             OPENCV_THREADS or threads, _torch_threads or "in workers",
+             ", pinned" if any(b.cores for b in budgets.values()) else "")
+    return budgets
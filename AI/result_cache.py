@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from log_setup import get_logger
+
+HASH_SAMPLE_BYTES = 4 * 1024 * 1024  # Hash size + head + tail: fast even for large files
+NEAREST_FRAMES = 5  # Frames skipped by the live pass are served from this close by
+DETECTION_DTYPE = np.dtype([('frame', '<i4'), ('target', 'u1'), ('conf', '<f4'), ('box', '<i4', (4,))])
+
+log = get_logger(__name__)
+
+
+def canonical_targets(names):
+    """Target names as they are keyed and stored: lower case, sorted"""
+    return sorted({str(n).lower() for n in names})
+
+
+def file_fingerprint(path):
+    """Cheap content hash of a video/model file (size, first and last 4 MB)"""
+    path = Path(path)
+    digest = hashlib.sha1(str(path.stat().st_size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(HASH_SAMPLE_BYTES))
+        if path.stat().st_size > HASH_SAMPLE_BYTES:
+            f.seek(-HASH_SAMPLE_BYTES, os.SEEK_END)
+            digest.update(f.read(HASH_SAMPLE_BYTES))
+    return digest.hexdigest()[:16]
+
+
+class CacheEntry:
+    """Results for one (video, model, targets, conf) combination, by frame index.
+
+    While recording, detections are kept in memory and annotated JPEGs are
+    appended to a blob file. Once a whole loop of the video has been seen
+    the entry is finalized: detections become a sorted .npy array and both
+    are read back through memory maps. Rows refer to targets by their index
+    in the canonical (lower-case, sorted) names of the key, so the same
+    entry serves "Fajar" and "fajar" and survives restarts.
+    """
+
+    def __init__(self, cache, key, target_names, frame_count, store_jpegs):
+        self.cache = cache
+        self.key = key
+        self.target_names = canonical_targets(target_names)
+        self.frame_count = frame_count
+        self.store_jpegs = store_jpegs
+        self.complete = False
+        self._first_idx = None
+        self._wraps = 0
+        self._pending = {}  # frame index -> detections, while recording
+        self._jpeg_offsets = {}
+        self._blob = None
+        self._lock = threading.Lock()
+        if not self._load():
+            self._discard_files()
+
+    def _path(self, suffix):
+        return self.cache.cache_dir / f"{self.key}{suffix}"
+
+    def _load(self):
+        meta_path = self._path('.json')
+        if not meta_path.exists():
+            return False
+        try:
+            meta = json.loads(meta_path.read_text())
+            if meta.get('store_jpegs') != self.store_jpegs:
+                return False
+            if meta.get('targets') != self.target_names:
+                return False  # Written before rows used the canonical order
+            self._done = np.load(self._path('.done.npy'), mmap_mode='r')
+            self._rows = np.load(self._path('.det.npy'), mmap_mode='r')
+            self._index = self._rows['frame']
+            if self.store_jpegs:
+                self._offsets = np.load(self._path('.jpg.npy'), mmap_mode='r')
+                self._jpegs = np.memmap(self._path('.jpg.bin'), dtype=np.uint8, mode='r')
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("⚠️ Unreadable cache entry %s: %s", self.key, e)
+            return False
+        os.utime(meta_path)  # Most recently used
+        self.complete = True
+        return True
+
+    def _discard_files(self):
+        for path in self.cache.cache_dir.glob(f"{self.key}.*"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def _nearest(self, idx):
+        """Nearest processed frame at or before idx, within NEAREST_FRAMES"""
+        done = self._done
+        for i in range(min(idx, len(done) - 1), max(-1, idx - NEAREST_FRAMES - 1), -1):
+            if done[i]:
+                return i
+        return None
+
+    def detections(self, idx, names):
+        """Cached detections of a frame, or None if it was never processed.
+
+        Targets are labelled with names, the caller's current spelling. A
+        finished loop answers for frames the live pass skipped with the
+        closest earlier frame, so repeat loops never need inference.
+        """
+        label = {name.lower(): name for name in names}
+        if not self.complete:
+            pending = self._pending.get(idx)
+            if pending is None:
+                return None
+            return [(label.get(d[0].lower(), d[0]), *d[1:]) for d in pending]
+        idx = self._nearest(idx)
+        if idx is None:
+            return None
+        lo, hi = np.searchsorted(self._index, [idx, idx + 1])
+        canonical = self.target_names
+        return [(label.get(canonical[r['target']], canonical[r['target']]), float(r['conf']),
+                 *map(int, r['box'])) for r in self._rows[lo:hi]]
+
+    def jpeg(self, idx):
+        """Annotated JPEG of the nearest processed frame at or before idx"""
+        if not (self.complete and self.store_jpegs):
+            return None
+        offsets = self._offsets
+        for i in range(min(idx, len(offsets) - 1), -1, -1):
+            start, length = offsets[i]
+            if length > 0:
+                return self._jpegs[start:start + length].tobytes()
+        return None
+
+    def put(self, idx, detections, jpeg=None):
+        if self.complete:
+            return
+        with self._lock:
+            if self._first_idx is None:
+                self._first_idx = idx
+            self._pending[idx] = list(detections)
+            if self.store_jpegs and jpeg is not None:
+                if self._blob is None:
+                    self.cache.cache_dir.mkdir(parents=True, exist_ok=True)
+                    self._blob = open(self._path('.jpg.bin'), 'wb')
+                self._jpeg_offsets[idx] = (self._blob.tell(), len(jpeg))
+                self._blob.write(jpeg)
+
+    def wrapped(self, fps):
+        """Called when the video loops; finalize after a full loop was seen"""
+        if self.complete or self._first_idx is None:
+            return
+        self._wraps += 1
+        # Recording that began mid-video needs one more wrap to cover it all
+        if self._wraps >= 2 or self._first_idx <= max(1, fps):
+            self._finalize()
+
+    def close(self):
+        """Drop an unfinished recording (e.g. when the stream stops)"""
+        with self._lock:
+            if self._blob is not None:
+                self._blob.close()
+                self._blob = None
+            if not self.complete:
+                self._pending.clear()
+                self._discard_files()
+
+    def _finalize(self):
+        with self._lock:
+            pending = self._pending
+            if not pending:
+                return
+            position = {name: i for i, name in enumerate(self.target_names)}
+            rows = [(idx, position[d[0].lower()], d[1], d[2:])
+                    for idx in sorted(pending) for d in pending[idx]
+                    if d[0].lower() in position]
+            frame_count = max(self.frame_count, max(pending) + 1)
+            done = np.zeros(frame_count, dtype=bool)
+            done[list(pending)] = True
+            self.cache.cache_dir.mkdir(parents=True, exist_ok=True)
+            np.save(self._path('.det.npy'), np.array(rows, dtype=DETECTION_DTYPE))
+            np.save(self._path('.done.npy'), done)
+            if self.store_jpegs:
+                if self._blob is not None:
+                    self._blob.close()
+                    self._blob = None
+                offsets = np.zeros((frame_count, 2), dtype=np.int64)
+                for idx, (start, length) in self._jpeg_offsets.items():
+                    offsets[idx] = (start, length)
+                np.save(self._path('.jpg.npy'), offsets)
+            self._path('.json').write_text(json.dumps({
+                'targets': self.target_names, 'store_jpegs': self.store_jpegs,
+                'frames': int(done.sum()), 'created': round(time.time(), 3)}))
+            self._pending = {}
+            self._jpeg_offsets = {}
+            loaded = self._load()
+        if loaded:
+            log.info("💾 Loop cache saved: %s (%d frames)", self.key, int(done.sum()))
+            self.cache.evict()
+
+
+class LoopCache:
+    """On-disk cache of per-frame results for a looping video file.
+
+    Entries are keyed by (video hash, model hash, target set, confidence, ROI), so
+    later loops can skip inference (detections) or inference, drawing and
+    encoding (store_jpegs). The cache directory is kept under max_bytes by
+    evicting the least recently used entries.
+    """
+
+    def __init__(self, cache_dir, video_id, model_id, frame_count, max_bytes, store_jpegs=False):
+        self.cache_dir = Path(cache_dir)
+        self.frame_count = frame_count
+        self.max_bytes = max_bytes
+        self.store_jpegs = store_jpegs
+        self._prefix = f"{video_id}_{model_id}"
+        self._entries = {}
+
+    def entry(self, target_names, conf, roi=None):
+        """Entry for a target set and settings; the same object while they are unchanged"""
+        key = (tuple(canonical_targets(target_names)), conf, tuple(roi) if roi else None)
+        entry = self._entries.get(key)
+        if entry is None:
+            digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()[:12]
+            entry = CacheEntry(self, f"{self._prefix}_{digest}", target_names,
+                               self.frame_count, self.store_jpegs)
+            self._entries[key] = entry
+        return entry
+
+    def close(self):
+        for entry in self._entries.values():
+            entry.close()
+        self._entries.clear()
+
+    def evict(self):
+        """Delete least recently used entries until the directory fits max_bytes"""
+        entries = {}
+        for path in self.cache_dir.glob("*.*"):
+            key = path.name.split('.', 1)[0]
+            size, used = entries.get(key, (0, 0.0))
+            if path.suffix == '.json':
+                used = path.stat().st_mtime
+            entries[key] = (size + path.stat().st_size, used)
+        total = sum(size for size, _ in entries.values())
+        live = {entry.key for entry in self._entries.values()}
+        for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            if key in live:
+                continue
+            for path in self.cache_dir.glob(f"{key}.*"):
+                path.unlink(missing_ok=True)
+            total -= size
+            log.info("🧹 Evicted loop cache entry %s (%.1f MB)", key, size / 2 ** 20)
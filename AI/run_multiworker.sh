@@ -0,0 +1,20 @@
+#!/bin/sh
+# Start one engine process (capture + inference) and several HTTP workers.
+set -e
+
+export ENGINE_SOCKET="${ENGINE_SOCKET:-/tmp/ui-aic-engine.sock}"
+
+ENGINE_ROLE=engine python flask_app_combined.py &
+ENGINE_PID=$!
+trap 'kill $ENGINE_PID 2>/dev/null' EXIT INT TERM
+
+# Wait for the engine socket before accepting HTTP traffic
+while [ ! -S "$ENGINE_SOCKET" ]; do
+    if ! kill -0 $ENGINE_PID 2>/dev/null; then
+        echo "❌ Engine exited before opening $ENGINE_SOCKET"
+        exit 1
+    fi
+    sleep 0.5
+done
+
+ENGINE_ROLE=worker gunicorn -c gunicorn.conf.py 'flask_app_combined:create_worker_app()'
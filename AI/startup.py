@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+def process_start_time():
+    """Wall-clock time this process was started (Linux), else now"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22 counts clock ticks since boot; the command name may contain spaces
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class StartupTimeline:
+    """Named start-up phases with their durations, plus overall readiness.
+
+    The HTTP server binds before the slow phases (model import and load,
+    first frame) finish; health checks read snapshot() meanwhile.
+    """
+
+    def __init__(self):
+        self.process_started = process_start_time()
+        self.phases = []  # (name, seconds since process start, duration)
+        self.ready = threading.Event()
+        self.error = None
+        self._lock = threading.Lock()
+
+    def mark(self, name, duration=None):
+        """Record a phase that ends now; duration defaults to the time since the last phase"""
+        now = time.time() - self.process_started
+        with self._lock:
+            if duration is None:
+                duration = now - (self.phases[-1][1] if self.phases else 0.0)
+            self.phases.append((name, round(now, 3), round(duration, 3)))
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(name, time.perf_counter() - started)
+
+    def fail(self, error):
+        self.error = error
+
+    def status(self):
+        if self.ready.is_set():
+            return 'ready'
+        return 'error' if self.error else 'starting'
+
+    def snapshot(self):
+        with self._lock:
+            phases = [{'phase': name, 'at_s': at, 'seconds': seconds} for name, at, seconds in self.phases]
+        return {
+            'status': self.status(),
+            'ready': self.ready.is_set(),
+            'error': self.error,
+            'uptime_s': round(time.time() - self.process_started, 3),
+            'phases': phases,
+        }
@@ -0,0 +1,112 @@
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+SYNTHETIC_NAMES = {0: "Fajar", 1: "Dublin", 2: "George"}
+_video_lock = threading.Lock()
+
+
+class _Array:
+    """Minimal tensor look-alike: supports .cpu().numpy() and len()"""
+
+    def __init__(self, values):
+        self._values = values
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._values
+
+    def __len__(self):
+        return len(self._values)
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls = _Array(xyxy), _Array(conf), _Array(cls)
+
+    def __len__(self):
+        return len(self.cls)
+
+
+class _Result:
+    def __init__(self, names, boxes):
+        self.names = names
+        self.boxes = boxes
+
+
+def make_result(names, xyxy, conf, cls):
+    """Wrap plain arrays in the ultralytics result layout the pipeline reads"""
+    return _Result(names, _Boxes(xyxy, conf, cls))
+
+
+class SyntheticModel:
+    """Stand-in for an ultralytics YOLO model when no weights are available.
+
+    Returns one box per (filtered) class that moves across the frame, in the
+    same result layout the pipeline reads (boxes.cls/conf/xyxy). latency
+    seconds are spent per call to imitate inference time; the GIL is released
+    while waiting, as it is during real torch inference. Boxes move with the
+    call count, or with frame_index when the caller passes it, so runs that
+    skip frames still see the same box on the same frame.
+    """
+
+    def __init__(self, names=None, latency=0.0):
+        self.names = dict(names or SYNTHETIC_NAMES)
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, frame, conf=0.25, classes=None, verbose=False, frame_index=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls += 1
+        step = self.calls if frame_index is None else frame_index
+        height, width = frame.shape[:2]
+        class_ids = list(self.names) if classes is None else [c for c in classes if c in self.names]
+        box_w, box_h = width // 8, height // 3
+        xyxy = np.empty((len(class_ids), 4), dtype=np.float32)
+        for i, class_id in enumerate(class_ids):
+            x1 = (step * 7 + class_id * width // 3) % max(1, width - box_w)
+            y1 = height // 3 + (class_id * 37) % max(1, height // 3)
+            xyxy[i] = (x1, y1, x1 + box_w, min(height - 1, y1 + box_h))
+        confs = np.full(len(class_ids), 0.9, dtype=np.float32)
+        return [make_result(self.names, xyxy, confs, np.asarray(class_ids, dtype=np.float32))]
+
+
+def synthetic_frames(width=1920, height=1080, count=300):
+    """Yield street-like test frames: a noisy background with moving blocks"""
+    rng = np.random.default_rng(0)
+    background = rng.integers(40, 200, (height // 8, width // 8, 3), dtype=np.uint8)
+    background = cv2.resize(background, (width, height), interpolation=cv2.INTER_LINEAR)
+    for i in range(count):
+        frame = background.copy()
+        for k in range(6):
+            x = (i * (3 + k) * 4 + k * width // 6) % (width - 120)
+            y = (height // 7) * (k + 1) % (height - 240)
+            cv2.rectangle(frame, (x, y), (x + 120, y + 240), (30 * k, 255 - 30 * k, 128), -1)
+        yield frame
+
+
+def write_synthetic_video(path, width=1920, height=1080, count=300, fps=30.0):
+    """Encode synthetic_frames() to an MP4 so decoding can be measured too"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for frame in synthetic_frames(width, height, count):
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def cached_synthetic_video(width=1280, height=720, count=300):
+    """Path of a synthetic video in the temp dir, generated on first use"""
+    path = Path(tempfile.gettempdir()) / f"ui-aic-synthetic_{width}x{height}_{count}.mp4"
+    with _video_lock:
+        if not path.exists():
+            tmp = path.with_suffix(".tmp.mp4")
+            write_synthetic_video(tmp, width, height, count)
+            tmp.replace(path)
+    return path
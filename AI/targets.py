@@ -0,0 +1,108 @@
+# BGR overlay colours, assigned to targets in the order they were requested
+TARGET_COLORS = [
+    (0, 255, 255),   # Yellow (the original single-target colour)
+    (255, 0, 255),   # Magenta
+    (0, 255, 0),     # Green
+    (255, 128, 0),   # Blue
+    (0, 128, 255),   # Orange
+    (255, 255, 0),   # Cyan
+]
+
+TIMELINE_GAP = 1.0       # Seconds of absence that still count as one appearance
+TIMELINE_MAX_SPANS = 200  # Per target; oldest appearances are dropped first
+
+
+def parse_targets(value):
+    """Normalise 'Fajar', 'Fajar, Budi' or ['Fajar', 'Budi'] to unique names"""
+    if isinstance(value, str):
+        value = value.split(',')
+    names = []
+    for name in value or []:
+        name = str(name).strip()
+        if name and name.lower() not in (n.lower() for n in names):
+            names.append(name)
+    return names
+
+
+class TargetFilter:
+    """Immutable set of targets resolved against a model's class names.
+
+    classes is the combined class filter for a single inference call, so
+    searching N people costs the same as searching one.
+    """
+
+    def __init__(self, names, model_names=None):
+        self.names = tuple(names)
+        self.colors = {name: TARGET_COLORS[i % len(TARGET_COLORS)]
+                       for i, name in enumerate(self.names)}
+        self._by_key = {name.lower(): name for name in self.names}
+        self.by_class_id = {}
+        if isinstance(model_names, dict):
+            for class_id, class_name in model_names.items():
+                name = self._by_key.get(str(class_name).strip().lower())
+                if name is not None:
+                    self.by_class_id[int(class_id)] = name
+        # None = no target is a known class: run unfiltered and match by name
+        self.classes = sorted(self.by_class_id) or None
+
+    def match(self, class_id, class_name):
+        """Return the requested target name for a detection, or None"""
+        name = self.by_class_id.get(class_id)
+        if name is None:
+            name = self._by_key.get(str(class_name).strip().lower())
+        return name
+
+    def label(self):
+        return ", ".join(self.names)
+
+
+def target_detections(result, targets, class_names=None):
+    """(target name, conf, x1, y1, x2, y2) for every box of a requested target.
+
+    The box tensors are copied off the device once per frame rather than once
+    per box.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+    class_names = getattr(result, 'names', None) or class_names
+    cls_ids = boxes.cls.cpu().numpy().astype(int)
+    confs = boxes.conf.cpu().numpy()
+    xyxy = boxes.xyxy.cpu().numpy().astype(int)
+    detections = []
+    for cls_id, conf, (x1, y1, x2, y2) in zip(cls_ids, confs, xyxy):
+        cls_name = class_names[cls_id] if class_names else f"Class {cls_id}"
+        name = targets.match(int(cls_id), cls_name)
+        if name is not None:
+            detections.append((name, float(conf), int(x1), int(y1), int(x2), int(y2)))
+    return detections
+
+
+class TargetStats:
+    """Per-target detection counters and appearance timelines (video seconds)"""
+
+    def __init__(self):
+        self.counts = {}
+        self.timelines = {}
+
+    def update(self, found, t):
+        """Record one processed frame; found maps target name -> detections"""
+        for name, count in found.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+            spans = self.timelines.setdefault(name, [])
+            # A jump backwards means the video looped: start a new appearance
+            if spans and spans[-1][1] <= t <= spans[-1][1] + TIMELINE_GAP:
+                spans[-1][1] = t
+            else:
+                spans.append([t, t])
+                del spans[:-TIMELINE_MAX_SPANS]
+
+    def snapshot(self, names):
+        return {
+            name: {
+                'detections': self.counts.get(name, 0),
+                'appearances': [[round(a, 2), round(b, 2)]
+                                for a, b in self.timelines.get(name, [])],
+            }
+            for name in names
+        }
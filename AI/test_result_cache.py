@@ -0,0 +1,36 @@
+import pytest
+
+from result_cache import LoopCache
+
+BOX = (10, 20, 110, 220)
+
+
+def record(cache, names, rows):
+    """Record one full loop with rows of (frame, name) and finalize it"""
+    entry = cache.entry(names, 0.25)
+    for idx in range(cache.frame_count):
+        entry.put(idx, [(name, 0.9, *BOX) for frame, name in rows if frame == idx])
+    entry.wrapped(fps=1)
+    assert entry.complete
+    return entry
+
+
+def test_same_entry_relabels_to_current_spelling(tmp_path):
+    cache = LoopCache(tmp_path, "video", "model", frame_count=3, max_bytes=2 ** 20)
+    record(cache, ["Fajar"], [(0, "Fajar")])
+    entry = cache.entry(["fajar"], 0.25)
+    assert entry.complete
+    (name, conf, *box), = entry.detections(0, ["fajar"])
+    assert (name, tuple(box)) == ("fajar", BOX) and conf == pytest.approx(0.9)
+
+
+def test_persisted_rows_keep_their_target_after_restart(tmp_path):
+    cache = LoopCache(tmp_path, "video", "model", frame_count=3, max_bytes=2 ** 20)
+    record(cache, ["Fajar", "Budi"], [(0, "Fajar"), (1, "Budi")])
+    cache.close()
+
+    restarted = LoopCache(tmp_path, "video", "model", frame_count=3, max_bytes=2 ** 20)
+    entry = restarted.entry(["budi", "fajar"], 0.25)
+    assert entry.complete
+    assert [d[0] for d in entry.detections(0, ["budi", "fajar"])] == ["fajar"]
+    assert [d[0] for d in entry.detections(1, ["budi", "fajar"])] == ["budi"]
@@ -0,0 +1,137 @@
+import cProfile
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+MAX_CAPTURE_SECONDS = 60.0
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples of the profiled thread
+
+_sequence = itertools.count(1)
+
+
+def capture_id(camera_id, kind):
+    # Milliseconds plus a process-wide counter: captures started within the
+    # same millisecond still get their own file
+    now = datetime.now()
+    return f"{camera_id}_{kind}_{now:%Y%m%d-%H%M%S}-{now.microsecond // 1000:03d}-{next(_sequence)}"
+
+
+class StageTracer:
+    """Per-frame stage spans of one camera, exported as a Chrome trace.
+
+    The frame loop calls span() with perf_counter() start/end times while the
+    tracer is installed; open the result in chrome://tracing or Perfetto.
+    """
+
+    def __init__(self, camera_id, seconds, out_dir):
+        self.camera_id = camera_id
+        self.id = capture_id(camera_id, "trace")
+        self.path = Path(out_dir) / f"{self.id}.trace.json"
+        self.until = time.perf_counter() + min(seconds, MAX_CAPTURE_SECONDS)
+        self._origin = time.perf_counter()
+        self._events = []
+
+    def expired(self):
+        return time.perf_counter() >= self.until
+
+    def span(self, name, start, end, frame=None):
+        # list.append is atomic, so the publisher thread may add spans too
+        self._events.append({
+            'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+            'ts': round((start - self._origin) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+            'args': {'frame': frame},
+        })
+
+    def finish(self):
+        """Write the trace file and return its path"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        names = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                  'args': {'name': f"{self.camera_id}-{i}"}}
+                 for i, tid in enumerate(sorted({e['tid'] for e in self._events}))]
+        self.path.write_text(json.dumps({'traceEvents': names + self._events,
+                                         'displayTimeUnit': 'ms'}))
+        return self.path
+
+
+class SamplingProfiler:
+    """Statistical profile of one thread, written as collapsed stacks.
+
+    A sampler thread reads the target thread's current stack every
+    SAMPLE_INTERVAL seconds, so the profiled thread itself runs unmodified.
+    The .folded output loads in speedscope or flamegraph.pl.
+    """
+
+    def __init__(self, camera_id, thread_ident, seconds, out_dir):
+        self.id = capture_id(camera_id, "sample")
+        self.path = Path(out_dir) / f"{self.id}.folded"
+        self.thread_ident = thread_ident
+        self.seconds = min(seconds, MAX_CAPTURE_SECONDS)
+        self.samples = Counter()
+        self.done = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name=f"profiler-{self.id}").start()
+        return self
+
+    def _run(self):
+        until = time.perf_counter() + self.seconds
+        while time.perf_counter() < until:
+            frame = sys._current_frames().get(self.thread_ident)
+            if frame is None:
+                break  # Thread ended
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+            time.sleep(SAMPLE_INTERVAL)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text("".join(f"{stack} {n}\n" for stack, n in self.samples.most_common()))
+        self.done.set()
+
+
+class ThreadProfiler:
+    """Deterministic cProfile of the thread that calls enable()/finish().
+
+    cProfile only sees the thread it was enabled in, so the camera loop
+    enables it on its next frame and dumps the stats when it expires.
+    """
+
+    def __init__(self, camera_id, seconds, out_dir):
+        self.id = capture_id(camera_id, "cprofile")
+        self.path = Path(out_dir) / f"{self.id}.prof"
+        self.until = time.perf_counter() + min(seconds, MAX_CAPTURE_SECONDS)
+        self._profile = cProfile.Profile()
+        self.enabled = False
+
+    def expired(self):
+        return time.perf_counter() >= self.until
+
+    def enable(self):
+        self._profile.enable()
+        self.enabled = True
+
+    def finish(self):
+        self._profile.disable()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._profile.dump_stats(str(self.path))
+        return self.path
+
+
+def list_captures(out_dir):
+    """Finished trace/profile files, newest first"""
+    out_dir = Path(out_dir)
+    if not out_dir.exists():
+        return []
+    files = sorted((p for p in out_dir.iterdir() if p.is_file()),
+                   key=lambda p: p.stat().st_mtime, reverse=True)
+    return [{'file': p.name, 'bytes': p.stat().st_size,
+             'created': round(p.stat().st_mtime, 3)} for p in files]
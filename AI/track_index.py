@@ -0,0 +1,438 @@
+import argparse
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from frame_pool import FramePool
+from log_setup import get_logger, setup_logging
+from reid import embed_boxes
+from vector_index import normalize, top_k
+
+TRACK_IOU = 0.3         # A box continues the open track it overlaps most, above this IoU
+TRACK_END_AFTER = 2.0   # Seconds a track may go unseen before it is closed and indexed
+TRACK_MIN_FRAMES = 3    # Shorter tracks are mostly detector noise and are not indexed
+SEARCH_CHUNK = 1 << 15  # Rows converted to float32 per matrix product while searching
+INDEXER_PENDING = 8     # Sampled frames waiting for the indexer; newer ones are dropped beyond this
+# One record per track, next to its int8 vector; scale turns the int8 dot product back into a cosine
+META = np.dtype([('start', '<f8'), ('end', '<f8'), ('camera', '<u2'), ('frames', '<u4'), ('scale', '<f4')])
+
+log = get_logger(__name__)
+
+
+def iou_matrix(a, b):
+    """(len(a), len(b)) IoU of two sets of xyxy boxes"""
+    a = np.asarray(a, np.float32)[:, None]
+    b = np.asarray(b, np.float32)[None]
+    ix = (np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0])).clip(0)
+    iy = (np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1])).clip(0)
+    inter = ix * iy
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+class TrackIndex:
+    """Append-only on-disk index of one appearance embedding per person track.
+
+    vectors.i8 holds the embeddings, quantised to int8 with a per-row scale
+    (a quarter of float32 on disk, under 0.01 cosine error), and tracks.bin
+    the matching (start, end, camera, frames, scale) records. Both files
+    only grow, written by a background thread under a file lock, so the
+    server and the backfill CLI can append at the same time. A row exists
+    once both halves are on disk, so a crash mid-write costs at most the
+    tracks of that write. Searches
+    memory-map the files and score them in cache-sized float32 chunks, one
+    matrix product each: a million tracks take about 0.2s on one core, and a
+    time or camera filter reads only the rows it keeps.
+
+    Track times are when the footage was recorded, in unix time: the wall
+    clock at capture for live sources, and for video files (server and
+    backfill CLI alike) recorded_start() plus the frame's position.
+    """
+
+    def __init__(self, directory, embedder):
+        self.dim = embedder.dim
+        # Embeddings of different models are not comparable: one index each
+        self.directory = Path(directory) / f"{type(embedder).__name__.lower()}-{self.dim}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.directory / "vectors.i8"
+        self._meta_path = self.directory / "tracks.bin"
+        self._manifest_path = self.directory / "index.json"
+        self._lock_path = self.directory / "write.lock"
+        self.cameras = []     # Camera id per code in tracks.bin
+        self.videos = set()   # Fingerprints of files whose tracks are all indexed
+        self._codes = {}
+        self._load_manifest()
+        with self._file_lock():
+            self._recover()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._writer, daemon=True, name="track-index").start()
+        log.info("🗃️ Track index: %d tracks, %d videos (%s)", self.count, len(self.videos), self.directory)
+
+    @property
+    def count(self):
+        """Rows complete in both files (other processes may be appending)"""
+        return min(size // row_bytes for size, row_bytes in self._sizes())
+
+    def _sizes(self):
+        return [(path.stat().st_size if path.exists() else 0, row_bytes)
+                for path, row_bytes in ((self._vectors_path, self.dim), (self._meta_path, META.itemsize))]
+
+    def _recover(self):
+        """Cut off a torn last write"""
+        count = self.count
+        for path, (size, row_bytes) in zip((self._vectors_path, self._meta_path), self._sizes()):
+            if size != count * row_bytes:
+                with open(path, 'r+b') as f:
+                    f.truncate(count * row_bytes)
+
+    def _file_lock(self):
+        return _FileLock(self._lock_path)
+
+    def _load_manifest(self):
+        try:
+            manifest = json.loads(self._manifest_path.read_text())
+        except (OSError, ValueError):
+            return
+        self.cameras = manifest['cameras']
+        self.videos = set(manifest['videos'])
+        self._codes = {camera_id: code for code, camera_id in enumerate(self.cameras)}
+
+    def append(self, vector, start, end, camera_id, frames):
+        """Queue one track; written by the background thread"""
+        self._queue.put(('track', normalize(vector).reshape(self.dim), start, end, camera_id, frames))
+
+    def mark_video(self, fingerprint):
+        """Remember that every track of a video file is in the index (after the queued ones)"""
+        self._queue.put(('video', fingerprint))
+
+    def flush(self):
+        """Wait until everything queued so far is on disk"""
+        self._queue.join()
+
+    def _writer(self):
+        while True:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(items)
+            except Exception as e:
+                log.error("❌ Track index write failed: %s", e)
+            for _ in items:
+                self._queue.task_done()
+
+    def _write(self, items):
+        tracks = [item[1:] for item in items if item[0] == 'track']
+        videos = [item[1] for item in items if item[0] == 'video']
+        with self._file_lock():
+            self._load_manifest()  # Another process may have added cameras or videos
+            new_cameras = {camera_id for *_, camera_id, _ in tracks} - self._codes.keys()
+            for camera_id in sorted(new_cameras):
+                self._codes[camera_id] = len(self.cameras)
+                self.cameras.append(camera_id)
+            if new_cameras:
+                self._save_manifest()  # Before any record refers to the new codes
+            if tracks:
+                vectors = np.stack([vector for vector, *_ in tracks])
+                scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+                vectors = np.rint(vectors / scales[:, None]).astype(np.int8)
+                meta = np.array([(start, end, self._codes[camera_id], frames, scale)
+                                 for (_, start, end, camera_id, frames), scale in zip(tracks, scales)], META)
+                with open(self._vectors_path, 'ab') as f:
+                    f.write(vectors.tobytes())
+                with open(self._meta_path, 'ab') as f:
+                    f.write(meta.tobytes())
+            if videos:
+                self.videos.update(videos)
+                self._save_manifest()
+
+    def _save_manifest(self):
+        tmp = self._manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({'cameras': self.cameras, 'videos': sorted(self.videos)}, indent=1))
+        tmp.replace(self._manifest_path)
+
+    def search(self, queries, k=20, since=None, until=None, camera=None):
+        """Tracks most similar to a person given as one or more unit vectors.
+
+        A track scores its best similarity to any query vector. since/until
+        (unix time) keep tracks overlapping that window; camera keeps one
+        camera's tracks.
+        """
+        if camera is not None and camera not in self._codes:
+            self._load_manifest()  # Camera added by another process, e.g. the backfill CLI
+        count = self.count
+        queries = normalize(queries).reshape(-1, self.dim)
+        if not count or not len(queries):
+            return []
+        meta = np.memmap(self._meta_path, META, 'r', shape=(count,))
+        vectors = np.memmap(self._vectors_path, np.int8, 'r', shape=(count, self.dim))
+        rows = None
+        if since is not None or until is not None or camera is not None:
+            keep = np.ones(count, bool)
+            if since is not None:
+                keep &= meta['end'] >= since
+            if until is not None:
+                keep &= meta['start'] <= until
+            if camera is not None:
+                keep &= meta['camera'] == self._codes.get(camera, -1)
+            rows = np.flatnonzero(keep)
+        total = count if rows is None else len(rows)
+        best_scores, best_rows = np.empty(0, np.float32), np.empty(0, np.int64)
+        for offset in range(0, total, SEARCH_CHUNK):
+            if rows is None:
+                chunk_rows = np.arange(offset, min(total, offset + SEARCH_CHUNK))
+                block, scale = vectors[offset:offset + SEARCH_CHUNK], meta['scale'][offset:offset + SEARCH_CHUNK]
+            else:
+                chunk_rows = rows[offset:offset + SEARCH_CHUNK]
+                block, scale = vectors[chunk_rows], meta['scale'][chunk_rows]
+            scores = (block.astype(np.float32) @ queries.T).max(axis=1) * scale
+            scores, chunk_rows = np.concatenate([best_scores, scores]), np.concatenate([best_rows, chunk_rows])
+            picked_scores, picked = top_k(scores[None], k)
+            best_scores, best_rows = picked_scores[0], chunk_rows[picked[0]]
+        if len(best_rows) and int(meta['camera'][best_rows].max()) >= len(self.cameras):
+            self._load_manifest()  # Cameras added by another process
+        return [{
+            'camera': self.cameras[meta['camera'][row]],
+            'start': round(float(meta['start'][row]), 3),
+            'end': round(float(meta['end'][row]), 3),
+            'frames': int(meta['frames'][row]),
+            'score': round(float(score), 4),
+        } for score, row in zip(best_scores, best_rows)]
+
+
+class _FileLock:
+    """Exclusive flock on a file, held for one with-block"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+
+
+class TrackBuilder:
+    """Joins one camera's person boxes into tracks and indexes each track once.
+
+    Boxes continue the open track they overlap most (IoU). A track's
+    embedding is the normalised mean of its per-frame embeddings, written
+    when the track ends. With a video_id (a file source) indexing stops at
+    the end of the first pass and the file is marked as indexed, so a
+    looping video is not indexed again on every loop or restart.
+    """
+
+    def __init__(self, camera_id, index, video_id=None, iou=TRACK_IOU, end_after=TRACK_END_AFTER,
+                 min_frames=TRACK_MIN_FRAMES):
+        self.camera_id = camera_id
+        self.index = index
+        self.video_id = video_id
+        self.iou = iou
+        self.end_after = end_after
+        self.min_frames = min_frames
+        self.tracks = []  # Open tracks: box, sum of embeddings, frames, start, last_seen
+
+    def update(self, boxes, vectors, ts):
+        """Feed one frame's person boxes and their embeddings, seen at ts (unix time)"""
+        tracks, taken = self.tracks, set()
+        if tracks and len(boxes):
+            overlap = iou_matrix([track['box'] for track in tracks], boxes)
+            continued = set()
+            for flat in np.argsort(-overlap, axis=None):
+                t, b = divmod(int(flat), overlap.shape[1])
+                if overlap[t, b] < self.iou:
+                    break
+                if t in continued or b in taken:
+                    continue
+                continued.add(t)
+                taken.add(b)
+                track = tracks[t]
+                track['box'] = boxes[b]
+                track['sum'] += vectors[b]
+                track['frames'] += 1
+                track['last_seen'] = ts
+        for b in range(len(boxes)):
+            if b not in taken:
+                tracks.append({'box': boxes[b], 'sum': vectors[b].astype(np.float32), 'frames': 1,
+                               'start': ts, 'last_seen': ts})
+        open_tracks = []
+        for track in tracks:
+            if ts - track['last_seen'] > self.end_after:
+                self._finish(track)
+            else:
+                open_tracks.append(track)
+        self.tracks = open_tracks
+
+    def _finish(self, track):
+        if track['frames'] >= self.min_frames:
+            self.index.append(normalize(track['sum']), track['start'], track['last_seen'],
+                              self.camera_id, track['frames'])
+
+    def close(self, complete=False):
+        """Index the open tracks; complete=True marks the whole video file as indexed"""
+        for track in self.tracks:
+            self._finish(track)
+        self.tracks = []
+        if complete and self.video_id:
+            self.index.mark_video(self.video_id)
+
+
+class TrackIndexer:
+    """Builds the person tracks of every camera on one background thread.
+
+    A camera loop only hands over a sampled frame, copied into a pooled
+    buffer; person detection, embedding and track building run here, so
+    indexing never slows a stream down. When the indexer falls behind,
+    new samples are dropped (and counted) rather than queued. The person
+    detector is the one shared with re-ID; the embedder is this thread's own.
+    """
+
+    def __init__(self, index, detector, embedder, max_pending=INDEXER_PENDING):
+        self.index = index
+        self.detector = detector
+        self.embedder = embedder
+        self.max_pending = max_pending
+        self.frames_dropped = 0
+        self._builders = {}  # Camera id -> TrackBuilder; only touched by the thread
+        self._pools = {}     # Frame shape -> FramePool
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True, name="track-indexer").start()
+
+    def open(self, camera_id, video_id=None):
+        """Start indexing a camera (a file source once: video_id is its fingerprint)"""
+        self._queue.put(('open', camera_id, video_id))
+
+    def close(self, camera_id, complete=False):
+        """Index the camera's open tracks; complete=True marks its video file as indexed"""
+        self._queue.put(('close', camera_id, complete))
+
+    def submit(self, camera_id, frame, ts):
+        """Queue a copy of frame, seen at ts; False if dropped because the indexer is behind"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.frames_dropped += 1
+                return False
+            self._pending += 1
+            pool = self._pools.get(frame.shape)
+            if pool is None:
+                pool = self._pools[frame.shape] = FramePool(keep=self.max_pending)
+        self._queue.put(('frame', camera_id, pool.copy(frame), ts))
+        return True
+
+    def flush(self):
+        """Wait until every queued frame has been processed"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            kind, camera_id, *rest = self._queue.get()
+            try:
+                if kind == 'frame':
+                    self._frame(camera_id, *rest)
+                elif kind == 'open':
+                    self._builders[camera_id] = TrackBuilder(camera_id, self.index, rest[0])
+                else:
+                    builder = self._builders.pop(camera_id, None)
+                    if builder is not None:
+                        builder.close(complete=rest[0])
+            except Exception as e:
+                log.error("❌ Track indexing failed (%s): %s", camera_id, e)
+            finally:
+                self._queue.task_done()
+
+    def _frame(self, camera_id, frame, ts):
+        try:
+            builder = self._builders.get(camera_id)
+            if builder is not None and self.detector.ready():
+                boxes = self.detector.detect(frame)
+                builder.update(boxes, embed_boxes(self.embedder, frame, boxes), ts)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._pools[frame.shape].give(frame)
+
+
+def recorded_start(path, frame_count, fps):
+    """Unix time of a video file's first frame, taking it to end at its modification time"""
+    return Path(path).stat().st_mtime - (frame_count or 0) / (fps or 30.0)
+
+
+def index_video(path, camera_id, index, detector, embedder, start=None, stride=3):
+    """Index the person tracks of an archived video file; returns tracks added.
+
+    start is the unix time of the first frame; by default the file is
+    taken to have been recorded up to its modification time.
+    """
+    from result_cache import file_fingerprint
+
+    path = Path(path)
+    fingerprint = file_fingerprint(path)
+    if fingerprint in index.videos:
+        print(f"⏭️ {path.name}: already indexed")
+        return 0
+    cap = cv2.VideoCapture(str(path))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    if start is None:
+        start = recorded_start(path, cap.get(cv2.CAP_PROP_FRAME_COUNT), fps)
+    builder = TrackBuilder(camera_id, index, fingerprint)
+    before, frame_idx, started = index.count, 0, time.perf_counter()
+    while cap.grab():
+        if frame_idx % stride == 0:
+            ok, frame = cap.retrieve()
+            if ok:
+                boxes = detector.detect(frame)
+                builder.update(boxes, embed_boxes(embedder, frame, boxes), start + frame_idx / fps)
+        frame_idx += 1
+    cap.release()
+    builder.close(complete=True)
+    index.flush()
+    print(f"✅ {path.name}: {frame_idx} frames, {index.count - before} tracks "
+          f"in {time.perf_counter() - started:.1f}s")
+    return index.count - before
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add the person tracks of archived video files to the track index "
+                    "(files indexed before are skipped).")
+    parser.add_argument("videos", nargs="+", help="Video files")
+    parser.add_argument("--camera", required=True, help="Camera id the footage belongs to")
+    parser.add_argument("--start", type=float, help="Unix time of the first frame; default: from the file mtime")
+    parser.add_argument("--stride", type=int, default=3, help="Run the person detector on every Nth frame")
+    parser.add_argument("--dir", help="Index directory; default: TRACK_INDEX_DIR or AI/tracks")
+    args = parser.parse_args()
+    setup_logging()
+
+    from camera_session import load_person_model
+    from reid import PersonDetector, make_embedder
+
+    directory = args.dir or os.environ.get("TRACK_INDEX_DIR", Path(__file__).resolve().parent / "tracks")
+    embedder = make_embedder()
+    index = TrackIndex(directory, embedder)
+    detector = PersonDetector(load_person_model)
+    if not detector.ready(block=True):
+        raise SystemExit("❌ Person detector not available")
+    for video in args.videos:
+        index_video(video, args.camera.lower(), index, detector, embedder, args.start, args.stride)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import threading
+
+import numpy as np
+
+
+def normalize(vectors):
+    """L2-normalise rows so inner product equals cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, k):
+    """(scores, column indices) of the k best columns per row, best first"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return (np.empty((scores.shape[0], 0), np.float32), np.empty((scores.shape[0], 0), np.int64))
+    if k < scores.shape[1]:
+        columns = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        columns = np.broadcast_to(np.arange(k), (scores.shape[0], k))
+    picked = np.take_along_axis(scores, columns, axis=1)
+    order = np.argsort(-picked, axis=1)
+    return np.take_along_axis(picked, order, axis=1), np.take_along_axis(columns, order, axis=1)
+
+
+class FlatIndex:
+    """Exact inner-product search over normalised vectors (faiss IndexFlatIP style).
+
+    search() returns (scores, labels) arrays of shape (queries, k); missing
+    results are -inf / -1, as in faiss. Vectors live in one contiguous
+    matrix, so a search is a single matrix product.
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.vectors = np.empty((0, dim), np.float32)
+        self.labels = np.empty(0, np.int64)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add(self, vectors, labels):
+        vectors = normalize(vectors).reshape(-1, self.dim)
+        with self._lock:
+            self.vectors = np.concatenate([self.vectors, vectors])
+            self.labels = np.concatenate([self.labels, np.asarray(labels, np.int64).reshape(-1)])
+
+    def remove(self, label):
+        with self._lock:
+            keep = self.labels != label
+            self.vectors, self.labels = self.vectors[keep], self.labels[keep]
+
+    def search(self, queries, k):
+        queries = normalize(queries).reshape(-1, self.dim)
+        with self._lock:
+            vectors, labels = self.vectors, self.labels  # Replaced, never modified in place
+        scores, columns = top_k(queries @ vectors.T, k)
+        result_scores = np.full((len(queries), k), -np.inf, np.float32)
+        result_labels = np.full((len(queries), k), -1, np.int64)
+        result_scores[:, :scores.shape[1]] = scores
+        result_labels[:, :scores.shape[1]] = labels[columns]
+        return result_scores, result_labels
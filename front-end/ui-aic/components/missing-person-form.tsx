@@ -55,10 +55,31 @@ export function MissingPersonForm() {
     }
   }
 
-  const handleSubmit = (e: React.FormEvent) => {
+  const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault()
     // Handle form submission
     console.log("Form submitted:", formData)
+    if (formData.photo && formData.name) {
+      // The photo becomes a re-ID reference, so the name can be searched on every camera
+      const body = new FormData()
+      body.append("name", formData.name)
+      body.append("photo", formData.photo)
+      try {
+        const response = await fetch(
+          `${process.env.NEXT_PUBLIC_FLASK_BASE_URL || "https://backendsmart.muhammadhaggy.com"}/reid/gallery`,
+          { method: "POST", body },
+        )
+        if (!response.ok) {
+          const result = await response.json().catch(() => ({}))
+          alert(`Foto tidak dapat diproses: ${result.error || response.statusText}`)
+          return
+        }
+      } catch (error) {
+        console.error("Reference photo upload failed:", error)
+        alert("Error: Gagal mengirim foto ke server AI.")
+        return
+      }
+    }
     alert("Laporan orang hilang berhasil dikirim!")
   }
 